@@ -1,32 +1,394 @@
-from flask import Flask, request, render_template_string
-import joblib
-import pandas as pd
-from category_encoders import HashingEncoder
+from flask import Flask, Response, request, jsonify
+from datetime import datetime, timezone
+import gzip
+import hashlib
+import hmac
 import os
+import signal
+import threading
+import time
+from features import parse_input
+from artifacts import MODEL_DIR, load_bundle, publish_version, resolve_version
+from cache import PredictionCache, cache_key, shared_store_from_env
+from batcher import MicroBatcher
+from inference_pool import InferencePool, PoolSaturated
+from reqlog import RequestLogger
+import metrics
 
-try:
-    model = joblib.load("mpg_model.pkl")
-    scaler = joblib.load("scaler.pkl")
-    columns = joblib.load("columns.pkl")
-except FileNotFoundError:
-    print("[v0] Model files not found! Training model...")
+CACHE_SIZE = int(os.environ.get("MPG_CACHE_SIZE", 4096))
+CACHE_TTL = float(os.environ.get("MPG_CACHE_TTL", 0)) or None
+REQUEST_LOG_PATH = os.environ.get("MPG_REQUEST_LOG", "requests.jsonl")
+UNCERTAINTY_PERCENTILES = [float(p) for p in
+                           os.environ.get("MPG_UNCERTAINTY_PERCENTILES", "5,95").split(",")]
+# Predictions whose tree spread exceeds this fraction of the mean are
+# reported as low-confidence.
+LOW_CONFIDENCE_CV = float(os.environ.get("MPG_LOW_CONFIDENCE_CV", 0.15))
+# Reloads through POST /admin/reload need this token; unset disables the endpoint.
+ADMIN_TOKEN = os.environ.get("MPG_ADMIN_TOKEN", "")
+# Seconds between checks of MODEL_DIR/CURRENT for a new version (0 = off).
+# This is how a reload reaches every gunicorn worker: /admin/reload and
+# SIGHUP only reach one process, and the others follow CURRENT.
+RELOAD_POLL_S = float(os.environ.get("MPG_RELOAD_POLL_S", 2))
+
+# The serving model. Artifacts are loaded by a background thread so the
+# server can bind and answer /healthz immediately; /readyz reports when
+# this is populated. Reloads build a complete new bundle and replace this
+# reference in one assignment, so request handlers read it once and never
+# take a lock.
+current = None
+load_error = None
+_ready = threading.Event()
+_loader_lock = threading.Lock()
+_loader = None
+_loader_pid = None
+_reload_lock = threading.Lock()
+
+def _pool_for(bundle):
+    # Score in MPG_INFERENCE_PROCESSES forked processes so one HTTP worker
+    # (with --threads, or big batches) can use every core; 0 keeps it in-process.
+    processes = int(os.environ.get("MPG_INFERENCE_PROCESSES", 0))
+    if processes <= 0:
+        return None
+    return InferencePool(bundle.predict_rows, len(bundle.columns), processes=processes,
+                         slots=int(os.environ.get("MPG_POOL_SLOTS", 0)) or None,
+                         max_rows=int(os.environ.get("MPG_POOL_MAX_ROWS", 1024)),
+                         min_chunk=int(os.environ.get("MPG_POOL_MIN_CHUNK", 64)),
+                         queue_timeout=float(os.environ.get("MPG_POOL_QUEUE_TIMEOUT_MS", 1000)) / 1000,
+                         task_timeout=float(os.environ.get("MPG_POOL_TASK_TIMEOUT_MS", 10000)) / 1000)
+
+def _batcher_for(bundle):
+    # Coalesce concurrent single-row predictions; only pays off with a threaded
+    # or async worker class where several requests share this process.
+    if os.environ.get("MPG_MICROBATCH", "0") != "1":
+        return None
+    predict_fn = bundle.pool.predict if bundle.pool is not None else bundle.predict_rows
+    return MicroBatcher(predict_fn,
+                        max_batch_size=int(os.environ.get("MPG_MICROBATCH_MAX", 64)),
+                        max_wait=float(os.environ.get("MPG_MICROBATCH_WAIT_MS", 2)) / 1000)
+
+def build_bundle(version=None):
+    """Load, smoke-test and wire up a bundle for ``version`` (default: the current one)."""
+    name, directory = resolve_version(MODEL_DIR, version)
+    with metrics.stage("load_artifacts"):
+        bundle = load_bundle(directory, name)
+    bundle.smoke_test()
+    if CACHE_SIZE > 0:
+        bundle.cache = PredictionCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL, fingerprint=bundle.fingerprint,
+                                       shared=shared_store_from_env())
+    bundle.pool = _pool_for(bundle)
+    bundle.batcher = _batcher_for(bundle)
+    return bundle
+
+def _swap(bundle):
+    global current
+    old, current = current, bundle
+    if old is not None and old.batcher is not None:
+        old.batcher.close()
+    if old is not None and old.pool is not None:
+        old.pool.close()
+    return old
+
+def _build_or_train():
+    """build_bundle(), running train_model.py first if there are no artifacts.
+
+    A --preload master and each of its workers can all get here; a file
+    lock lets one process train while the others wait for its artifacts.
+    """
+    try:
+        return build_bundle()
+    except FileNotFoundError:
+        pass
+    import fcntl
     import subprocess
-    subprocess.run(["python", "train_model.py"], check=True)
-    model = joblib.load("mpg_model.pkl")
-    scaler = joblib.load("scaler.pkl")
-    columns = joblib.load("columns.pkl")
+    directory = MODEL_DIR or "."
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".train.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            return build_bundle()  # trained by another process while this one waited
+        except FileNotFoundError:
+            print("[v0] Model files not found! Training model...")
+        command = ["python", "train_model.py"]
+        if MODEL_DIR:
+            command += ["--model-dir", MODEL_DIR]
+        with metrics.stage("train_model"):
+            subprocess.run(command, check=True)
+        return build_bundle()
+
+def load_model():
+    """Load (training first if needed) the artifacts and start serving them."""
+    global load_error
+    try:
+        bundle = _build_or_train()
+        _swap(bundle)
+        load_error = None
+        _ready.set()
+        print(f"[v0] Model loaded (version {bundle.version})")
+    except Exception as e:
+        load_error = e
+        print(f"[v0] Model failed to load: {e!r}")
+        if current is not None:
+            _ready.set()  # keep serving the version inherited from the master
+
+def _published_elsewhere():
+    """Whether CURRENT names a different version than the one this process serves."""
+    if not MODEL_DIR or current is None:
+        return False
+    try:
+        name, _ = resolve_version(MODEL_DIR)
+    except OSError:
+        return False
+    return name != current.version
+
+def reload_model(version=None, publish=False):
+    """Load ``version`` (default: what CURRENT names) and swap it in.
+
+    Requests keep being served by the old bundle while the new one loads;
+    a bundle that fails to load or to pass its smoke prediction is never
+    swapped in. With ``publish`` a loaded version is also written to
+    CURRENT, for the other processes to pick up. Returns (old version, new
+    version); raises on failure or if another reload is already running.
+    """
+    if not _reload_lock.acquire(blocking=False):
+        raise RuntimeError("a reload is already in progress")
+    try:
+        with metrics.stage("reload"):
+            bundle = build_bundle(version)
+        old = _swap(bundle)
+        _ready.set()
+        if publish and MODEL_DIR and version is not None:
+            publish_version(MODEL_DIR, bundle.version)
+        old_version = old.version if old is not None else None
+        print(f"[v0] Model reloaded: {old_version} -> {bundle.version}")
+        return old_version, bundle.version
+    except Exception as e:
+        metrics.count_error("reload", e)
+        print(f"[v0] Model reload failed, still serving "
+              f"{current.version if current is not None else None}: {e!r}")
+        raise
+    finally:
+        _reload_lock.release()
+
+def _reload_in_background(version=None, publish=False):
+    def run():
+        try:
+            reload_model(version, publish)
+        except Exception:
+            pass  # already reported; the old bundle keeps serving
+    threading.Thread(target=run, name="mpg-model-reload", daemon=True).start()
+
+def _on_sighup(signum, frame):
+    _reload_in_background()
+
+def _watch_current():
+    while True:
+        time.sleep(RELOAD_POLL_S)
+        try:
+            name, _ = resolve_version(MODEL_DIR)
+        except OSError:
+            continue
+        bundle = current
+        if bundle is not None and name != bundle.version and not _reload_lock.locked():
+            try:
+                reload_model(name)
+            except Exception:
+                pass
+
+def start_loading():
+    """Start the background loader once per process (again after a fork)."""
+    global _loader, _loader_pid
+    with _loader_lock:
+        if _loader_pid == os.getpid():
+            return
+        _loader_pid = os.getpid()
+        # Reload triggers, per process: gunicorn workers reset signal
+        # handlers after the fork, so gunicorn.conf.py calls this again as
+        # each worker boots.
+        try:
+            signal.signal(signal.SIGHUP, _on_sighup)
+        except ValueError:
+            pass  # not the main thread; the admin endpoint still works
+        if MODEL_DIR and RELOAD_POLL_S > 0:
+            threading.Thread(target=_watch_current, name="mpg-model-watch", daemon=True).start()
+        if _ready.is_set():
+            # A worker forked from a --preload master inherits the bundle the
+            # master loaded at boot. After a reload and a worker restart that
+            # can be an old version, so load what CURRENT names before serving.
+            if not _published_elsewhere():
+                return
+            print(f"[v0] Inherited version {current.version} is not CURRENT; loading CURRENT")
+            _ready.clear()
+        _loader = threading.Thread(target=load_model, name="mpg-model-loader", daemon=True)
+        _loader.start()
+
+def is_ready():
+    return _ready.is_set()
+
+def wait_until_ready(timeout=None):
+    """Block until the model is loaded; raises RuntimeError if loading failed."""
+    start_loading()
+    if _loader is not None:
+        _loader.join(timeout)
+    if not _ready.is_set():
+        raise RuntimeError(f"model not loaded: {load_error!r}")
 
 app = Flask(__name__)
+app.config['MAX_BATCH_SIZE'] = int(os.environ.get('MPG_MAX_BATCH_SIZE', 10000))
+# An explained row costs about 1.5x a predicted one and skips the lookup
+# table and cache, so explained batches get their own, smaller cap.
+app.config['MAX_EXPLAIN_BATCH'] = int(os.environ.get('MPG_MAX_EXPLAIN_BATCH', 1000))
 
-def interpret_mpg(mpg_value):
+def parse_percentiles(value):
+    """Parse a comma-separated percentile list such as "5,50,95"."""
+    if not value:
+        return UNCERTAINTY_PERCENTILES
+    percentiles = [float(p) for p in value.split(",")]
+    if not all(0 <= p <= 100 for p in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    return percentiles
+
+def _percentile_key(p):
+    return f"p{p:g}"
+
+def predict_distribution(inputs, percentiles=None, bundle=None):
+    """Predict mean, std and percentiles across trees for parsed input dicts.
+
+    All trees are evaluated in one vectorized pass; the prediction cache
+    and micro-batcher are bypassed since they only hold the mean.
+    """
+    bundle = bundle or current
+    percentiles = UNCERTAINTY_PERCENTILES if percentiles is None else percentiles
+    with metrics.stage("encode"):
+        X = bundle.encoder.encode_many(inputs)
+    with metrics.stage("predict_distribution"):
+        mean, std, quantiles = bundle.tree_forest().predict_distribution(X, percentiles)
+    return _distributions(mean, std, quantiles, percentiles)
+
+def _distributions(mean, std, quantiles, percentiles):
+    return [{'mpg': float(m), 'std': float(sd),
+             'percentiles': {_percentile_key(p): float(q) for p, q in zip(percentiles, row)}}
+            for m, sd, row in zip(mean, std, quantiles)]
+
+def explain_inputs(inputs, bundle=None, percentiles=None):
+    """Predict MPG for parsed input dicts, split into per-field contributions.
+
+    One pass over the trees gives the model's baseline (its average
+    training target) and how far each form field moved the prediction away
+    from it; ``mpg`` is their sum. Like ``predict_distribution`` this
+    bypasses the lookup table, cache and micro-batcher. With
+    ``percentiles`` the leaves that pass reached also give each result the
+    ``std`` and ``percentiles`` of ``predict_distribution`` (and its mean as
+    ``mpg``), so explain + uncertainty walks the trees once.
+    """
+    bundle = bundle or current
+    with metrics.stage("encode"):
+        X = bundle.encoder.encode_many(inputs)
+    baseline, contributions, leaves = bundle.explain_rows(X, return_leaves=True)
+    fields = bundle.encoder.fields
+    results = [{'mpg': baseline + float(row.sum()), 'baseline': baseline,
+                'contributions': dict(zip(fields, row.tolist()))}
+               for row in contributions]
+    if percentiles is not None:
+        with metrics.stage("predict_distribution"):
+            dists = _distributions(*bundle.tree_forest().predict_distribution(X, percentiles, leaves),
+                                   percentiles)
+        for result, dist in zip(results, dists):
+            result.update(dist)
+    return results
+
+def _explanation_text(explanation):
+    parts = [f"{field} {value:+.1f}" for field, value in
+             sorted(explanation['contributions'].items(), key=lambda item: -abs(item[1]))]
+    return f"baseline {explanation['baseline']:.1f} MPG; " + ", ".join(parts)
+
+def is_low_confidence(mpg_value, std):
+    return std > LOW_CONFIDENCE_CV * abs(mpg_value)
+
+def predict_inputs(inputs, bundle=None):
+    """Predict MPG for a list of parsed input dicts via the lookup table, cache, then model."""
+    bundle = bundle or current
+    cache = bundle.cache
+    preds = [None] * len(inputs)
+    keys = [None] * len(inputs)
+    missing = list(range(len(inputs)))
+    if bundle.table is not None:
+        with metrics.stage("table_lookup"):
+            for i in missing:
+                preds[i] = bundle.table.lookup(inputs[i])
+            missing = [i for i, pred in enumerate(preds) if pred is None]
+    if cache is not None and missing:
+        with metrics.stage("cache_lookup"):
+            for i in missing:
+                keys[i] = cache_key(inputs[i])
+                preds[i] = cache.get(keys[i])
+            missing = [i for i in missing if preds[i] is None]
+    if missing:
+        if bundle.batcher is not None and len(missing) == 1:
+            with metrics.stage("encode"):
+                row = bundle.encoder.encode(inputs[missing[0]])
+            computed = [bundle.batcher.predict(row)]
+        else:
+            with metrics.stage("encode"):
+                X = bundle.encoder.encode_many([inputs[i] for i in missing])
+            if bundle.pool is not None:
+                with metrics.stage("pool_predict"):
+                    computed = bundle.pool.predict(X)
+            else:
+                computed = bundle.predict_rows(X)
+        for i, pred in zip(missing, computed):
+            preds[i] = float(pred)
+            if cache is not None:
+                cache.put(keys[i], preds[i])
+    return preds
+
+def _prepare_log_record(record):
+    # Runs on the log writer thread, so hashing the encoded row stays off
+    # the request path.
+    parsed = record.pop('parsed', None)
+    encoder = record.pop('encoder', None)
+    if parsed is not None and encoder is not None:
+        record['features_hash'] = hashlib.sha1(encoder.encode(parsed).tobytes()).hexdigest()[:16]
+    return record
+
+request_log = None
+if REQUEST_LOG_PATH:
+    request_log = RequestLogger(
+        REQUEST_LOG_PATH,
+        capacity=int(os.environ.get("MPG_REQUEST_LOG_BUFFER", 10000)),
+        max_bytes=int(float(os.environ.get("MPG_REQUEST_LOG_MAX_MB", 100)) * 1024 * 1024),
+        rotate_interval=float(os.environ.get("MPG_REQUEST_LOG_ROTATE_S", 0)) or None,
+        backup_count=int(os.environ.get("MPG_REQUEST_LOG_BACKUPS", 5)),
+        # One file per worker process (requests.<pid>.jsonl), rotated independently.
+        per_process=os.environ.get("MPG_REQUEST_LOG_PER_PROCESS", "1") != "0",
+        prepare=_prepare_log_record)
+
+def log_prediction(bundle, endpoint, raw, parsed, prediction, latency_ms, error=None):
+    if request_log is None:
+        return
+    request_log.log({
+        'ts': time.time(),
+        'endpoint': endpoint,
+        'inputs': raw,
+        'parsed': parsed,
+        'encoder': bundle.encoder if bundle is not None else None,
+        'prediction': prediction,
+        'error': error,
+        'model_version': bundle.version if bundle is not None else None,
+        'latency_ms': latency_ms,
+    })
+
+def interpret_mpg(mpg_value, std=None):
     if mpg_value < 20:
-        return "Poor fuel efficiency - typical for larger vehicles, trucks, and performance cars"
+        text = "Poor fuel efficiency - typical for larger vehicles, trucks, and performance cars"
     elif 20 <= mpg_value < 30:
-        return "Moderate fuel efficiency - common for midsize sedans and smaller SUVs"
+        text = "Moderate fuel efficiency - common for midsize sedans and smaller SUVs"
     elif 30 <= mpg_value < 40:
-        return "Good fuel efficiency - typical for compact cars and efficient sedans"
+        text = "Good fuel efficiency - typical for compact cars and efficient sedans"
     else:
-        return "Excellent fuel efficiency - common for hybrids, electric vehicles, and very efficient compact cars"
+        text = "Excellent fuel efficiency - common for hybrids, electric vehicles, and very efficient compact cars"
+    if std is not None and is_low_confidence(mpg_value, std):
+        text += f" (low confidence: the model's trees disagree by ±{std:.1f} MPG)"
+    return text
 
 # Enhanced HTML template with better contrast
 
@@ -607,6 +969,12 @@ RESULT_TEMPLATE = """<!DOCTYPE html>
             >>> EFFICIENCY RATING <<<
         </div>
         <div class="mpg-value">{{ mpg }} MPG</div>
+        {% if interval %}
+        <div class="interpretation">RANGE: {{ interval }}</div>
+        {% endif %}
+        {% if explanation %}
+        <div class="interpretation">WHY: {{ explanation }}</div>
+        {% endif %}
         <div class="interpretation">
             {{ interpretation }}
         </div>
@@ -614,41 +982,8 @@ RESULT_TEMPLATE = """<!DOCTYPE html>
     </div>
 </body>
 </html>"""
-@app.route("/")
-def home():
-    return render_template_string(HTML_TEMPLATE)
-
-@app.route("/predict", methods=["POST"])
-def predict():
-    try:
-        input_data = {
-            'Engine_Size': float(request.form['Engine_Size']),
-            'Engine_Cylinders': float(request.form['Engine_Cylinders']),
-            'Drive_Type': request.form['Drive_Type'],
-            'Fuel_Type': request.form['Fuel_Type'],
-            'Vehicle Class/Type': request.form['Vehicle Class/Type'],
-            'Car_Brand': request.form['Car_Brand'],
-            'Model_Year': int(request.form['Model_Year']),
-            'Fuel_Capacity': float(request.form['Fuel_Capacity'])
-        }
-
-        df_input = pd.DataFrame([input_data])
-        one_hot_cols = ['Drive_Type', 'Fuel_Type', 'Vehicle Class/Type']
-        df_input = pd.get_dummies(df_input, columns=one_hot_cols, drop_first=True)
-
-        hash_enc = HashingEncoder(cols=['Car_Brand'], n_components=16)
-        df_input = pd.concat([df_input.drop(columns=['Car_Brand']),
-                              hash_enc.fit_transform(pd.DataFrame([{'Car_Brand': input_data['Car_Brand']}]))], axis=1)
-
-        df_input = df_input.reindex(columns=columns, fill_value=0)
-        df_scaled = scaler.transform(df_input)
-        pred = model.predict(df_scaled)[0]
-        interpretation = interpret_mpg(pred)
 
-        return render_template_string(RESULT_TEMPLATE, mpg=f"{pred:.1f}", interpretation=interpretation)
-
-    except Exception as e:
-        return render_template_string("""
+ERROR_TEMPLATE = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -665,12 +1000,335 @@ def predict():
         <body>
             <div class="container">
                 <h1>⚠ GAME OVER ⚠</h1>
-                <p>ERROR: """ + str(e) + """</p>
+                <p>ERROR: {{ error }}</p>
                 <button class="btn" onclick="window.location.href='/'">★ RETRY ★</button>
             </div>
         </body>
         </html>
-        """)
+        """
+
+# Compiled once; the result and error values are passed in (and escaped)
+# rather than pasted into a fresh template string per request.
+RESULT_PAGE = app.jinja_env.from_string(RESULT_TEMPLATE)
+ERROR_PAGE = app.jinja_env.from_string(ERROR_TEMPLATE)
+
+def _precompressed(body):
+    """Return {content-encoding: bytes} for the identity, gzip and (optionally) brotli forms."""
+    variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    try:
+        import brotli  # optional dependency
+    except ImportError:
+        pass
+    else:
+        variants['br'] = brotli.compress(body, quality=11)
+    return variants
+
+# The landing page has no template variables: render it once and serve the
+# bytes, precompressed, with validators so browsers and proxies can cache it.
+HOME_PAGE = app.jinja_env.from_string(HTML_TEMPLATE).render().encode()
+HOME_VARIANTS = _precompressed(HOME_PAGE)
+HOME_ETAG = hashlib.sha1(HOME_PAGE).hexdigest()[:16]
+HOME_LAST_MODIFIED = datetime.fromtimestamp(int(os.path.getmtime(__file__)), timezone.utc)
+HOME_MAX_AGE = int(os.environ.get("MPG_HOME_MAX_AGE", 86400))
+
+def _pick_encoding(accept):
+    best, best_quality = 'identity', 0
+    for encoding in ('br', 'gzip'):
+        quality = accept[encoding]
+        if encoding in HOME_VARIANTS and quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+@app.before_request
+def _require_model():
+    if _loader_pid != os.getpid():
+        start_loading()  # first request in a freshly forked worker
+    if _ready.is_set():
+        return None
+    if request.endpoint in ("predict", "predict_batch"):
+        return jsonify(error="model is loading, retry shortly"), 503, {"Retry-After": "5"}
+    return None
+
+@app.route("/healthz")
+def healthz():
+    return jsonify(status="ok")
+
+@app.route("/readyz")
+def readyz():
+    if _ready.is_set():
+        return jsonify(ready=True, version=current.version)
+    body = {"ready": False}
+    if load_error is not None:
+        body["error"] = repr(load_error)
+    return jsonify(body), 503
+
+@app.route("/")
+def home():
+    encoding = _pick_encoding(request.accept_encodings)
+    etag = HOME_ETAG if encoding == 'identity' else f"{HOME_ETAG}-{encoding}"
+    response = Response(HOME_VARIANTS[encoding], mimetype="text/html")
+    response.set_etag(etag)
+    response.last_modified = HOME_LAST_MODIFIED
+    response.cache_control.public = True
+    response.cache_control.max_age = HOME_MAX_AGE
+    response.vary.add("Accept-Encoding")
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    return response.make_conditional(request)
+
+@app.route("/predict", methods=["POST"])
+def predict():
+    page, headers = predict_form(request.form, request.values)
+    return page, 200, headers
+
+def predict_form(form, values, start=None):
+    """Score one /predict form submission and render the result (or error) page.
+
+    Shared with the ASGI server (asgi.py): ``form`` and ``values`` are the
+    werkzeug MultiDicts Flask's ``request.form`` / ``request.values`` would
+    be. Returns (html, headers); PoolSaturated propagates so the server can
+    answer 503.
+    """
+    start = time.perf_counter() if start is None else start
+    metrics.count_request("predict")
+    bundle = current
+    input_data = None
+    try:
+        with metrics.stage("parse"):
+            input_data = parse_input(form)
+
+        interval = None
+        explanation = None
+        percentiles = None
+        if _wants_uncertainty(values):
+            if not bundle.supports_uncertainty:
+                raise ValueError(f"model version {bundle.version} does not support uncertainty")
+            percentiles = parse_percentiles(values.get('percentiles'))
+        if _wants_explanation(values):
+            explanation = explain_inputs([input_data], bundle, percentiles)[0]
+        if percentiles is not None:
+            dist = explanation or predict_distribution([input_data], percentiles, bundle)[0]
+            pred = dist['mpg']
+            interpretation = interpret_mpg(pred, dist['std'])
+            interval = ", ".join(f"{key} {value:.1f}" for key, value in dist['percentiles'].items())
+            interval += f" (±{dist['std']:.1f} std)"
+        else:
+            pred = explanation['mpg'] if explanation else predict_inputs([input_data], bundle)[0]
+            interpretation = interpret_mpg(pred)
+        log_prediction(bundle, "predict", form.to_dict(), input_data, pred,
+                       (time.perf_counter() - start) * 1e3)
+
+        with metrics.stage("render"):
+            page = RESULT_PAGE.render(mpg=f"{pred:.1f}", interpretation=interpretation, interval=interval,
+                                      explanation=explanation and _explanation_text(explanation))
+        metrics.observe("predict_total", time.perf_counter() - start)
+        return page, {"X-Model-Version": bundle.version}
+
+    except Exception as e:
+        metrics.count_error("predict", e)
+        log_prediction(bundle, "predict", form.to_dict(), input_data, None,
+                       (time.perf_counter() - start) * 1e3, error=str(e))
+        if isinstance(e, PoolSaturated):
+            raise
+        return ERROR_PAGE.render(error=str(e)), {}
+
+def _wants_uncertainty(values):
+    return values.get('uncertainty', '').lower() in ('1', 'true', 'yes', 'on')
+
+def _wants_explanation(values):
+    return values.get('explain', '').lower() in ('1', 'true', 'yes', 'on')
+
+def _field_error(e):
+    if isinstance(e, KeyError):
+        return f"missing field {e}"
+    return str(e)
+
+@app.route("/api/predict/batch", methods=["POST"])
+def predict_batch():
+    start = time.perf_counter()
+    with metrics.stage("parse"):
+        payload = request.get_json(silent=True)
+    body, status, headers = predict_payload(payload, request.values, start)
+    return jsonify(body), status, headers
+
+def predict_payload(payload, values, start=None):
+    """Score a parsed /api/predict/batch JSON body; returns (body dict, status, headers).
+
+    Shared with the ASGI server like ``predict_form``. ``values`` holds the
+    options (uncertainty, percentiles, explain), as Flask's ``request.values``.
+    """
+    start = time.perf_counter() if start is None else start
+    metrics.count_request("batch")
+    bundle = current
+    if isinstance(payload, dict):
+        payload = payload.get('vehicles')
+    if not isinstance(payload, list):
+        metrics.count_error("batch", TypeError())
+        return {'error': "expected a JSON array of vehicles or {\"vehicles\": [...]}"}, 400, {}
+
+    percentiles = None
+    if _wants_uncertainty(values):
+        if not bundle.supports_uncertainty:
+            error = ValueError(f"model version {bundle.version} does not support uncertainty")
+            metrics.count_error("batch", error)
+            return {'error': str(error)}, 400, {}
+        try:
+            percentiles = parse_percentiles(values.get('percentiles'))
+        except ValueError as e:
+            metrics.count_error("batch", e)
+            return {'error': f"invalid percentiles: {e}"}, 400, {}
+
+    max_batch = app.config['MAX_BATCH_SIZE']
+    if len(payload) > max_batch:
+        metrics.count_error("batch", OverflowError())
+        return {'error': f"batch of {len(payload)} exceeds the maximum of {max_batch}"}, 413, {}
+    explain = _wants_explanation(values)
+    max_explain = app.config['MAX_EXPLAIN_BATCH']
+    if explain and len(payload) > max_explain:
+        metrics.count_error("batch", OverflowError())
+        return {'error': f"explaining {len(payload)} vehicles exceeds the maximum of {max_explain}"}, 413, {}
+
+    results = [None] * len(payload)
+    valid_index = []
+    valid_inputs = []
+    for i, record in enumerate(payload):
+        try:
+            if not isinstance(record, dict):
+                raise TypeError("vehicle must be a JSON object")
+            valid_inputs.append(parse_input(record))
+            valid_index.append(i)
+        except (KeyError, ValueError, TypeError) as e:
+            metrics.count_error("batch_row", e)
+            results[i] = {'index': i, 'error': _field_error(e)}
+
+    explanations = None
+    if valid_inputs and explain:
+        explanations = explain_inputs(valid_inputs, bundle, percentiles)
+
+    preds = []
+    if valid_inputs and percentiles is not None:
+        dists = explanations or predict_distribution(valid_inputs, percentiles, bundle)
+        preds = [dist['mpg'] for dist in dists]
+        for i, dist in zip(valid_index, dists):
+            results[i] = {
+                'index': i,
+                'mpg': round(dist['mpg'], 1),
+                'std': round(dist['std'], 2),
+                'percentiles': {key: round(value, 1) for key, value in dist['percentiles'].items()},
+                'low_confidence': is_low_confidence(dist['mpg'], dist['std']),
+                'interpretation': interpret_mpg(dist['mpg'], dist['std']),
+            }
+    elif valid_inputs:
+        if explanations is not None:
+            preds = [explanation['mpg'] for explanation in explanations]
+        else:
+            preds = predict_inputs(valid_inputs, bundle)
+        for i, pred in zip(valid_index, preds):
+            results[i] = {'index': i, 'mpg': round(pred, 1), 'interpretation': interpret_mpg(pred)}
+    if explanations is not None:
+        for i, explanation in zip(valid_index, explanations):
+            results[i]['baseline'] = round(explanation['baseline'], 2)
+            results[i]['contributions'] = {field: round(value, 2)
+                                           for field, value in explanation['contributions'].items()}
+
+    if request_log is not None:
+        latency_ms = (time.perf_counter() - start) * 1e3
+        parsed = dict(zip(valid_index, valid_inputs))
+        predicted = dict(zip(valid_index, preds))
+        for i, result in enumerate(results):
+            log_prediction(bundle, "batch", payload[i], parsed.get(i), predicted.get(i), latency_ms,
+                           error=result.get('error'))
+
+    metrics.observe("batch_total", time.perf_counter() - start)
+    body = {'predictions': results, 'count': len(results), 'errors': len(results) - len(valid_inputs),
+            'model_version': bundle.version}
+    return body, 200, {"X-Model-Version": bundle.version}
+
+@app.errorhandler(PoolSaturated)
+def pool_saturated(e):
+    return jsonify(error="server busy, retry shortly"), 503, {"Retry-After": "1"}
+
+@metrics.register_collector
+def _component_metrics():
+    found = []
+    bundle = current
+    cache = bundle.cache if bundle is not None else None
+    batcher = bundle.batcher if bundle is not None else None
+    if cache is not None:
+        stats = cache.stats()
+        for name in ('hits', 'misses', 'shared_hits', 'shared_errors', 'evictions', 'expirations'):
+            found.append((f"mpg_cache_{name}_total", "counter", f"Prediction cache {name}.",
+                          [({}, stats[name])]))
+        found.append(("mpg_cache_size", "gauge", "Entries in the prediction cache.",
+                      [({}, stats['size'])]))
+    if batcher is not None:
+        stats = batcher.stats()
+        found.append(("mpg_microbatch_queue_depth", "gauge", "Rows waiting for a micro-batch.",
+                      [({}, stats['queue_depth'])]))
+        found.append(("mpg_microbatch_batches_total", "counter", "Micro-batches scored.",
+                      [({"size_le": size}, n) for size, n in stats['batch_size_histogram'].items()]))
+        found.append(("mpg_microbatch_wait_seconds", "summary",
+                      "Time a row waited in the micro-batch queue before scoring.", batcher.wait_seconds))
+        found.append(("mpg_microbatch_batch_size", "summary", "Rows per scored micro-batch.",
+                      batcher.batch_size))
+    pool = bundle.pool if bundle is not None else None
+    if pool is not None:
+        stats = pool.stats()
+        found.append(("mpg_pool_processes", "gauge", "Live inference worker processes.",
+                      [({}, stats['alive'])]))
+        found.append(("mpg_pool_slots_busy", "gauge", "Inference slots holding in-flight rows.",
+                      [({}, stats['slots_busy'])]))
+        for name in ('rows', 'saturated', 'restarts'):
+            found.append((f"mpg_pool_{name}_total", "counter", f"Inference pool {name}.",
+                          [({}, stats[name])]))
+    if request_log is not None:
+        stats = request_log.stats()
+        for name in ('written', 'dropped', 'errors', 'rotations'):
+            found.append((f"mpg_request_log_{name}_total", "counter", f"Request log records {name}.",
+                          [({}, stats[name])]))
+    found.append(("mpg_model_ready", "gauge", "1 once the model is loaded.",
+                  [({"version": bundle.version if bundle is not None else ""},
+                    int(_ready.is_set()))]))
+    return found
+
+def _admin_authorized():
+    supplied = request.headers.get("X-Admin-Token", "")
+    if request.headers.get("Authorization", "").startswith("Bearer "):
+        supplied = request.headers["Authorization"][len("Bearer "):]
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(supplied, ADMIN_TOKEN)
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """Load a model version in the background and swap it in once it passes a smoke test.
+
+    Body (optional): {"version": "<name>"}; defaults to what MODEL_DIR/CURRENT
+    names. ?wait=1 blocks until the swap and reports the result.
+
+    Only the process that handles the request loads the version directly.
+    A named version that loads is then published to CURRENT, and the other
+    gunicorn workers (and the master, for the workers it respawns) switch
+    to it within MPG_RELOAD_POLL_S seconds.
+    """
+    if not _admin_authorized():
+        return jsonify(error="forbidden"), 403
+    version = (request.get_json(silent=True) or {}).get('version')
+    if request.args.get('wait', '').lower() in ('1', 'true', 'yes'):
+        try:
+            old_version, new_version = reload_model(version, publish=True)
+        except Exception as e:
+            status = 404 if isinstance(e, FileNotFoundError) else 409 if isinstance(e, RuntimeError) else 500
+            return jsonify(error=repr(e), version=current.version if current else None), status
+        return jsonify(previous_version=old_version, version=new_version)
+    if _reload_lock.locked():
+        return jsonify(error="a reload is already in progress"), 409
+    _reload_in_background(version, publish=True)
+    return jsonify(reloading=True, version=current.version if current else None), 202
+
+@app.route("/metrics")
+def metrics_endpoint():
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+start_loading()
 
 if __name__ == "__main__":
     app.run(debug=True)
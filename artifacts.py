@@ -0,0 +1,187 @@
+"""
+Versioned model artifacts and the immutable bundle that serves them.
+
+With MPG_MODEL_DIR set, each trained model lives in its own subdirectory
+(``models/20240101-120000/`` holding the pickles and/or ``mpg_forest/``)
+and the file ``models/CURRENT`` names the version to serve; without a
+CURRENT file the newest version (by name) is used. Without MPG_MODEL_DIR
+the artifacts are read from the working directory as before.
+
+A ``ModelBundle`` holds everything needed to answer a request for one
+version. The app swaps whole bundles, so a request that picked up a bundle
+finishes on it even if a reload lands meanwhile.
+"""
+
+import math
+import os
+
+import numpy as np
+
+import metrics
+from cache import artifact_fingerprint
+from features import EXAMPLE_INPUT, TRANSFORM_FILE, FeatureEncoder, check_parity, form_records
+from forest import CompiledForest
+from lookup_table import TABLE_PATH, LookupTable
+
+MODEL_DIR = os.environ.get("MPG_MODEL_DIR", "")
+FOREST_PATH = os.environ.get("MPG_FOREST_PATH", "mpg_forest")
+PICKLES = ("mpg_model.pkl", "scaler.pkl", "columns.pkl")
+CURRENT_FILE = "CURRENT"
+
+USE_TABLE = os.environ.get("MPG_LOOKUP_TABLE", "1") != "0"
+
+
+def list_versions(model_dir):
+    return sorted(entry.name for entry in os.scandir(model_dir)
+                  if entry.is_dir() and not entry.name.startswith("."))
+
+
+def resolve_version(model_dir=MODEL_DIR, version=None):
+    """Return (version name, directory) of the artifacts to serve.
+
+    ``version`` picks a specific version; otherwise the one named in
+    CURRENT, falling back to the newest. Without a model directory the
+    working directory is used and the name is None.
+    """
+    if not model_dir:
+        return None, "."
+    if version is None:
+        try:
+            with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            versions = list_versions(model_dir)
+            if not versions:
+                raise FileNotFoundError(f"no model versions in {model_dir}")
+            version = versions[-1]
+    path = os.path.join(model_dir, version)
+    if os.path.basename(os.path.normpath(version)) != version or not os.path.isdir(path):
+        raise FileNotFoundError(f"no model version {version!r} in {model_dir}")
+    return version, path
+
+
+def publish_version(model_dir, version):
+    """Point CURRENT at ``version`` (atomically, so readers never see a partial name)."""
+    tmp = os.path.join(model_dir, CURRENT_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(model_dir, CURRENT_FILE))
+
+
+class ModelBundle:
+    """One loaded model version: artifacts, encoder and per-version cache/batcher/pool."""
+
+    def __init__(self, model, scaler, columns, forest, version, fingerprint, table=None,
+                 encoder=None):
+        self.model = model
+        self.scaler = scaler
+        self.columns = columns
+        self.forest = forest
+        self.version = version
+        self.fingerprint = fingerprint
+        self.table = table
+        if encoder is None:
+            encoder = FeatureEncoder(columns)
+            if scaler is not None:
+                encoder = encoder.with_scaler(scaler)
+        self.encoder = encoder
+        self.cache = None
+        self.batcher = None
+        self.pool = None
+        self._tree_forest = forest
+
+    def predict_rows(self, X):
+        """Predict MPG for raw encoded feature rows of shape (n, len(columns))."""
+        if self.forest is not None:
+            with metrics.stage("predict"):
+                return self.forest.predict(X)
+        with metrics.stage("scale"):
+            X = self.encoder.scale(X)
+        with metrics.stage("predict"):
+            return self.model.predict(X)
+
+    @property
+    def supports_uncertainty(self):
+        """Whether per-tree spread is meaningful (a forest, not a boosted student)."""
+        if self.forest is not None:
+            return self.forest.averaged
+        return not hasattr(self.model, 'learning_rate')
+
+    def explain_rows(self, X, return_leaves=False):
+        """Return (baseline, per-field contributions of shape (n, len(encoder.fields))),
+        plus each row's leaf in every tree if ``return_leaves`` is set."""
+        with metrics.stage("explain"):
+            baseline, contributions, leaves = self.tree_forest().contributions(X, return_leaves=True)
+            by_field = self.encoder.sum_by_field(contributions)
+        if return_leaves:
+            return baseline, by_field, leaves
+        return baseline, by_field
+
+    def tree_forest(self):
+        """The compiled forest, compiling the sklearn pickle once if that is all we have."""
+        if self._tree_forest is None:
+            self._tree_forest = CompiledForest.from_sklearn(self.model, self.scaler, self.columns)
+        return self._tree_forest
+
+    def smoke_test(self):
+        """Raise ValueError unless the bundle produces a finite prediction.
+
+        Also checks that the feature transform matches the model's columns
+        and scaler, and encodes every form combination the same way per row
+        and vectorized. A lookup table that disagrees with the model (e.g.
+        left over from an older model) is dropped rather than failing the load.
+        """
+        if self.encoder.columns != list(self.columns):
+            raise ValueError(f"feature transform columns differ from the model's (version {self.version})")
+        if self.scaler is not None:
+            expected = FeatureEncoder(self.columns).with_scaler(self.scaler)
+            if self.encoder.mean_ is None or not (np.array_equal(self.encoder.mean_, expected.mean_)
+                                                  and np.array_equal(self.encoder.scale_, expected.scale_)):
+                raise ValueError(f"feature transform disagrees with scaler.pkl (version {self.version})")
+        check_parity(self.encoder, form_records())
+        pred = self.predict_rows(self.encoder.encode_many([EXAMPLE_INPUT]))
+        if len(pred) != 1 or not math.isfinite(float(pred[0])):
+            raise ValueError(f"smoke prediction failed for version {self.version}: {pred!r}")
+        if self.table is not None:
+            try:
+                self.table.verify(self.encoder, self.predict_rows)
+            except ValueError as e:
+                print(f"[v0] Ignoring lookup table for version {self.version}: {e}")
+                self.table = None
+        return float(pred[0])
+
+
+def load_bundle(directory=".", version=None, use_table=USE_TABLE):
+    """Load the artifacts in ``directory`` into a ModelBundle.
+
+    The compiled forest has the scaler folded in and carries its own
+    column list, so the 200+ MB sklearn pickle is only a fallback. It is
+    memory-mapped so all workers share the same pages, as is the optional
+    lookup table (see lookup_table.py). Inputs are encoded with the saved
+    feature transform, or one rebuilt from the columns for artifacts that
+    predate it.
+    """
+    forest_path = os.path.join(directory, FOREST_PATH)
+    if os.path.exists(forest_path):
+        forest = CompiledForest.load(forest_path, mmap_mode="r")
+        model = scaler = None
+        columns = forest.columns
+        paths = [forest_path]
+    else:
+        import joblib  # unpickling pulls in sklearn; keep it off the fast path
+        paths = [os.path.join(directory, name) for name in PICKLES]
+        model, scaler, columns = (joblib.load(path) for path in paths)
+        forest = None
+    table = None
+    table_path = os.path.join(directory, TABLE_PATH)
+    if use_table and os.path.exists(table_path):
+        table = LookupTable.load(table_path)
+        paths.append(table_path)
+    encoder = None
+    transform_path = os.path.join(directory, TRANSFORM_FILE)
+    if os.path.exists(transform_path):
+        encoder = FeatureEncoder.load(transform_path)
+        paths.append(transform_path)
+    fingerprint = artifact_fingerprint(paths)
+    return ModelBundle(model, scaler, columns, forest, version or fingerprint, fingerprint, table,
+                       encoder)
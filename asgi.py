@@ -0,0 +1,332 @@
+"""
+ASGI entry point serving the same endpoints as app.py under uvicorn.
+
+Under gunicorn's sync worker a request holds the worker from its first byte
+to its last, so one slow upload stalls everyone queued behind it, and
+excess load waits silently in the listen backlog. Here the event loop
+reads and parses requests (any number at once), and only the scoring runs
+in a bounded thread pool with explicit admission control:
+
+* MPG_ASGI_THREADS (default: the CPU count) requests score at once;
+* up to MPG_ASGI_QUEUE (default 64) more wait for a thread, each for at
+  most MPG_ASGI_QUEUE_TIMEOUT_MS (default 1000);
+* past either limit /predict and /api/predict/batch answer 503 with
+  Retry-After at once rather than queueing.
+
+/, /healthz, /readyz and /metrics are answered on the event loop, so they
+stay responsive under overload; anything else (/admin/reload) runs the
+Flask app through a small WSGI bridge in the same pool.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 [--workers N]
+"""
+
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import CombinedMultiDict, MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+from werkzeug.http import http_date, parse_accept_header, parse_date, parse_etags, parse_options_header
+
+import app as mpg
+import metrics
+from inference_pool import PoolSaturated
+
+THREADS = int(os.environ.get("MPG_ASGI_THREADS", 0)) or os.cpu_count() or 1
+QUEUE = int(os.environ.get("MPG_ASGI_QUEUE", 64))
+QUEUE_TIMEOUT = float(os.environ.get("MPG_ASGI_QUEUE_TIMEOUT_MS", 1000)) / 1000
+MAX_BODY = int(float(os.environ.get("MPG_ASGI_MAX_BODY_MB", 32)) * 1024 * 1024)
+
+BUSY = (503, {'error': "server busy, retry shortly"}, {"Retry-After": "1"})
+LOADING = (503, {'error': "model is loading, retry shortly"}, {"Retry-After": "5"})
+
+
+class Overloaded(Exception):
+    """The scoring pool's queue is full, or a request waited in it too long."""
+
+
+class Admission:
+    """A fixed-size thread pool that refuses work instead of queueing without bound.
+
+    ``pending`` is only touched on the event loop, so it needs no lock.
+    """
+
+    def __init__(self, threads=THREADS, queue=QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="mpg-asgi")
+        self.threads = threads
+        self.limit = threads + queue
+        self.queue_timeout = queue_timeout
+        self.pending = 0
+        self.rejected = {'full': 0, 'timeout': 0}
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool; raises Overloaded if it cannot start in time."""
+        if self.pending >= self.limit:
+            self.rejected['full'] += 1
+            raise Overloaded("queue full")
+        self.pending += 1
+        queued = time.perf_counter()
+
+        def call():
+            if time.perf_counter() - queued > self.queue_timeout:
+                raise Overloaded("queued too long")
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+        except Overloaded:
+            self.rejected['timeout'] += 1
+            raise
+        finally:
+            self.pending -= 1
+
+    def stats(self):
+        return {'threads': self.threads, 'pending': self.pending, 'rejected': dict(self.rejected)}
+
+
+admission = Admission()
+
+
+@metrics.register_collector
+def _admission_metrics():
+    stats = admission.stats()
+    return [
+        ("mpg_asgi_threads", "gauge", "Scoring threads of the ASGI server.", [({}, stats['threads'])]),
+        ("mpg_asgi_pending", "gauge", "Requests scoring or queued for a scoring thread.",
+         [({}, stats['pending'])]),
+        ("mpg_asgi_rejected_total", "counter", "Requests answered 503 by admission control.",
+         [({"reason": reason}, n) for reason, n in stats['rejected'].items()]),
+    ]
+
+
+# --- HTTP plumbing -----------------------------------------------------------
+
+class BodyTooLarge(Exception):
+    pass
+
+
+class Disconnected(Exception):
+    pass
+
+
+async def read_body(receive, limit=MAX_BODY):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise Disconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def header_map(scope):
+    headers = {}
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+    return headers
+
+
+async def respond(send, status, body=b'', headers=None, content_type=None, head=False):
+    raw = [(b'content-length', str(len(body)).encode())]
+    if content_type is not None:
+        raw.append((b'content-type', content_type.encode()))
+    raw += [(name.lower().encode('latin-1'), str(value).encode('latin-1'))
+            for name, value in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+    await send({'type': 'http.response.body', 'body': b'' if head else body})
+
+
+def json_body(body):
+    # Same bytes as Flask's jsonify outside debug mode.
+    return (json.dumps(body, sort_keys=True, separators=(",", ":")) + "\n").encode()
+
+
+async def respond_json(send, status, body, headers=None, head=False):
+    await respond(send, status, json_body(body), headers, "application/json", head)
+
+
+def query_args(scope):
+    query = scope.get('query_string', b'').decode('latin-1')
+    return MultiDict(urllib.parse.parse_qsl(query, keep_blank_values=True))
+
+
+# --- routes ------------------------------------------------------------------
+
+async def home(scope, send, headers):
+    encoding = mpg._pick_encoding(parse_accept_header(headers.get('accept-encoding')))
+    etag = mpg.HOME_ETAG if encoding == 'identity' else f"{mpg.HOME_ETAG}-{encoding}"
+    response_headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(mpg.HOME_LAST_MODIFIED),
+        "Cache-Control": f"public, max-age={mpg.HOME_MAX_AGE}",
+        "Vary": "Accept-Encoding",
+    }
+    if encoding != 'identity':
+        response_headers["Content-Encoding"] = encoding
+    if 'if-none-match' in headers:
+        not_modified = parse_etags(headers['if-none-match']).contains_weak(etag)
+    else:
+        since = parse_date(headers.get('if-modified-since'))
+        not_modified = since is not None and mpg.HOME_LAST_MODIFIED <= since
+    if not_modified:
+        await respond(send, 304, headers=response_headers)
+        return
+    await respond(send, 200, mpg.HOME_VARIANTS[encoding], response_headers, "text/html; charset=utf-8",
+                  scope['method'] == 'HEAD')
+
+
+def parse_form(body, headers):
+    mimetype, options = parse_options_header(headers.get('content-type', ''))
+    request_class = mpg.app.request_class
+    parser = FormDataParser(max_form_memory_size=request_class.max_form_memory_size,
+                            max_form_parts=request_class.max_form_parts)
+    _, form, _ = parser.parse(io.BytesIO(body), mimetype, len(body), options)
+    return form
+
+
+async def predict(scope, receive, send, headers, start):
+    body = await read_body(receive)
+    with metrics.stage("parse_form"):
+        form = parse_form(body, headers)
+    values = CombinedMultiDict([query_args(scope), form])
+    page, response_headers = await admission.run(mpg.predict_form, form, values, start)
+    await respond(send, 200, page.encode(), response_headers, "text/html; charset=utf-8")
+
+
+async def predict_batch(scope, receive, send, headers, start):
+    body = await read_body(receive)
+    mimetype, _ = parse_options_header(headers.get('content-type', ''))
+    payload = None
+    if mimetype == 'application/json' or mimetype.endswith('+json'):
+        with metrics.stage("parse"):
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                payload = None
+    result, status, response_headers = await admission.run(mpg.predict_payload, payload, query_args(scope), start)
+    await respond_json(send, status, result, response_headers)
+
+
+def call_wsgi(scope, body):
+    """Run one request through the Flask app; returns (status, headers, body)."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in header_map(scope).items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    response = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = response_headers
+
+    chunks = mpg.app(environ, start_response)
+    try:
+        data = b''.join(chunks)
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return response['status'], response['headers'], data
+
+
+async def fallback(scope, receive, send):
+    body = await read_body(receive)
+    status, headers, data = await admission.run(call_wsgi, scope, body)
+    raw = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw})
+    await send({'type': 'http.response.body', 'body': data})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            mpg.start_loading()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            admission.executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+SCORING = {'/predict': predict, '/api/predict/batch': predict_batch}
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    start = time.perf_counter()
+    path, method = scope['path'], scope['method']
+    headers = header_map(scope)
+    head = method == 'HEAD'
+    try:
+        if path in SCORING and method == 'POST':
+            if not mpg.is_ready():
+                await respond_json(send, LOADING[0], LOADING[1], LOADING[2])
+                return
+            await SCORING[path](scope, receive, send, headers, start)
+        elif path == '/' and method in ('GET', 'HEAD'):
+            await home(scope, send, headers)
+        elif path == '/healthz' and method in ('GET', 'HEAD'):
+            await respond_json(send, 200, {'status': "ok"}, head=head)
+        elif path == '/readyz' and method in ('GET', 'HEAD'):
+            if mpg.is_ready():
+                await respond_json(send, 200, {'ready': True, 'version': mpg.current.version}, head=head)
+            else:
+                body = {'ready': False}
+                if mpg.load_error is not None:
+                    body['error'] = repr(mpg.load_error)
+                await respond_json(send, 503, body, head=head)
+        elif path == '/metrics' and method in ('GET', 'HEAD'):
+            await respond(send, 200, metrics.render().encode(), {},
+                          "text/plain; version=0.0.4; charset=utf-8", head)
+        else:
+            await fallback(scope, receive, send)
+    except (Overloaded, PoolSaturated):
+        await respond_json(send, BUSY[0], BUSY[1], BUSY[2])
+    except (BodyTooLarge, RequestEntityTooLarge):
+        await respond_json(send, 413, {'error': "request body too large"})
+    except Disconnected:
+        pass
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="127.0.0.1", port=int(os.environ.get("PORT", 8000)))
@@ -0,0 +1,136 @@
+"""
+Micro-batching for concurrent single-row predictions.
+
+Requests handed to ``MicroBatcher.submit`` are queued; a background thread
+waits up to ``max_wait`` seconds after the first queued row (or until
+``max_batch_size`` rows are waiting), scores the stacked rows with one
+vectorized call and resolves each request's future. Useful with threaded
+(``--worker-class gthread --threads N``) or async workers, where several
+requests are in flight in one process; ``predict_async`` wraps the future
+for asyncio handlers.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import Summary
+
+
+class MicroBatcher:
+    """Coalesce single-row predictions into batched ``predict_fn`` calls."""
+
+    def __init__(self, predict_fn, max_batch_size=64, max_wait=0.002, latency_window=2048):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.batches = 0
+        self.rows = 0
+        self.batch_sizes = {}
+        # Per-row wait before scoring and per-batch size, for /metrics.
+        self.wait_seconds = Summary(window=latency_window)
+        self.batch_size = Summary()
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork: threads do not survive
+        # into gunicorn workers forked from a --preload master.
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._queue.clear()
+            self._thread = threading.Thread(target=self._run, name="mpg-microbatcher", daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """Queue one encoded feature row; returns a Future for its prediction."""
+        future = Future()
+        with self._cond:
+            self._ensure_thread()
+            self._queue.append((row, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def close(self):
+        """Let the worker thread exit once the queued rows are scored."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def predict(self, row, timeout=None):
+        return self.submit(row).result(timeout)
+
+    async def predict_async(self, row):
+        return await asyncio.wrap_future(self.submit(row))
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    self._thread = None  # a late submit starts a new one
+                    return None
+                self._cond.wait()
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                preds = self.predict_fn(np.vstack([row for row, _, _ in batch]))
+            except BaseException as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            # Recorded first, so stats() already counts a batch its callers saw.
+            self._record(batch, started)
+            for (_, future, _), pred in zip(batch, preds):
+                future.set_result(float(pred))
+
+    def _record(self, batch, started):
+        size = len(batch)
+        bucket = 1 << (size - 1).bit_length()
+        with self._cond:
+            self.batches += 1
+            self.rows += size
+            self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        self.batch_size.observe(size)
+        for _, _, enqueued in batch:
+            self.wait_seconds.observe(started - enqueued)
+
+    def stats(self):
+        """Queue depth, batch-size histogram (power-of-two buckets) and added latency."""
+        with self.wait_seconds.lock:
+            waits = np.array(self.wait_seconds.samples) * 1e3
+        with self._cond:
+            stats = {
+                'queue_depth': len(self._queue),
+                'batches': self.batches,
+                'rows': self.rows,
+                'mean_batch_size': self.rows / self.batches if self.batches else 0.0,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+            }
+        if len(waits):
+            stats['added_latency_ms'] = {
+                'p50': float(np.percentile(waits, 50)),
+                'p99': float(np.percentile(waits, 99)),
+                'max': float(waits.max()),
+            }
+        return stats
@@ -0,0 +1,198 @@
+"""
+Load comparison: gunicorn/Flask (sync worker) versus the ASGI server.
+
+Starts each server on the same artifacts with the same number of worker
+processes -- gunicorn as the Dockerfile runs it (``--worker-class sync
+--timeout 120``) and ``uvicorn asgi:app`` -- and drives /predict at 1, 16
+and 256 concurrent clients (one connection per request). For each level it
+reports successful requests per second, latency of the successful ones,
+and how many were refused with 503 or failed outright.
+
+A second scenario adds --slow-clients clients that trickle their form body
+over --slow-seconds while 16 normal clients run: the sync worker serves
+nobody while it reads a slow body, the event loop does.
+
+    python benchmarks/bench_asgi.py [--artifacts DIR] [--workers 1] [--output asgi.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from itertools import count
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_workers_rss import wait_ready  # noqa: E402
+from benchmarks.synthetic import make_requests, write_artifacts  # noqa: E402
+
+
+def server_command(kind, port, workers, workdir):
+    if kind == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+                "--worker-class", "sync", "--timeout", "120", "--preload", "--chdir", workdir, "app:app"]
+    return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+
+
+def post_form(port, body, timeout=60):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        conn.request("POST", "/predict", body=body,
+                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def slow_post(port, body, seconds):
+    """Send the form body a few bytes at a time over ``seconds``."""
+    sock = socket.create_connection(("127.0.0.1", port), timeout=seconds + 60)
+    try:
+        sock.sendall((f"POST /predict HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+                      f"Content-Type: application/x-www-form-urlencoded\r\n"
+                      f"Content-Length: {len(body)}\r\n\r\n").encode())
+        pieces = [body[i:i + 8] for i in range(0, len(body), 8)]
+        for piece in pieces:
+            sock.sendall(piece)
+            time.sleep(seconds / len(pieces))
+        while sock.recv(65536):
+            pass
+    finally:
+        sock.close()
+
+
+def drive(port, bodies, concurrency, n_requests):
+    """Issue ``n_requests`` form posts from ``concurrency`` threads."""
+    ticket = count()
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            i = next(ticket)
+            if i >= n_requests:
+                return
+            start = time.perf_counter()
+            try:
+                status = post_form(port, bodies[i % len(bodies)])
+            except OSError:
+                status = 'error'
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1e3 if latencies else np.array([np.nan])
+    return {
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'ok': statuses[200],
+        'busy_503': statuses[503],
+        'failed': n_requests - statuses[200] - statuses[503],
+        'ok_per_s': statuses[200] / elapsed,
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def run_server(kind, workdir, bodies, args):
+    env = dict(os.environ, PYTHONPATH=ROOT, MPG_REQUEST_LOG="", MPG_CACHE_SIZE="0")
+    proc = subprocess.Popen(server_command(kind, args.port, args.workers, workdir), cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    results = {}
+    try:
+        wait_ready(f"http://127.0.0.1:{args.port}/readyz")
+        drive(args.port, bodies, 4, 50)  # warm-up
+        for concurrency in args.concurrency:
+            n = max(args.requests, 2 * concurrency)
+            result = drive(args.port, bodies, concurrency, n)
+            results[f"c={concurrency}"] = result
+            print(f"  {kind:<10}{concurrency:>6}{result['ok_per_s']:>10.1f}{result['p50_ms']:>10.1f}"
+                  f"{result['p99_ms']:>10.1f}{result['busy_503']:>7}{result['failed']:>8}")
+
+        slow = [threading.Thread(target=slow_post, args=(args.port, bodies[i], args.slow_seconds))
+                for i in range(args.slow_clients)]
+        for t in slow:
+            t.start()
+        time.sleep(0.2)  # let the slow uploads get hold of the server
+        result = drive(args.port, bodies, 16, args.requests)
+        for t in slow:
+            t.join()
+        results['slow_uploads'] = result
+        print(f"  {kind:<10}{'16+' + str(args.slow_clients) + 's':>6}{result['ok_per_s']:>10.1f}"
+              f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['busy_503']:>7}{result['failed']:>8}")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", help="directory with model pickles and mpg_forest/")
+    parser.add_argument("--n-estimators", type=int, default=100,
+                        help="trees in the synthetic model (ignored with --artifacts)")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for both servers")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 256])
+    parser.add_argument("--requests", type=int, default=1000, help="requests per load level")
+    parser.add_argument("--slow-clients", type=int, default=4)
+    parser.add_argument("--slow-seconds", type=float, default=2.0)
+    parser.add_argument("--servers", nargs="+", default=["gunicorn", "uvicorn"],
+                        choices=["gunicorn", "uvicorn"])
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    tmp = None
+    workdir = args.artifacts
+    if workdir is None:
+        tmp = workdir = tempfile.mkdtemp(prefix="mpg-bench-")
+        print("Fitting synthetic artifacts...")
+        write_artifacts(workdir, n_estimators=args.n_estimators)
+    workdir = os.path.abspath(workdir)
+    bodies = [urllib.parse.urlencode(v).encode() for v in make_requests(500)]
+
+    results = {'cpus': os.cpu_count(), 'workers': args.workers, 'servers': {}}
+    print(f"{os.cpu_count()} CPUs, {args.workers} worker process(es) per server")
+    print(f"  {'server':<10}{'conc':>6}{'ok/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'503':>7}{'failed':>8}")
+    try:
+        for kind in args.servers:
+            results['servers'][kind] = run_server(kind, workdir, bodies, args)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Dataset load time and peak memory: pd.read_csv versus the columnar cache.
+
+Writes a synthetic vehicles CSV (--rows), converts it once with dataset.py,
+then loads it in a fresh interpreter per case so peak RSS is not shared:
+
+* read_csv of the whole file, and of just the model's input columns;
+* dataset.load of every column, and of just the input columns;
+* each load followed by touching every value (summing the numeric columns
+  and counting categories), since memory-mapped columns are only read on
+  first access.
+
+Peak memory is the growth of the process's peak RSS over its RSS after
+imports.
+
+    python benchmarks/bench_dataset.py [--rows 1000000] [--output dataset.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+CASES = ["read_csv", "read_csv usecols", "dataset.load", "dataset.load columns"]
+
+
+def peak_rss_kb():
+    # VmHWM rather than ru_maxrss: Linux carries ru_maxrss across exec, so a
+    # child would inherit the benchmark parent's peak.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(case, csv_path, cache_dir, touch):
+    """Run one case in this (fresh) process and print its measurements as JSON."""
+    import numpy as np
+    import pandas as pd
+
+    import dataset
+    from features import INPUT_FIELDS
+
+    before = peak_rss_kb()
+    start = time.perf_counter()
+    if case == "read_csv":
+        df = pd.read_csv(csv_path)
+    elif case == "read_csv usecols":
+        df = pd.read_csv(csv_path, usecols=INPUT_FIELDS)
+    elif case == "dataset.load":
+        df = dataset.load(cache_dir)
+    else:
+        df = dataset.load(cache_dir, columns=INPUT_FIELDS)
+    load_s = time.perf_counter() - start
+    if touch:
+        for name in df.columns:
+            if isinstance(df[name].dtype, pd.CategoricalDtype):
+                df[name].value_counts()
+            elif pd.api.types.is_numeric_dtype(df[name]):
+                np.nansum(df[name].to_numpy())
+            else:
+                df[name].nunique()
+    total_s = time.perf_counter() - start
+    peak = peak_rss_kb()
+    print(json.dumps({'load_s': load_s, 'total_s': total_s,
+                      'peak_mb': (peak - before) / 1024, 'shape': list(df.shape)}))
+
+
+def run(case, csv_path, cache_dir, touch):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", case,
+                          csv_path, cache_dir] + (["--touch"] if touch else []),
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--csv", help="existing vehicles CSV to use instead of synthetic rows")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--child", nargs=3, metavar=("CASE", "CSV", "CACHE"), help=argparse.SUPPRESS)
+    parser.add_argument("--touch", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child, args.touch)
+        return
+
+    import dataset
+    from benchmarks.synthetic import make_vehicles
+
+    tmp = tempfile.mkdtemp(prefix="mpg-bench-")
+    try:
+        csv_path = args.csv
+        if csv_path is None:
+            csv_path = os.path.join(tmp, "vehicles.csv")
+            print(f"Writing {args.rows:,} synthetic rows...")
+            make_vehicles(args.rows).to_csv(csv_path, index=False)
+        start = time.perf_counter()
+        cache_dir = dataset.ensure(csv_path, os.path.join(tmp, "cache"))
+        convert_s = time.perf_counter() - start
+        csv_mb = os.path.getsize(csv_path) / 1e6
+        cache_mb = sum(e.stat().st_size for e in os.scandir(cache_dir)) / 1e6
+        print(f"CSV {csv_mb:.1f} MB; columnar cache {cache_mb:.1f} MB, converted once in {convert_s:.2f}s")
+
+        results = {'csv_mb': csv_mb, 'cache_mb': cache_mb, 'convert_s': convert_s, 'cases': {}}
+        print(f"{'case':<24}{'load s':>9}{'peak MB':>9}{'+touch s':>10}{'peak MB':>9}")
+        for case in CASES:
+            lazy = run(case, csv_path, cache_dir, touch=False)
+            touched = run(case, csv_path, cache_dir, touch=True)
+            results['cases'][case] = {'load': lazy, 'touched': touched}
+            print(f"{case:<24}{lazy['load_s']:>9.3f}{lazy['peak_mb']:>9.1f}"
+                  f"{touched['total_s']:>10.3f}{touched['peak_mb']:>9.1f}")
+    finally:
+        shutil.rmtree(tmp)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
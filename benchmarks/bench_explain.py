@@ -0,0 +1,113 @@
+"""
+Cost of per-field explanations (CompiledForest.contributions) versus a plain prediction.
+
+Uses mpg_model.pkl / scaler.pkl / columns.pkl from --artifacts if they are
+present, otherwise fits a synthetic 300-tree forest so it runs offline.
+For batches of 1 to --rows encoded form inputs it reports p50 latency of:
+
+* ``forest.predict``;
+* ``contributions`` plus the roll-up onto the 8 form fields, as
+  ``explain=1`` runs it;
+* the naive alternative: re-predicting once per field with that field
+  replaced by a reference vehicle's (9 forest passes).
+
+Contributions are first checked to add up to the prediction. Exits with
+status 1 if explaining costs more than --max-ratio times predicting.
+
+    python benchmarks/bench_explain.py [--artifacts DIR] [--rows 1000] [--max-ratio 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from benchmarks.synthetic import fit_artifacts, make_requests  # noqa: E402
+from features import EXAMPLE_INPUT, FeatureEncoder, field_of_column  # noqa: E402
+from forest import CompiledForest  # noqa: E402
+
+
+def p50_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.percentile(samples, 50)) * 1e3
+
+
+def load_artifacts(args):
+    paths = [os.path.join(args.artifacts, name)
+             for name in ("mpg_model.pkl", "scaler.pkl", "columns.pkl")]
+    # A checkout without `git lfs pull` only has tiny pointer files.
+    if all(os.path.exists(p) for p in paths) and os.path.getsize(paths[0]) > 1024:
+        return (joblib.load(p) for p in paths)
+    print(f"No artifacts in {args.artifacts!r}; fitting a synthetic {args.trees}-tree forest")
+    model, scaler, columns, _, _ = fit_artifacts(n_estimators=args.trees)
+    return model, scaler, columns
+
+
+def occlusion(forest, encoder, X, reference):
+    """Per-field effect by re-predicting with each field swapped for ``reference``."""
+    fields = [field_of_column(column) for column in encoder.columns]
+    pred = forest.predict(X)
+    out = np.empty((len(X), len(encoder.fields)))
+    for j, field in enumerate(encoder.fields):
+        cols = [i for i, f in enumerate(fields) if f == field]
+        swapped = X.copy()
+        swapped[:, cols] = reference[cols]
+        out[:, j] = pred - forest.predict(swapped)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", default=".")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--max-ratio", type=float, default=3.0,
+                        help="fail if explain p50 exceeds this multiple of predict p50")
+    args = parser.parse_args()
+
+    model, scaler, columns = load_artifacts(args)
+    forest = CompiledForest.from_sklearn(model, scaler, columns)
+    encoder = FeatureEncoder(columns).with_scaler(scaler)
+    X = encoder.encode_many(make_requests(args.rows))
+    reference = encoder.encode(EXAMPLE_INPUT)
+
+    def explain(rows):
+        baseline, contributions = forest.contributions(rows)
+        return baseline, encoder.sum_by_field(contributions)
+
+    baseline, by_field = explain(X)
+    np.testing.assert_allclose(baseline + by_field.sum(axis=1), forest.predict(X), rtol=0, atol=1e-9)
+    print(f"{forest.n_trees} trees (depth {forest.depth}), {len(columns)} columns -> "
+          f"{len(encoder.fields)} fields; contributions add up on {len(X)} rows")
+    print()
+
+    print(f"{'rows':>6}{'predict ms':>12}{'explain ms':>12}{'ratio':>7}"
+          f"{'+us/row':>9}{'occlusion ms':>14}")
+    worst = 0.0
+    for n in sorted({1, 10, 100, args.rows}):
+        rows = X[:n]
+        repeat = max(3, args.repeat if n <= 100 else args.repeat // 10)
+        predict = p50_ms(lambda: forest.predict(rows), repeat)
+        explained = p50_ms(lambda: explain(rows), repeat)
+        occluded = p50_ms(lambda: occlusion(forest, encoder, rows, reference), repeat)
+        worst = max(worst, explained / predict)
+        print(f"{n:>6}{predict:>12.3f}{explained:>12.3f}{explained / predict:>7.2f}"
+              f"{(explained - predict) * 1e3 / n:>9.1f}{occluded:>14.3f}")
+
+    if worst > args.max_ratio:
+        print(f"explain costs {worst:.2f}x predict, above --max-ratio {args.max_ratio}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
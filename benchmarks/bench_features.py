@@ -0,0 +1,99 @@
+"""
+Throughput of the fitted feature transform versus the legacy encoding.
+
+Encodes synthetic vehicle rows (--rows) with FeatureEncoder.encode_columns
+and reports, in rows per second:
+
+* brand hashing alone: for a list of strings on the first call (a memo
+  miss per distinct brand) and on later calls (one dict lookup per row),
+  and for pandas string and categorical columns (factorized, so one hash
+  per distinct brand);
+* the full vectorized encode (numeric copy, one-hot and hash columns);
+* the legacy get_dummies + HashingEncoder pipeline on --legacy-rows rows.
+
+The outputs are checked against each other first.
+
+    python benchmarks/bench_features.py [--rows 1000000] [--brands 500] [--output features.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import make_vehicles  # noqa: E402
+from features import HASH_COL, ONE_HOT_COLS, _map_values  # noqa: E402
+from train_model import TARGET, encode_reference, fit_encoder, one_hot_levels  # noqa: E402
+
+
+def rate(fn, rows, repeat=3):
+    best = min(timed(fn) for _ in range(repeat))
+    return rows / best
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--brands", type=int, default=500, help="distinct brand strings")
+    parser.add_argument("--legacy-rows", type=int, default=100_000)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    df = make_vehicles(args.rows)
+    rng = np.random.default_rng(0)
+    brands = np.array([f"brand-{i}" for i in range(args.brands)], dtype=object)
+    df[HASH_COL] = brands[rng.integers(len(brands), size=len(df))]
+    encoder = fit_encoder(df, one_hot_levels(df))
+    X = df.drop(columns=[TARGET])
+
+    legacy = X.iloc[:args.legacy_rows]
+    reference = encode_reference(legacy).to_numpy(dtype=np.float64)
+    assert np.array_equal(encoder.encode_columns(legacy), reference)
+
+    values = X[HASH_COL].tolist()
+    X_cat = X.astype({field: 'category' for field in ONE_HOT_COLS + [HASH_COL]})
+    categorical = X_cat[HASH_COL]
+
+    def brands_cold():
+        memo = {}
+        _map_values(values, memo, encoder._bucket_column)
+
+    memo = {}
+    _map_values(values, memo, encoder._bucket_column)
+    results = {'rows': len(df), 'brands': args.brands, 'rows_per_s': {
+        'brand hash (list, cold memo)': rate(brands_cold, len(df)),
+        'brand hash (list, warm memo)': rate(lambda: _map_values(values, memo, encoder._bucket_column),
+                                             len(df)),
+        'brand hash (pandas strings)': rate(lambda: _map_values(X[HASH_COL], {}, encoder._bucket_column),
+                                            len(df)),
+        'brand hash (pandas categorical)': rate(lambda: _map_values(categorical, {}, encoder._bucket_column),
+                                                len(df)),
+        'encode_columns': rate(lambda: encoder.encode_columns(X), len(df)),
+        'encode_columns (categorical)': rate(lambda: encoder.encode_columns(X_cat), len(df)),
+        'legacy get_dummies + HashingEncoder': rate(lambda: encode_reference(legacy), len(legacy),
+                                                    repeat=1),
+    }}
+    print(f"{len(df):,} rows, {args.brands} distinct brands, {encoder.n_features} columns")
+    for name, value in results['rows_per_s'].items():
+        print(f"{name:<38}{value:>14,.0f} rows/s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Parity check and benchmark: CompiledForest versus sklearn's model.predict.
+
+Uses mpg_model.pkl / scaler.pkl / columns.pkl from --artifacts if they are
+present, otherwise fits a synthetic 300-tree forest so it runs offline.
+
+    python benchmarks/bench_forest.py [--artifacts DIR] [--rows 1000]
+"""
+
+import argparse
+import os
+import pickle
+import shutil
+import sys
+import time
+import tracemalloc
+import warnings
+
+import joblib
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from forest import CompiledForest  # noqa: E402
+from benchmarks.synthetic import fit_artifacts  # noqa: E402
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.array(samples) * 1e3
+
+
+def report(name, samples):
+    print(f"{name:<34} p50 {np.percentile(samples, 50):9.3f} ms   "
+          f"p99 {np.percentile(samples, 99):9.3f} ms")
+
+
+def measure_load(load):
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = load()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, elapsed, peak
+
+
+def load_artifacts(args):
+    paths = [os.path.join(args.artifacts, name)
+             for name in ("mpg_model.pkl", "scaler.pkl", "columns.pkl")]
+    # A checkout without `git lfs pull` only has tiny pointer files.
+    if all(os.path.exists(p) for p in paths) and os.path.getsize(paths[0]) > 1024:
+        model, scaler, columns = (joblib.load(p) for p in paths)
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(args.rows, len(columns))) * scaler.scale_ + scaler.mean_
+        return model, scaler, columns, X, paths[0]
+    print(f"No artifacts in {args.artifacts!r}; fitting a synthetic {args.trees}-tree forest")
+    model, scaler, columns, X, _ = fit_artifacts(n_estimators=args.trees)
+    return model, scaler, columns, X, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", default=".")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    model, scaler, columns, X, model_path = load_artifacts(args)
+    X = X[:args.rows]
+
+    start = time.perf_counter()
+    forest = CompiledForest.from_sklearn(model, scaler, columns)
+    print(f"compiled {forest.n_trees} trees / {forest.n_nodes} nodes "
+          f"(depth {forest.depth}) in {time.perf_counter() - start:.2f}s")
+
+    # Parity: same leaf in every tree, same ensemble mean.
+    X_scaled32 = scaler.transform(X).astype(np.float32)
+    sk_leaves = np.column_stack([est.apply(X_scaled32) for est in model.estimators_])
+    assert np.array_equal(forest.apply(X) - forest.roots, sk_leaves), "leaf mismatch"
+    expected = model.predict(scaler.transform(X))
+    np.testing.assert_allclose(forest.predict(X), expected, rtol=0, atol=1e-9)
+    print(f"parity OK on {len(X)} rows")
+
+    forest.save("_bench_forest")
+    if model_path is None:
+        model_path = "_bench_model.pkl"
+        joblib.dump(model, model_path)
+    try:
+        _, sk_load, sk_peak = measure_load(lambda: joblib.load(model_path))
+        _, cf_load, cf_peak = measure_load(lambda: CompiledForest.load("_bench_forest"))
+        _, mm_load, mm_peak = measure_load(lambda: CompiledForest.load("_bench_forest", mmap_mode="r"))
+        sk_size = os.path.getsize(model_path)
+        cf_size = sum(entry.stat().st_size for entry in os.scandir("_bench_forest"))
+    finally:
+        shutil.rmtree("_bench_forest")
+        if model_path == "_bench_model.pkl":
+            os.remove(model_path)
+
+    print()
+    print(f"{'artifact':<12}{'size MB':>10}{'load s':>10}{'load peak MB':>15}")
+    print(f"{'sklearn':<12}{sk_size / 1e6:>10.1f}{sk_load:>10.3f}{sk_peak / 1e6:>15.1f}")
+    print(f"{'compiled':<12}{cf_size / 1e6:>10.1f}{cf_load:>10.3f}{cf_peak / 1e6:>15.1f}")
+    print(f"{'mmap':<12}{cf_size / 1e6:>10.1f}{mm_load:>10.3f}{mm_peak / 1e6:>15.1f}")
+    print(f"in-memory model size: pickle {len(pickle.dumps(model)) / 1e6:.1f} MB, "
+          f"compiled arrays {forest.nbytes / 1e6:.1f} MB")
+    print()
+
+    row = X[:1]
+    report("sklearn single row", timed(lambda: model.predict(scaler.transform(row)), args.repeat))
+    report("compiled single row", timed(lambda: forest.predict(row), args.repeat))
+    batch_repeat = max(3, args.repeat // 20)
+    report(f"sklearn batch of {len(X)}", timed(lambda: model.predict(scaler.transform(X)), batch_repeat))
+    report(f"compiled batch of {len(X)}", timed(lambda: forest.predict(X), batch_repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+GET / throughput: per-request template rendering versus the pre-rendered page.
+
+"before" registers a route that renders HTML_TEMPLATE with
+render_template_string on every request, as home() used to; "after" hits
+the real / route (identity, gzip and, if the brotli package is installed,
+br), plus a revalidation that answers 304. Requests go through the Flask
+test client, so the numbers are app-side cost without network I/O.
+
+    python benchmarks/bench_home.py [--requests 2000] [--output home.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MPG_REQUEST_LOG", "")
+
+from flask import render_template_string  # noqa: E402
+
+import app  # noqa: E402
+
+
+@app.app.route("/__bench_legacy_home")
+def legacy_home():
+    return render_template_string(app.HTML_TEMPLATE)
+
+
+def run(client, path, headers, n):
+    client.get(path, headers=headers)  # warm-up
+    start = time.perf_counter()
+    for _ in range(n):
+        response = client.get(path, headers=headers)
+    elapsed = time.perf_counter() - start
+    return {'status': response.status_code, 'bytes': len(response.data),
+            'requests_per_s': n / elapsed, 'mean_us': elapsed / n * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    client = app.app.test_client()
+    cases = {
+        "before: render_template_string": ("/__bench_legacy_home", {}),
+        "after: identity": ("/", {}),
+        "after: gzip": ("/", {"Accept-Encoding": "gzip"}),
+    }
+    if "br" in app.HOME_VARIANTS:
+        cases["after: br"] = ("/", {"Accept-Encoding": "gzip, br"})
+    cases["after: If-None-Match (304)"] = ("/", {"If-None-Match": f'"{app.HOME_ETAG}"'})
+
+    results = {}
+    print(f"{'case':<34}{'status':>7}{'bytes':>8}{'req/s':>10}{'mean us':>10}")
+    for name, (path, headers) in cases.items():
+        result = results[name] = run(client, path, headers, args.requests)
+        print(f"{name:<34}{result['status']:>7}{result['bytes']:>8}"
+              f"{result['requests_per_s']:>10.0f}{result['mean_us']:>10.1f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput scaling of the process-pool inference backend from 1 to N cores.
+
+Scores the same encoded rows in-process (the baseline: one core, whatever
+the number of request threads) and through InferencePool with 1, 2, ...
+--max-processes workers, driven by twice as many client threads as
+workers. Each client sends --rows rows per call (1 = single-row /predict
+traffic, larger = /api/predict/batch), so the numbers include the slot
+copy, pipe round trip and result copy-back.
+
+    python benchmarks/bench_pool.py [--artifacts DIR] [--rows 1 100 1000] [--output pool.json]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from artifacts import load_bundle  # noqa: E402
+from benchmarks.synthetic import make_requests, write_artifacts  # noqa: E402
+from inference_pool import InferencePool  # noqa: E402
+
+
+def drive(predict, X, rows, clients, seconds):
+    """Call ``predict`` on ``rows``-row slices of X from ``clients`` threads for ``seconds``."""
+    done = [0] * clients
+    deadline = time.perf_counter() + seconds
+
+    def client(slot):
+        start = (slot * rows) % (len(X) - rows + 1)
+        while time.perf_counter() < deadline:
+            predict(X[start:start + rows])
+            done[slot] += rows
+            start = (start + rows * clients) % (len(X) - rows + 1)
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", help="directory with mpg_forest/ or the model pickles")
+    parser.add_argument("--n-estimators", type=int, default=100,
+                        help="trees in the synthetic model when --artifacts is not given")
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count())
+    parser.add_argument("--rows", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--seconds", type=float, default=3.0, help="duration of each run")
+    parser.add_argument("--output", help="write results as JSON")
+    args = parser.parse_args()
+
+    tmp = None
+    workdir = args.artifacts
+    if workdir is None:
+        tmp = workdir = tempfile.mkdtemp(prefix="mpg-bench-")
+        print("Fitting synthetic artifacts...")
+        write_artifacts(workdir, n_estimators=args.n_estimators)
+    try:
+        bundle = load_bundle(workdir, use_table=False)
+        X = bundle.encoder.encode_many(make_requests(4000))
+        # Same numbers in and out of the pool.
+        pool = InferencePool(bundle.predict_rows, X.shape[1], processes=1)
+        assert np.array_equal(pool.predict(X[:500]), bundle.predict_rows(X[:500]))
+        pool.close()
+
+        results = {'cpus': os.cpu_count(), 'runs': []}
+        print(f"{os.cpu_count()} CPUs")
+        print(f"{'rows/call':>10}{'backend':>12}{'clients':>8}{'rows/s':>12}{'speedup':>9}")
+        for rows in args.rows:
+            rps = drive(bundle.predict_rows, X, rows, 2, args.seconds)
+            baseline = rps
+            results['runs'].append({'rows': rows, 'processes': 0, 'clients': 2, 'rows_per_s': rps})
+            print(f"{rows:>10}{'in-process':>12}{2:>8}{rps:>12.0f}{1.0:>9.2f}")
+            for processes in range(1, args.max_processes + 1):
+                pool = InferencePool(bundle.predict_rows, X.shape[1], processes=processes,
+                                     queue_timeout=30)
+                pool.predict(X[:rows])  # start the workers outside the timing
+                clients = 2 * processes
+                rps = drive(pool.predict, X, rows, clients, args.seconds)
+                pool.close()
+                results['runs'].append({'rows': rows, 'processes': processes, 'clients': clients,
+                                        'rows_per_s': rps, 'speedup': rps / baseline})
+                print(f"{rows:>10}{f'pool x{processes}':>12}{clients:>8}{rps:>12.0f}"
+                      f"{rps / baseline:>9.2f}")
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Serving-path benchmark suite: micro-benchmarks plus an end-to-end load test.
+
+Runs offline against a small synthetic model (or --artifacts DIR):
+
+* micro: each preprocessing step of a /predict request (form parsing, the
+  FeatureEncoder, and the legacy get_dummies / HashingEncoder / scaler
+  steps for reference) and single-row versus batched predict for both
+  the sklearn model and the compiled forest;
+* load: a fixed number of requests at fixed client concurrency against
+  the Flask test client in this process and against a real gunicorn
+  process, for /predict and /api/predict/batch, reporting throughput and
+  p50/p95/p99 latency.
+
+Results are written as JSON (tagged with the git commit) so two runs can be
+compared; --compare prints the change against an earlier results file and
+flags latency/throughput regressions.
+
+    python benchmarks/bench_serving.py --output bench_results/$(git rev-parse --short HEAD).json
+    python benchmarks/bench_serving.py --compare bench_results/abc1234.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import warnings
+from itertools import count
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_workers_rss import wait_ready  # noqa: E402
+from benchmarks.synthetic import make_requests, write_artifacts  # noqa: E402
+
+REGRESSION_THRESHOLD = 0.10
+
+
+def summarize(samples_s):
+    ms = np.asarray(samples_s) * 1e3
+    return {
+        'n': int(len(ms)),
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+    }
+
+
+def timed(fn, repeat, warmup=10):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def form_of(vehicle):
+    return {name: str(value) for name, value in vehicle.items()}
+
+
+# --- micro-benchmarks --------------------------------------------------------
+
+def run_micro(app, bundle, vehicles, repeat, batch_size):
+    import pandas as pd
+    from category_encoders import HashingEncoder
+    from features import HASH_COL, N_HASH_COMPONENTS, ONE_HOT_COLS, parse_input
+
+    form = form_of(vehicles[0])
+    parsed = parse_input(form)
+    batch_inputs = [parse_input(form_of(v)) for v in vehicles[:batch_size]]
+    X_one = bundle.encoder.encode_many([parsed])
+    X_batch = bundle.encoder.encode_many(batch_inputs)
+    df_one = pd.DataFrame([parsed])
+    dummies = pd.get_dummies(df_one, columns=ONE_HOT_COLS, drop_first=True)
+    hash_enc = HashingEncoder(cols=[HASH_COL], n_components=N_HASH_COMPONENTS)
+
+    single = [
+        ('parse_input', lambda: parse_input(form)),
+        ('encode (FeatureEncoder)', lambda: bundle.encoder.encode(parsed)),
+        ('legacy DataFrame build', lambda: pd.DataFrame([parsed])),
+        ('legacy get_dummies', lambda: pd.get_dummies(df_one, columns=ONE_HOT_COLS, drop_first=True)),
+        ('legacy HashingEncoder', lambda: hash_enc.fit_transform(dummies[[HASH_COL]])),
+        ('scaler.transform', lambda: bundle.scaler.transform(X_one)),
+        ('sklearn predict', lambda: bundle.model.predict(bundle.scaler.transform(X_one))),
+        ('predict_inputs (uncached)', lambda: app.predict_inputs([parsed])),
+    ]
+    batched = [
+        ('encode (FeatureEncoder)', lambda: bundle.encoder.encode_many(batch_inputs)),
+        ('sklearn predict', lambda: bundle.model.predict(bundle.scaler.transform(X_batch))),
+    ]
+    if bundle.forest is not None:
+        single.append(('forest predict', lambda: bundle.forest.predict(X_one)))
+        batched.append(('forest predict', lambda: bundle.forest.predict(X_batch)))
+
+    results = {}
+    for cases, rows, n in ((single, 1, repeat), (batched, batch_size, max(10, repeat // 20))):
+        for name, fn in cases:
+            name = f"{name} ({rows} row{'s' if rows > 1 else ''})"
+            results[name] = timed(fn, n)
+            print(f"  {name:<40} p50 {results[name]['p50_ms']:9.3f} ms   "
+                  f"p99 {results[name]['p99_ms']:9.3f} ms")
+    return results
+
+
+# --- load generator ----------------------------------------------------------
+
+def drive(send, payloads, concurrency, n_requests):
+    """Issue ``n_requests`` calls of ``send`` from ``concurrency`` threads."""
+    ticket = count()
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def client(slot):
+        while True:
+            i = next(ticket)
+            if i >= n_requests:
+                return
+            start = time.perf_counter()
+            try:
+                ok = send(payloads[i % len(payloads)])
+            except OSError:
+                ok = False
+            latencies[slot].append(time.perf_counter() - start)
+            if not ok:
+                errors[slot] += 1
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    result = summarize([s for slot in latencies for s in slot])
+    result.update(concurrency=concurrency, errors=sum(errors), elapsed_s=elapsed,
+                  throughput_rps=n_requests / elapsed)
+    return result
+
+
+def testclient_senders(app):
+    client = app.app.test_client()
+
+    def predict(vehicle):
+        return client.post('/predict', data=form_of(vehicle)).status_code == 200
+
+    def batch(vehicles):
+        return client.post('/api/predict/batch', json=vehicles).status_code == 200
+
+    return predict, batch
+
+
+def http_senders(host, port):
+    def call(method, path, body, content_type):
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        try:
+            conn.request(method, path, body=body, headers={'Content-Type': content_type})
+            response = conn.getresponse()
+            response.read()
+            return response.status == 200
+        finally:
+            conn.close()
+
+    def predict(vehicle):
+        return call('POST', '/predict', urllib.parse.urlencode(form_of(vehicle)),
+                    'application/x-www-form-urlencoded')
+
+    def batch(vehicles):
+        return call('POST', '/api/predict/batch', json.dumps(vehicles), 'application/json')
+
+    return predict, batch
+
+
+def run_load(label, senders, vehicles, args):
+    predict, batch = senders
+    batches = [vehicles[i:i + args.batch_rows] for i in range(0, len(vehicles), args.batch_rows)]
+    results = {}
+    for concurrency in args.concurrency:
+        for endpoint, send, payloads, n in (
+                ('predict', predict, vehicles, args.requests),
+                ('batch', batch, batches, max(concurrency, args.requests // 20))):
+            drive(send, payloads, concurrency, min(n, 4 * concurrency))  # warm-up
+            result = drive(send, payloads, concurrency, n)
+            results[f"{label}/{endpoint}/c={concurrency}"] = result
+            print(f"  {label:<12}{endpoint:<9}{concurrency:>5}{result['throughput_rps']:>12.1f}"
+                  f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                  f"{result['errors']:>8}")
+    return results
+
+
+def run_gunicorn(workdir, vehicles, args):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{args.port}",
+         "--workers", str(args.workers), "--preload", "--chdir", workdir, "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(f"http://127.0.0.1:{args.port}/readyz")
+        return run_load("gunicorn", http_senders("127.0.0.1", args.port), vehicles, args)
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+# --- results -----------------------------------------------------------------
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    """Print the relative change of every shared metric against a baseline file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nChange versus {baseline.get('commit')} ({baseline_path}); "
+          f"regressions over {REGRESSION_THRESHOLD:.0%} are flagged")
+    regressions = 0
+    for section, metric, higher_is_better in (('micro', 'p50_ms', False),
+                                              ('load', 'p99_ms', False),
+                                              ('load', 'throughput_rps', True)):
+        for name, result in current.get(section, {}).items():
+            old = baseline.get(section, {}).get(name, {}).get(metric)
+            if not old:
+                continue
+            change = result[metric] / old - 1
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > REGRESSION_THRESHOLD else ""
+            regressions += bool(flag)
+            print(f"  {section:<6}{name:<44}{metric:<16}{old:>10.3f} -> {result[metric]:>10.3f}"
+                  f"{change:>+9.1%}  {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", help="directory with model pickles and mpg_forest/")
+    parser.add_argument("--n-estimators", type=int, default=100,
+                        help="trees in the synthetic model (ignored with --artifacts)")
+    parser.add_argument("--repeat", type=int, default=500, help="micro-benchmark iterations")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows in micro batches")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per load level")
+    parser.add_argument("--batch-rows", type=int, default=100, help="rows per batch request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--cache", action="store_true",
+                        help="keep the prediction cache on (off by default so repeats are scored)")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["micro", "testclient", "gunicorn"])
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    tmp = None
+    workdir = args.artifacts
+    if workdir is None:
+        tmp = workdir = tempfile.mkdtemp(prefix="mpg-bench-")
+        print("Fitting synthetic artifacts...")
+        write_artifacts(workdir, n_estimators=args.n_estimators)
+    workdir = os.path.abspath(workdir)
+    os.environ["MPG_REQUEST_LOG"] = ""
+    if not args.cache:
+        os.environ["MPG_CACHE_SIZE"] = "0"
+
+    vehicles = make_requests(2000)
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+    }
+    try:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            warnings.filterwarnings("ignore")
+            import app
+            app.wait_until_ready()
+        finally:
+            os.chdir(cwd)
+        bundle = app.current
+        if bundle.model is None:
+            import joblib
+            bundle.model = joblib.load(os.path.join(workdir, "mpg_model.pkl"))
+            bundle.scaler = joblib.load(os.path.join(workdir, "scaler.pkl"))
+
+        if "micro" not in args.skip:
+            print("Micro-benchmarks:")
+            results['micro'] = run_micro(app, bundle, vehicles, args.repeat, args.batch_size)
+        load = {}
+        print(f"Load test:\n  {'target':<12}{'endpoint':<9}{'conc':>5}{'req/s':>12}"
+              f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+        if "testclient" not in args.skip:
+            load.update(run_load("testclient", testclient_senders(app), vehicles, args))
+        if "gunicorn" not in args.skip:
+            load.update(run_gunicorn(workdir, vehicles, args))
+        results['load'] = load
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
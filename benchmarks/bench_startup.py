@@ -0,0 +1,91 @@
+"""
+Startup-time breakdown for the serving process.
+
+Each measurement runs in a fresh interpreter so nothing is pre-imported:
+interpreter start, importing app.py (the point where gunicorn can bind and
+/healthz answers), background artifact load until /readyz turns ready,
+and, for comparison, the pandas + category_encoders imports the old app
+did eagerly.
+
+    python benchmarks/bench_startup.py [--artifacts DIR] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import write_artifacts  # noqa: E402
+
+APP_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.wait_until_ready()
+t2 = time.perf_counter()
+print(json.dumps({"import_app": t1 - t0, "artifact_load": t2 - t1}))
+"""
+
+LEGACY_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import pandas
+from category_encoders import HashingEncoder
+print(json.dumps({"pandas_category_encoders": time.perf_counter() - t0}))
+"""
+
+
+def run_probe(code, workdir, env=None):
+    env = dict(os.environ, PYTHONPATH=ROOT, **(env or {}))
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def interpreter_start(workdir):
+    start = time.perf_counter()
+    run_probe("print('{}')", workdir)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", help="directory with model pickles and mpg_forest/")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = None
+    workdir = args.artifacts
+    if workdir is None:
+        tmp = workdir = tempfile.mkdtemp(prefix="mpg-startup-")
+        print("Fitting synthetic artifacts...")
+        write_artifacts(workdir)
+    try:
+        rows = {"interpreter start": [interpreter_start(workdir) for _ in range(args.repeat)]}
+        for mode, env in (("mmap forest", {}), ("pickle", {"MPG_FOREST_PATH": "no-such-forest"})):
+            probes = [run_probe(APP_PROBE, workdir, env) for _ in range(args.repeat)]
+            rows[f"import app.py ({mode})"] = [p["import_app"] for p in probes]
+            rows[f"artifact load ({mode})"] = [p["artifact_load"] for p in probes]
+        rows["legacy pandas+category_encoders import"] = [
+            run_probe(LEGACY_PROBE, workdir)["pandas_category_encoders"] for _ in range(args.repeat)]
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+    print(f"{'stage':<42}{'median s':>10}{'min s':>10}")
+    for name, samples in rows.items():
+        print(f"{name:<42}{np.median(samples):>10.3f}{np.min(samples):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
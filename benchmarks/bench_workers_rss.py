@@ -0,0 +1,112 @@
+"""
+Per-worker memory of gunicorn with the memory-mapped forest versus pickles.
+
+Starts gunicorn with 1, 4 and 8 workers, sends batch predictions so every
+worker touches the model, then reads Rss and Pss from
+/proc/<pid>/smaps_rollup for the master and each worker. Pss splits shared
+pages between the processes mapping them, so it shows the real per-worker
+cost. Linux only.
+
+    python benchmarks/bench_workers_rss.py [--artifacts DIR] [--workers 1 4 8]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import make_requests, write_artifacts  # noqa: E402
+
+
+def smaps_rollup(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_ready(url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not come up")
+
+
+def post_batch(url, vehicles):
+    req = urllib.request.Request(url, data=json.dumps(vehicles).encode(),
+                                 headers={"Content-Type": "application/json"})
+    urllib.request.urlopen(req, timeout=60).read()
+
+
+def measure(workdir, workers, mode, port):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    if mode == "pickle":
+        env["MPG_FOREST_PATH"] = os.path.join(workdir, "no-such-forest")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+         "--workers", str(workers), "--preload", "--chdir", workdir, "app:app"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        wait_ready(base + "/readyz")
+        vehicles = make_requests(500)
+        for _ in range(workers * 4):
+            post_batch(base + "/api/predict/batch", vehicles)
+        master = smaps_rollup(proc.pid)
+        per_worker = [smaps_rollup(pid) for pid in children(proc.pid)]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+    rss = sum(w["Rss"] for w in per_worker) / len(per_worker)
+    pss = sum(w["Pss"] for w in per_worker) / len(per_worker)
+    total_pss = master["Pss"] + sum(w["Pss"] for w in per_worker)
+    print(f"{mode:<8}{workers:>8}{rss:>14.1f}{pss:>14.1f}{total_pss:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--artifacts", help="directory with model pickles and mpg_forest/")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    tmp = None
+    workdir = args.artifacts
+    if workdir is None:
+        tmp = workdir = tempfile.mkdtemp(prefix="mpg-rss-")
+        print("Fitting synthetic artifacts...")
+        write_artifacts(workdir)
+    try:
+        print(f"{'mode':<8}{'workers':>8}{'worker RSS MB':>14}{'worker PSS MB':>14}{'total PSS MB':>14}")
+        for mode in ("pickle", "mmap"):
+            for workers in args.workers:
+                measure(workdir, workers, mode, args.port)
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
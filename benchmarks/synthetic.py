@@ -0,0 +1,87 @@
+"""
+Synthetic vehicles data and model artifacts for offline benchmarking.
+
+Mirrors the preprocessing in train_model.py closely enough that the fitted
+model, scaler and columns have the same shape as the shipped artifacts,
+without downloading the real dataset.
+"""
+
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from category_encoders import HashingEncoder
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from features import TRANSFORM_FILE, FeatureEncoder
+from forest import CompiledForest
+
+BRANDS = ['Toyota', 'Ford', 'BMW', 'Honda', 'Tesla', 'Kia', 'Audi', 'Chevrolet',
+          'Nissan', 'Mazda', 'Subaru', 'Jeep', 'Hyundai', 'Volvo', 'Porsche', 'Dodge']
+DRIVE_TYPES = ['FWD', 'RWD', 'AWD', '4WD']
+FUEL_TYPES = ['Gasoline', 'Diesel', 'Hybrid', 'Electric']
+VEHICLE_TYPES = ['Sedan', 'SUV', 'Truck', 'Van', 'Coupe', 'Hatchback', 'Convertible']
+
+
+def make_vehicles(n=5000, seed=0):
+    """Return a raw vehicles DataFrame with the columns of vehicles_dataset.csv."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Engine_Size': np.round(rng.uniform(0.8, 7.0, n), 1),
+        'Engine_Cylinders': rng.choice([3, 4, 5, 6, 8, 10, 12], n).astype(float),
+        'Drive_Type': rng.choice(DRIVE_TYPES, n),
+        'Fuel_Type': rng.choice(FUEL_TYPES, n),
+        'Vehicle Class/Type': rng.choice(VEHICLE_TYPES, n),
+        'Car_Brand': rng.choice(BRANDS, n),
+        'Model_Year': rng.integers(1990, 2025, n),
+        'Fuel_Capacity': rng.integers(1000, 5000, n).astype(float),
+    })
+    df['Combined_MPG'] = (60 - 4 * df['Engine_Size'] - 1.2 * df['Engine_Cylinders']
+                          + 0.2 * (df['Model_Year'] - 1990)
+                          + 10 * (df['Fuel_Type'] == 'Hybrid')
+                          + 25 * (df['Fuel_Type'] == 'Electric')
+                          - 3 * (df['Vehicle Class/Type'] == 'Truck')
+                          + rng.normal(0, 2, n))
+    return df
+
+
+def make_requests(n=1000, seed=1):
+    """Return ``n`` form-style input dicts drawn from the form's value ranges."""
+    df = make_vehicles(n, seed=seed).drop(columns=['Combined_MPG'])
+    return df.to_dict('records')
+
+
+def encode_frame(df):
+    """One-hot and hash-encode a raw frame the way train_model.py does."""
+    one_hot_cols = ['Drive_Type', 'Fuel_Type', 'Vehicle Class/Type']
+    df_encoded = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
+    hash_enc = HashingEncoder(cols=['Car_Brand'], n_components=16)
+    return pd.concat([df_encoded.drop(columns=['Car_Brand']),
+                      hash_enc.fit_transform(df_encoded[['Car_Brand']])], axis=1)
+
+
+def fit_artifacts(n_rows=5000, n_estimators=300, seed=0, **forest_params):
+    """Fit a forest on synthetic data; returns (model, scaler, columns, X_raw, y)."""
+    encoded = encode_frame(make_vehicles(n_rows, seed=seed))
+    X = encoded.drop(columns=['Combined_MPG'])
+    y = encoded['Combined_MPG']
+    scaler = StandardScaler()
+    X_scaled = pd.DataFrame(scaler.fit_transform(X), columns=X.columns, index=X.index)
+    params = dict(max_depth=None, min_samples_split=10, min_samples_leaf=1,
+                  random_state=seed, n_jobs=-1)
+    params.update(forest_params)
+    model = RandomForestRegressor(n_estimators=n_estimators, **params)
+    model.fit(X_scaled, y)
+    return model, scaler, X.columns.tolist(), X.to_numpy(dtype=np.float64), y.to_numpy()
+
+
+def write_artifacts(directory, **fit_params):
+    """Fit synthetic artifacts and write them to ``directory`` as app.py expects."""
+    model, scaler, columns, _, _ = fit_artifacts(**fit_params)
+    joblib.dump(model, os.path.join(directory, "mpg_model.pkl"))
+    joblib.dump(scaler, os.path.join(directory, "scaler.pkl"))
+    joblib.dump(columns, os.path.join(directory, "columns.pkl"))
+    FeatureEncoder(columns).with_scaler(scaler).save(os.path.join(directory, TRANSFORM_FILE))
+    CompiledForest.from_sklearn(model, scaler, columns).save(os.path.join(directory, "mpg_forest"))
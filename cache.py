@@ -0,0 +1,166 @@
+"""
+In-process prediction cache for the MPG model.
+
+Entries are keyed on the normalized model inputs plus a fingerprint of the
+loaded artifacts, so a new model never serves predictions cached for an old
+one. The local cache is a bounded LRU with an optional TTL; a shared store
+(anything with Redis-style ``get(key)`` / ``set(key, value, ex=seconds)``)
+can back it so workers reuse each other's results. A failing or slow
+shared store only costs its hits: errors are counted and the request falls
+back to the local tier and the model.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from features import INPUT_FIELDS
+
+
+def artifact_fingerprint(paths):
+    """Fingerprint artifact files (or directories) by name, size and mtime."""
+    digest = hashlib.sha1()
+    for path in paths:
+        entries = [path]
+        if os.path.isdir(path):
+            entries = sorted(os.path.join(path, name) for name in os.listdir(path))
+        for entry in entries:
+            st = os.stat(entry)
+            digest.update(f"{entry}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(input_data):
+    """Normalize a typed input dict (see ``parse_input``) into a hashable key."""
+    return tuple(input_data[name] for name in INPUT_FIELDS)
+
+
+class LocalStore:
+    """Dict-backed stand-in for a shared store such as Redis, for tests and dev."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        expires = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[key] = (value, expires)
+
+
+class PredictionCache:
+    """Thread-safe LRU/TTL cache of predictions, with hit/miss/eviction counters."""
+
+    def __init__(self, maxsize=4096, ttl=None, fingerprint="", shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.fingerprint = fingerprint
+        self.shared = shared
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_errors = 0
+
+    def _shared_key(self, key):
+        return f"mpg:{self.fingerprint}:{key!r}"
+
+    def get(self, key):
+        """Return the cached prediction for ``key`` or None."""
+        key = (self.fingerprint, key)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+        if self.shared is not None:
+            value = self._shared_call(self.shared.get, self._shared_key(key[1]))
+            if value is not None:
+                value = float(value)
+                self._store(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        value = float(value)
+        self._store((self.fingerprint, key), value)
+        if self.shared is not None:
+            self._shared_call(self.shared.set, self._shared_key(key), repr(value), ex=self.ttl)
+
+    def _shared_call(self, fn, *args, **kwargs):
+        # The store is duck-typed (redis-py raises RedisError, a socket
+        # timeout OSError), so any exception counts as the store being down.
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            metrics.count_error("cache_shared", e)
+            with self._lock:
+                self.shared_errors += 1
+            return None
+
+    def _store(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'shared_hits': self.shared_hits,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'shared_errors': self.shared_errors,
+                'fingerprint': self.fingerprint,
+            }
+
+
+def shared_store_from_env():
+    """Return a Redis client for MPG_CACHE_REDIS_URL, or None if unset.
+
+    Calls time out after MPG_CACHE_REDIS_TIMEOUT_MS so an unreachable
+    server delays a request by at most that before it is scored locally.
+    """
+    url = os.environ.get("MPG_CACHE_REDIS_URL")
+    if not url:
+        return None
+    import redis  # optional dependency, only needed for a shared cache
+    timeout = float(os.environ.get("MPG_CACHE_REDIS_TIMEOUT_MS", 50)) / 1000
+    return redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
@@ -0,0 +1,239 @@
+"""
+Post-training compaction of the served random forest.
+
+The forest from train_model.py is fully grown (``max_depth=None``,
+``min_samples_leaf=1``), so most of its nodes separate a handful of rows
+with near-identical targets. This shrinks it in three passes, using only
+what sklearn stored at fit time plus the held-out split:
+
+* cost-complexity pruning of every tree (--ccp-alpha, in the same units
+  as sklearn's ``ccp_alpha``), applied to the fitted trees instead of
+  refitting them;
+* merging sibling leaves whose values differ by less than --merge-tol MPG
+  into their parent, bottom-up, so chains of near-equal leaves collapse;
+* dropping trees, least useful first, while the forest's R² on one half of
+  the test split stays within --tolerance of the original.
+
+The other half of the test split is held out for the report, which shows
+R², size and compiled-engine latency after each pass. The result is
+written to --output-dir as a compiled forest (mpg_forest/) with the
+feature transform, scaler and columns next to it. load_bundle serves that
+as is; the sklearn pickle is not written, so retrain.py cannot grow the
+result (refresh the original and compact again), and a lookup table has to
+be rebuilt (lookup_table.py build --data vehicles.csv --artifacts <output-dir>).
+
+    python compact.py --data vehicles.csv --artifacts . --output-dir compact --ccp-alpha 0.01
+"""
+
+import argparse
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+from sklearn.metrics import r2_score
+
+import train_model
+from artifacts import FOREST_PATH
+from features import TRANSFORM_FILE
+from forest import LEAF, CompiledForest
+from serving_metrics import measure_latency
+
+COPIED = ("scaler.pkl", "columns.pkl", TRANSFORM_FILE)
+
+
+class PrunedTree:
+    """Node arrays of a compacted tree, laid out like sklearn's ``Tree``."""
+
+    def __init__(self, children_left, children_right, feature, threshold, value, max_depth):
+        self.children_left = children_left
+        self.children_right = children_right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.max_depth = max_depth
+
+    @property
+    def node_count(self):
+        return len(self.children_left)
+
+
+def _levels(left, right):
+    """Node ids of a tree grouped by depth, root first."""
+    levels = [np.array([0])]
+    while True:
+        frontier = levels[-1]
+        frontier = frontier[left[frontier] != LEAF]
+        if not len(frontier):
+            return levels
+        levels.append(np.concatenate([left[frontier], right[frontier]]))
+
+
+def prune_tree(tree, ccp_alpha=0.0, merge_tol=0.0):
+    """Prune one fitted sklearn ``Tree`` and return it as a PrunedTree.
+
+    Bottom-up, a node becomes a leaf if keeping its subtree does not lower
+    the cost-complexity measure ``R(T) + ccp_alpha * leaves(T)`` (R being
+    the sample-weighted impurity, as sklearn defines it), or if both its
+    children are leaves whose values are within ``merge_tol``. A new leaf
+    keeps the node's stored value, the mean target of the rows under it.
+    """
+    left = tree.children_left
+    right = tree.children_right
+    value = tree.value[:, 0, 0]
+    weight = tree.weighted_n_node_samples
+    risk = tree.impurity * weight / weight[0]
+    is_leaf = left == LEAF
+    cost = risk.copy()
+    leaves = np.ones(tree.node_count)
+
+    levels = _levels(left, right)
+    for nodes in reversed(levels):
+        nodes = nodes[~is_leaf[nodes]]
+        if not len(nodes):
+            continue
+        l, r = left[nodes], right[nodes]
+        subtree_cost = cost[l] + cost[r]
+        subtree_leaves = leaves[l] + leaves[r]
+        prune = risk[nodes] - subtree_cost <= ccp_alpha * (subtree_leaves - 1)
+        prune |= is_leaf[l] & is_leaf[r] & (np.abs(value[l] - value[r]) < merge_tol)
+        is_leaf[nodes[prune]] = True
+        cost[nodes] = np.where(prune, risk[nodes], subtree_cost)
+        leaves[nodes] = np.where(prune, 1, subtree_leaves)
+
+    # Renumber the nodes still reachable from the root, keeping sklearn's
+    # parent-before-child order.
+    new_left = np.where(is_leaf, LEAF, left)
+    kept = np.sort(np.concatenate(_levels(new_left, right)))
+    index = np.full(tree.node_count, LEAF, dtype=np.intp)
+    index[kept] = np.arange(len(kept))
+    split = ~is_leaf[kept]
+    return PrunedTree(
+        children_left=np.where(split, index[left[kept]], LEAF),
+        children_right=np.where(split, index[right[kept]], LEAF),
+        feature=np.where(split, tree.feature[kept], -2),
+        threshold=np.where(split, tree.threshold[kept], -2.0),
+        value=value[kept].reshape(-1, 1, 1),
+        max_depth=len(_levels(new_left, right)) - 1,
+    )
+
+
+def select_trees(tree_preds, y, tolerance, min_trees=1):
+    """Indices of the trees to keep, dropping the least useful one at a time.
+
+    ``tree_preds`` holds every tree's prediction on the selection rows,
+    shape (n, n_trees). Each round removes the tree whose absence hurts the
+    averaged prediction least, and stops before R² would fall more than
+    ``tolerance`` below that of all the trees together.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    total_ss = ((y - y.mean()) ** 2).sum()
+    keep = list(range(tree_preds.shape[1]))
+    total = tree_preds.sum(axis=1)
+    floor_r2 = r2_score(y, total / len(keep)) - tolerance
+    while len(keep) > max(min_trees, 1):
+        # Ensemble prediction without each remaining tree, all at once.
+        without = (total[:, None] - tree_preds[:, keep]) / (len(keep) - 1)
+        sse = ((without - y[:, None]) ** 2).sum(axis=0)
+        best = int(np.argmin(sse))
+        if 1.0 - sse[best] / total_ss < floor_r2:
+            break
+        total -= tree_preds[:, keep[best]]
+        del keep[best]
+    return keep
+
+
+def compact(model, scaler, columns, X_select, y_select, ccp_alpha=0.0, merge_tol=0.0,
+            tolerance=0.002, min_trees=1):
+    """Run the three passes; returns ``{stage: CompiledForest}`` in order, the last being the result."""
+    if not hasattr(model, 'estimators_') or hasattr(model, 'learning_rate'):
+        raise ValueError("compaction needs a fitted RandomForestRegressor")
+    trees = [est.tree_ for est in model.estimators_]
+    stages = {'original': CompiledForest.from_sklearn(model, scaler, columns)}
+    print(f"[v0] Pruning {len(trees)} trees (ccp_alpha={ccp_alpha})...")
+    pruned = [prune_tree(tree, ccp_alpha) for tree in trees]
+    stages['pruned'] = CompiledForest.from_trees(pruned, scaler, columns)
+    print(f"[v0] Merging sibling leaves within {merge_tol} MPG...")
+    merged = [prune_tree(tree, ccp_alpha, merge_tol) for tree in trees]
+    stages['merged'] = CompiledForest.from_trees(merged, scaler, columns)
+
+    # Judge the trees against the original forest's accuracy, so the
+    # pruning passes count against the same --tolerance budget.
+    print("[v0] Selecting trees...")
+    merged_preds = stages['merged'].predict_trees(X_select)
+    original_r2 = r2_score(y_select, stages['original'].predict(X_select))
+    floor_r2 = original_r2 - tolerance
+    merged_r2 = r2_score(y_select, merged_preds.mean(axis=1))
+    keep = select_trees(merged_preds, y_select, max(0.0, merged_r2 - floor_r2), min_trees)
+    stages['dropped'] = CompiledForest.from_trees([merged[i] for i in keep], scaler, columns)
+    return stages
+
+
+def report(stages, X, y):
+    """Print and return R², size and latency of each stage on rows ``X``."""
+    rows = []
+    for name, forest in stages.items():
+        rows.append({'stage': name, 'r2': float(r2_score(y, forest.predict(X))), 'n_trees': forest.n_trees,
+                     'n_nodes': forest.n_nodes, 'depth': forest.depth, 'forest_mb': forest.nbytes / 1e6,
+                     **measure_latency(forest, X)})
+    print(f"{'stage':<10}{'R²':>8}{'trees':>7}{'nodes':>10}{'depth':>6}{'MB':>8}"
+          f"{'1-row p50':>11}{'1000 p50':>10}")
+    for row in rows:
+        print(f"{row['stage']:<10}{row['r2']:>8.4f}{row['n_trees']:>7}{row['n_nodes']:>10}{row['depth']:>6}"
+              f"{row['forest_mb']:>8.2f}{row['single_p50_ms']:>11.3f}{row['batch_p50_ms']:>10.2f}")
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prune and shrink the fitted forest for serving.")
+    parser.add_argument("--data", help="the vehicles CSV or dataset cache the model was trained on")
+    parser.add_argument("--cache-dir", default=train_model.CACHE_DIR)
+    parser.add_argument("--artifacts", default=".", help="directory with mpg_model.pkl, scaler.pkl, columns.pkl")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--ccp-alpha", type=float, default=0.0)
+    parser.add_argument("--merge-tol", type=float, default=0.05, help="MPG")
+    parser.add_argument("--tolerance", type=float, default=0.002,
+                        help="largest R² drop from the original forest to accept")
+    parser.add_argument("--min-trees", type=int, default=50,
+                        help="keep at least this many trees; uncertainty=1 reports their spread")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args(argv)
+
+    model, scaler, columns = (joblib.load(os.path.join(args.artifacts, name))
+                              for name in ("mpg_model.pkl", "scaler.pkl", "columns.pkl"))
+    data, _ = train_model.prepare_data(args.data, args.cache_dir, n_jobs=args.n_jobs)
+    if data['columns'] != list(columns):
+        parser.exit(1, "error: the data's encoded columns differ from columns.pkl\n")
+
+    # One half of the test split picks the trees, the other reports on the result.
+    X_test = data['X_test_raw']
+    y_test = np.asarray(data['y_test'], dtype=np.float64)
+    order = np.random.default_rng(0).permutation(len(X_test))
+    select, held_out = order[:len(order) // 2], order[len(order) // 2:]
+    try:
+        stages = compact(model, scaler, columns, X_test[select], y_test[select],
+                         args.ccp_alpha, args.merge_tol, args.tolerance, args.min_trees)
+    except ValueError as e:
+        parser.exit(1, f"error: {e}\n")
+    rows = report(stages, X_test[held_out], y_test[held_out])
+    drop = rows[0]['r2'] - rows[-1]['r2']
+    if drop > args.tolerance:
+        print(f"[v0] Warning: held-out R² dropped by {drop:.4f}, more than --tolerance {args.tolerance}; "
+              f"try a smaller --ccp-alpha / --merge-tol or a larger --min-trees")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stages['dropped'].save(os.path.join(args.output_dir, FOREST_PATH))
+    for name in COPIED:
+        source = os.path.join(args.artifacts, name)
+        if os.path.exists(source):
+            shutil.copy2(source, os.path.join(args.output_dir, name))
+    params = {'ccp_alpha': args.ccp_alpha, 'merge_tol': args.merge_tol,
+              'tolerance': args.tolerance, 'min_trees': args.min_trees}
+    with open(os.path.join(args.output_dir, "compact.json"), "w") as f:
+        json.dump({'params': params, 'stages': rows}, f, indent=2)
+    print(f"[v0] Wrote the compacted forest to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Typed columnar cache of the vehicles dataset.
+
+``pd.read_csv`` parses every byte of text and infers every dtype on each
+run. ``convert`` does that once and stores each column as an uncompressed
+``.npy`` file with an explicit dtype: the numeric fields as float64
+(Model_Year as int32), and the categorical fields as dictionary codes
+(int16, -1 for missing) with their sorted categories in ``meta.json``.
+
+``load`` memory-maps only the columns asked for: numeric columns are
+zero-copy views of the page cache, and categoricals are rebuilt from their
+codes without parsing a string beyond the dictionary. Cache directories are
+named after the CSV's content hash, so an edited CSV gets a fresh cache.
+
+    python dataset.py convert vehicles_dataset.csv    # -> .train_cache/dataset-<hash>/
+    python dataset.py info .train_cache/dataset-<hash>
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from features import HASH_COL, ONE_HOT_COLS
+
+META_FILE = "meta.json"
+CATEGORICAL = ONE_HOT_COLS + [HASH_COL]
+SCHEMA = {
+    'Engine_Size': 'float64',
+    'Engine_Cylinders': 'float64',
+    'Drive_Type': 'category',
+    'Fuel_Type': 'category',
+    'Vehicle Class/Type': 'category',
+    'Car_Brand': 'category',
+    'Model_Year': 'int32',
+    'Fuel_Capacity': 'float64',
+    'Combined_MPG': 'float64',
+}
+
+
+def file_key(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def cache_path(cache_dir, key):
+    return os.path.join(cache_dir, f"dataset-{key}")
+
+
+def _column_dtype(name, values):
+    dtype = SCHEMA.get(name)
+    if dtype is None:
+        return 'float64' if pd.api.types.is_numeric_dtype(values) else 'category'
+    if dtype.startswith('int') and values.isna().any():
+        return 'float64'  # gaps; an integer column cannot hold NaN
+    return dtype
+
+
+def convert(csv_path, directory, key=None):
+    """Parse ``csv_path`` once and write it as typed columns into ``directory``."""
+    dtypes = {name: 'category' for name in CATEGORICAL}
+    df = pd.read_csv(csv_path, dtype=dtypes)
+    tmp = directory + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        dtype = _column_dtype(name, values)
+        spec = {'name': name, 'dtype': dtype, 'file': f"{i:02d}.npy"}
+        if dtype == 'category':
+            values = values.astype('category')  # a text column outside CATEGORICAL
+            values = values.cat.set_categories(sorted(values.cat.categories))
+            codes = values.cat.codes.to_numpy()
+            code_dtype = np.int16 if len(values.cat.categories) < 2 ** 15 else np.int32
+            np.save(os.path.join(tmp, spec['file']), codes.astype(code_dtype))
+            spec['categories'] = values.cat.categories.tolist()
+        else:
+            np.save(os.path.join(tmp, spec['file']), values.to_numpy(dtype=dtype))
+        columns.append(spec)
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump({'source': os.path.abspath(csv_path), 'key': key or file_key(csv_path),
+                   'rows': len(df), 'columns': columns}, f, indent=2)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    return directory
+
+
+def ensure(csv_path, cache_dir, key=None):
+    """Return the cache directory for ``csv_path``, converting it on first use."""
+    key = key or file_key(csv_path)
+    directory = cache_path(cache_dir, key)
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        print(f"[v0] Converting {csv_path} to a columnar cache...")
+        os.makedirs(cache_dir, exist_ok=True)
+        convert(csv_path, directory, key)
+    return directory
+
+
+def read_meta(directory):
+    with open(os.path.join(directory, META_FILE)) as f:
+        return json.load(f)
+
+
+def load(directory, columns=None, mmap_mode='r', start=0, stop=None):
+    """Return the cached dataset (or just ``columns``, rows ``start:stop``) as a DataFrame.
+
+    Numeric columns are read-only memory maps; copy the frame before
+    modifying it in place.
+    """
+    meta = read_meta(directory)
+    wanted = None if columns is None else set(columns)
+    data = {}
+    for spec in meta['columns']:
+        if wanted is not None and spec['name'] not in wanted:
+            continue
+        values = np.load(os.path.join(directory, spec['file']), mmap_mode=mmap_mode)[start:stop]
+        if spec['dtype'] == 'category':
+            values = pd.Categorical.from_codes(values, spec['categories'])
+        data[spec['name']] = values
+    if wanted is not None and len(data) < len(wanted):
+        missing = sorted(wanted - set(data))
+        raise KeyError(f"columns not in {directory}: {', '.join(missing)}")
+    return pd.DataFrame(data, copy=False)
+
+
+def is_dataset(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the vehicles CSV to a typed columnar cache.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    conv = sub.add_parser("convert", help="convert a CSV (once) and print the cache directory")
+    conv.add_argument("csv")
+    conv.add_argument("--cache-dir", default=".train_cache")
+    info = sub.add_parser("info", help="show the columns and dtypes of a cache directory")
+    info.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        print(ensure(args.csv, args.cache_dir))
+    else:
+        meta = read_meta(args.directory)
+        print(f"{meta['rows']} rows from {meta['source']}")
+        for spec in meta['columns']:
+            extra = f" ({len(spec['categories'])} categories)" if 'categories' in spec else ""
+            print(f"  {spec['name']:<22}{spec['dtype']}{extra}")
+
+
+if __name__ == "__main__":
+    main()
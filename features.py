@@ -0,0 +1,335 @@
+"""
+Feature encoding for the MPG model's serving path.
+
+Maps the prediction form fields straight into a NumPy feature row laid out
+like ``columns.pkl``, replacing the per-request DataFrame / get_dummies /
+HashingEncoder work. Training encodes through the same FeatureEncoder, and
+saves it with the scaler statistics as ``feature_transform.json``.
+"""
+
+import hashlib
+import json
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+
+INPUT_FIELDS = ['Engine_Size', 'Engine_Cylinders', 'Drive_Type', 'Fuel_Type',
+                'Vehicle Class/Type', 'Car_Brand', 'Model_Year', 'Fuel_Capacity']
+NUMERIC_FIELDS = ['Engine_Size', 'Engine_Cylinders', 'Model_Year', 'Fuel_Capacity']
+ONE_HOT_COLS = ['Drive_Type', 'Fuel_Type', 'Vehicle Class/Type']
+HASH_COL = 'Car_Brand'
+N_HASH_COMPONENTS = 16
+TRANSFORM_FILE = "feature_transform.json"
+# Distinct values remembered per field by the vectorized encoder.
+MEMO_SIZE = 1 << 16
+
+# Options and bounds offered by the prediction form.
+FORM_CHOICES = {
+    'Drive_Type': ['FWD', 'RWD', 'AWD', '4WD'],
+    'Fuel_Type': ['Gasoline', 'Diesel', 'Hybrid', 'Electric'],
+    'Vehicle Class/Type': ['Sedan', 'SUV', 'Truck', 'Van', 'Coupe', 'Hatchback', 'Convertible'],
+}
+# A plausible vehicle, e.g. for smoke predictions.
+EXAMPLE_INPUT = {
+    'Engine_Size': 2.0,
+    'Engine_Cylinders': 4,
+    'Drive_Type': 'FWD',
+    'Fuel_Type': 'Gasoline',
+    'Vehicle Class/Type': 'Sedan',
+    'Car_Brand': 'Toyota',
+    'Model_Year': 2020,
+    'Fuel_Capacity': 3000.0,
+}
+FORM_RANGES = {
+    'Engine_Size': (0.5, 8.0),
+    'Engine_Cylinders': (2, 16),
+    'Model_Year': (1990, 2024),
+    'Fuel_Capacity': (1000, 5000),
+}
+
+
+def _number(name, convert, value):
+    # int() of an infinite JSON number, and float() or isfinite() of an
+    # integer too large for a float, raise OverflowError, which callers
+    # would not treat as a bad value.
+    try:
+        number = convert(value)
+        finite = math.isfinite(number)
+    except OverflowError:
+        finite = False
+    if not finite:
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+def parse_input(source):
+    """Convert raw form/JSON values into the typed input dict the model expects.
+
+    Raises KeyError for a missing field and ValueError/TypeError for a value
+    that cannot be converted (including non-finite numbers), exactly as the
+    form handler always has.
+    """
+    return {
+        'Engine_Size': _number('Engine_Size', float, source['Engine_Size']),
+        'Engine_Cylinders': _number('Engine_Cylinders', float, source['Engine_Cylinders']),
+        'Drive_Type': str(source['Drive_Type']),
+        'Fuel_Type': str(source['Fuel_Type']),
+        'Vehicle Class/Type': str(source['Vehicle Class/Type']),
+        'Car_Brand': str(source['Car_Brand']),
+        'Model_Year': _number('Model_Year', int, source['Model_Year']),
+        'Fuel_Capacity': _number('Fuel_Capacity', float, source['Fuel_Capacity'])
+    }
+
+
+def field_of_column(column):
+    """Name of the input field an encoded column comes from.
+
+    ``col_<i>`` hash columns belong to the brand and ``<field>_<level>``
+    dummies to their one-hot field; numeric columns are their own field.
+    """
+    if column.startswith('col_') and column[4:].isdigit():
+        return HASH_COL
+    for field in ONE_HOT_COLS:
+        if column.startswith(field + '_'):
+            return field
+    return column
+
+
+@lru_cache(maxsize=4096)
+def brand_bucket(brand, n_components=N_HASH_COMPONENTS):
+    """Return the HashingEncoder bucket (md5, big-endian) for a brand string."""
+    digest = hashlib.md5(bytes(str(brand), 'utf-8')).digest()
+    return int.from_bytes(digest, byteorder='big') % n_components
+
+
+def one_hot_columns(levels):
+    """Dummy column names for ``{field: sorted levels}``, dropping each field's first level.
+
+    Matches ``pd.get_dummies(..., columns=ONE_HOT_COLS, drop_first=True)``.
+    """
+    return [f"{field}_{level}" for field in ONE_HOT_COLS for level in levels[field][1:]]
+
+
+def _map_values(values, memo, compute):
+    """Vectorized ``compute(str(value))`` over ``values`` as an intp array.
+
+    pandas data is factorized, so ``compute`` runs once per distinct value;
+    anything else goes through ``memo``, a dict of values already computed,
+    so after the first call a column of strings costs one dict lookup per row.
+    """
+    factorize = getattr(values, 'factorize', None)
+    if factorize is not None:
+        codes, uniques = factorize()
+        # Code -1 (missing) picks the last entry, which encodes "nan" like str(NaN).
+        lookup = np.array([compute(str(u)) for u in uniques] + [compute('nan')], dtype=np.intp)
+        return lookup[codes]
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    try:
+        return np.fromiter(map(memo.__getitem__, values), dtype=np.intp, count=len(values))
+    except KeyError:
+        pass
+    table = dict(memo)
+    missing = {v: compute(str(v)) for v in set(values) if v not in table}
+    table.update(missing)
+    if len(memo) + len(missing) > MEMO_SIZE:
+        memo.clear()
+    memo.update(missing)
+    return np.fromiter(map(table.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+class FeatureEncoder:
+    """Encode vehicle inputs into rows matching the training column layout.
+
+    The fitted feature transform shared by training and serving: the
+    numeric fields copied as float64, a 1 in each one-hot field's
+    ``<field>_<level>`` column (all 0 for the dropped first level or an
+    unseen one), 1 added to the brand's ``col_<bucket>`` hash column, and
+    optionally the StandardScaler statistics (``scale``). It is persisted
+    as ``feature_transform.json`` next to ``scaler.pkl`` and rebuilt from
+    ``columns.pkl`` alone for older artifacts.
+
+    ``encode``/``encode_many`` serve single form inputs; ``encode_columns``
+    is the vectorized path used by training and bulk scoring, and
+    ``check_parity`` holds the two to the same output.
+    """
+
+    def __init__(self, columns, mean=None, scale=None, n_components=N_HASH_COMPONENTS):
+        self.columns = list(columns)
+        self.n_components = n_components
+        index = {name: i for i, name in enumerate(self.columns)}
+        fields = [field_of_column(name) for name in self.columns]
+        self._numeric = [(name, i) for i, (name, field) in enumerate(zip(self.columns, fields))
+                         if field == name]
+        # Numeric dataset columns the form does not ask for are 0 unless a
+        # row carries them, as the original reindex(fill_value=0) left them.
+        self._required = [(name, i) for name, i in self._numeric if name in NUMERIC_FIELDS]
+        self._optional = [(name, i) for name, i in self._numeric if name not in NUMERIC_FIELDS]
+        self._one_hot = {field: {} for field in ONE_HOT_COLS}
+        for i, (name, field) in enumerate(zip(self.columns, fields)):
+            if field in self._one_hot:
+                self._one_hot[field][name[len(field) + 1:]] = i
+        self._buckets = [index.get(f'col_{i}', -1) for i in range(n_components)]
+        self.fields = INPUT_FIELDS + [field for field in dict.fromkeys(fields) if field not in INPUT_FIELDS]
+        self._field_matrix = np.zeros((len(self.columns), len(self.fields)))
+        self._field_matrix[np.arange(len(self.columns)), [self.fields.index(f) for f in fields]] = 1.0
+        self._memo = {field: {} for field in ONE_HOT_COLS + [HASH_COL]}
+        self._template = np.zeros(len(self.columns), dtype=np.float64)
+        self.mean_ = None if mean is None else np.asarray(mean, dtype=np.float64)
+        self.scale_ = None if scale is None else np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def fit(cls, numeric, levels, n_components=N_HASH_COMPONENTS):
+        """Lay out columns for ``numeric`` fields and ``{field: sorted levels}``.
+
+        The order is the one train_model.py has always produced: numeric
+        fields, then the dummies, then the hash columns.
+        """
+        columns = (list(numeric) + one_hot_columns(levels)
+                   + [f'col_{i}' for i in range(n_components)])
+        return cls(columns, n_components=n_components)
+
+    def with_scaler(self, scaler):
+        """A copy carrying ``scaler``'s (a fitted StandardScaler) statistics."""
+        n = len(self.columns)
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n)
+        return FeatureEncoder(self.columns, mean, scale, self.n_components)
+
+    @property
+    def n_features(self):
+        return len(self.columns)
+
+    @property
+    def layout(self):
+        """The one-hot levels and numeric fields this encoder fills, by field."""
+        return {'numeric': [name for name, _ in self._numeric],
+                'one_hot': {field: list(levels) for field, levels in self._one_hot.items()}}
+
+    def encode(self, input_data, out=None):
+        """Encode one input dict into ``out`` (or a fresh 1-D row) and return it."""
+        if out is None:
+            out = self._template.copy()
+        else:
+            out[:] = 0.0
+        for name, i in self._required:
+            out[i] = input_data[name]
+        for name, i in self._optional:
+            out[i] = input_data.get(name, 0.0)
+        for field, levels in self._one_hot.items():
+            i = levels.get(str(input_data[field]))
+            if i is not None:
+                out[i] = 1.0
+        bucket = self._bucket_column(input_data[HASH_COL])
+        if bucket >= 0:
+            out[bucket] += 1.0
+        return out
+
+    def _bucket_column(self, brand):
+        """Column index of the brand's hash bucket, or -1 if not in the layout."""
+        return self._buckets[brand_bucket(brand, self.n_components)]
+
+    def encode_columns(self, data):
+        """Vectorized encode of column data (a DataFrame or dict of arrays).
+
+        Same output as ``encode`` applied row by row. Brands and one-hot
+        levels go through per-process memo tables, so after the first call
+        a column of strings costs one dict lookup per row.
+        """
+        n = len(data[HASH_COL])
+        X = np.zeros((n, self.n_features), dtype=np.float64)
+        for name, i in self._required:
+            X[:, i] = np.asarray(data[name], dtype=np.float64)
+        for name, i in self._optional:
+            if name in data:
+                X[:, i] = np.asarray(data[name], dtype=np.float64)
+        # Offset of each row in the flattened matrix.
+        offsets = np.arange(n) * self.n_features
+        flat = X.reshape(-1)
+        for field, levels in self._one_hot.items():
+            if levels:
+                columns = _map_values(data[field], self._memo[field],
+                                      lambda level, levels=levels: levels.get(level, -1))
+                hit = columns >= 0
+                flat[offsets[hit] + columns[hit]] = 1.0
+        columns = _map_values(data[HASH_COL], self._memo[HASH_COL], self._bucket_column)
+        hit = columns >= 0
+        flat[offsets[hit] + columns[hit]] += 1.0
+        return X
+
+    def encode_many(self, records):
+        """Encode a sequence of input dicts into an ``(n, n_features)`` matrix."""
+        X = np.zeros((len(records), self.n_features), dtype=np.float64)
+        for i, input_data in enumerate(records):
+            self.encode(input_data, out=X[i])
+        return X
+
+    def sum_by_field(self, values):
+        """Total per-column ``values`` of shape (n, n_features) per input field.
+
+        The hash buckets add up to the brand and the dummies to their field,
+        giving shape (n, len(self.fields)) in ``self.fields`` order.
+        """
+        return np.asarray(values, dtype=np.float64) @ self._field_matrix
+
+    def scale(self, X):
+        """Standardize encoded rows as the fitted StandardScaler does."""
+        if self.mean_ is None:
+            raise ValueError("this feature transform carries no scaler statistics")
+        return (X - self.mean_) / self.scale_
+
+    def save(self, path):
+        spec = {
+            'columns': self.columns,
+            'hash': {'field': HASH_COL, 'n_components': self.n_components, 'function': 'md5'},
+            'layout': self.layout,
+            'mean': None if self.mean_ is None else self.mean_.tolist(),
+            'scale': None if self.scale_ is None else self.scale_.tolist(),
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(spec, f, indent=1)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved transform; raises ValueError if it was written by an incompatible encoder."""
+        with open(path) as f:
+            spec = json.load(f)
+        if spec['hash'] != {'field': HASH_COL, 'n_components': spec['hash']['n_components'],
+                            'function': 'md5'}:
+            raise ValueError(f"{path}: unsupported hash encoding {spec['hash']}")
+        encoder = cls(spec['columns'], spec['mean'], spec['scale'], spec['hash']['n_components'])
+        if encoder.layout != spec['layout']:
+            raise ValueError(f"{path}: column layout does not match its one-hot/numeric fields")
+        return encoder
+
+
+def check_parity(encoder, records, reference=None):
+    """Raise ValueError unless the row and vectorized encoders agree on ``records``.
+
+    ``reference``, if given, is the matrix another encoder (e.g. training's
+    reference pipeline) produced for the same records; it must match too.
+    """
+    numeric = [name for name in encoder.layout['numeric']
+               if name in NUMERIC_FIELDS or all(name in r for r in records)]
+    fields = numeric + ONE_HOT_COLS + [HASH_COL]
+    rows = encoder.encode_many(records)
+    columns = encoder.encode_columns({name: [r[name] for r in records] for name in fields})
+    for name, other in (('encode_columns', columns), ('reference', reference)):
+        if other is None:
+            continue
+        if other.shape != rows.shape or not np.array_equal(rows, other, equal_nan=True):
+            mismatch = (rows != other) & ~(np.isnan(rows) & np.isnan(other))
+            bad = np.argwhere(mismatch)[:3] if other.shape == rows.shape else []
+            where = ", ".join(f"row {r} column {encoder.columns[c]!r}" for r, c in bad)
+            raise ValueError(f"feature encoding drift: encode vs {name} ({where or other.shape})")
+    return rows
+
+
+def form_records(base=EXAMPLE_INPUT):
+    """``base`` with every combination of the form's one-hot choices."""
+    records = [dict(base)]
+    for field, choices in FORM_CHOICES.items():
+        records = [dict(r, **{field: choice}) for r in records for choice in choices]
+    return records
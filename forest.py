@@ -0,0 +1,289 @@
+"""
+Compiled tree-ensemble inference for the MPG model.
+
+Flattens a fitted sklearn forest into contiguous NumPy arrays and scores
+rows by walking every tree at once with vectorized gathers, instead of
+going through sklearn's per-estimator Python loop and joblib dispatch.
+The StandardScaler is folded into the split thresholds, so the engine
+takes raw (unscaled) feature rows straight from the FeatureEncoder.
+
+The artifact is a directory of uncompressed ``.npy`` files plus a small
+``meta.json``. Loading it with ``mmap_mode='r'`` maps the node arrays
+straight from the page cache, so every gunicorn worker (and a ``--preload``
+master) shares one physical copy of the forest.
+"""
+
+import json
+import os
+
+import numpy as np
+
+LEAF = -1
+BLOCK_CELLS = 1 << 16
+
+
+def _scaled32(x, mean, scale):
+    """Reproduce sklearn's view of a raw value: StandardScaler, then float32."""
+    return ((x - mean) / scale).astype(np.float32)
+
+
+def fold_thresholds(threshold, mean, scale):
+    """Map scaled-space split thresholds onto raw feature values.
+
+    sklearn compares ``float32(scaler(x)) <= threshold``. That mapping is
+    monotonic in ``x``, so each split has a largest raw value that still goes
+    left; bisect for it so ``x <= raw`` takes exactly the same branch as
+    sklearn would, including for inputs sitting right on a split point.
+    """
+    guess = threshold * scale + mean
+    delta = (np.abs(guess) + scale) * 1e-5
+    lo = guess - delta
+    hi = guess + delta
+    while True:
+        bad_lo = _scaled32(lo, mean, scale) > threshold
+        bad_hi = _scaled32(hi, mean, scale) <= threshold
+        if not (bad_lo.any() or bad_hi.any()):
+            break
+        delta = delta * 2
+        lo = np.where(bad_lo, guess - delta, lo)
+        hi = np.where(bad_hi, guess + delta, hi)
+    for _ in range(128):
+        mid = lo + (hi - lo) / 2
+        active = (mid > lo) & (mid < hi)
+        if not active.any():
+            break
+        left = _scaled32(mid, mean, scale) <= threshold
+        lo = np.where(active & left, mid, lo)
+        hi = np.where(active & ~left, mid, hi)
+    return lo
+
+
+class CompiledForest:
+    """A fitted tree ensemble stored as flat node arrays.
+
+    All trees share one set of node arrays; ``roots`` holds the index of each
+    tree's root node. Leaves point back at themselves with an infinite
+    threshold, so a fixed number of ``depth`` steps lands every row on its
+    leaf without any per-tree bookkeeping. ``value`` holds the mean target
+    of every node (internal nodes included), and the ensemble prediction is
+    ``bias + weight * sum(leaf values)``: a random forest has bias 0 and
+    weight 1/n_trees, a gradient-boosted ensemble its initial prediction
+    and learning rate. ``averaged`` tells the two apart, since only the
+    trees of a forest are estimates of the target on their own.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots')
+
+    def __init__(self, feature, threshold, children, value, roots, depth,
+                 columns, bias=0.0, weight=1.0, averaged=True):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depth = int(depth)
+        self.columns = list(columns)
+        self.bias = float(bias)
+        self.weight = float(weight)
+        self.averaged = bool(averaged)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None, columns=None):
+        """Compile a fitted RandomForestRegressor or GradientBoostingRegressor
+        (and optional StandardScaler)."""
+        estimators = [getattr(est, 'tree_', est) for est in np.ravel(model.estimators_)]
+        if columns is None:
+            columns = list(model.feature_names_in_)
+        if hasattr(model, 'learning_rate'):
+            # Boosting: init prediction + learning_rate * sum of tree outputs.
+            # Only the constant init estimator (squared error) is supported.
+            bias = float(np.ravel(model.init_.constant_)[0])
+            return cls.from_trees(estimators, scaler, columns,
+                                  bias=bias, weight=model.learning_rate, averaged=False)
+        return cls.from_trees(estimators, scaler, columns)
+
+    @classmethod
+    def from_trees(cls, trees, scaler, columns, bias=0.0, weight=None, averaged=True):
+        """Compile trees laid out like sklearn's ``Tree`` (``node_count``,
+        ``children_left``/``right``, ``feature``, ``threshold``, ``value``,
+        ``max_depth``). ``weight`` defaults to averaging the trees."""
+        mean = np.zeros(len(columns))
+        scale = np.ones(len(columns))
+        if scaler is not None and scaler.with_mean:
+            mean = scaler.mean_
+        if scaler is not None and scaler.with_std:
+            scale = scaler.scale_
+
+        n_nodes = sum(tree.node_count for tree in trees)
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.full(n_nodes, np.inf, dtype=np.float64)
+        children = np.zeros(2 * n_nodes, dtype=np.int32)
+        value = np.zeros(n_nodes, dtype=np.float64)
+        roots = np.zeros(len(trees), dtype=np.int32)
+        depth = 0
+
+        offset = 0
+        for t, tree in enumerate(trees):
+            count = tree.node_count
+            nodes = np.arange(offset, offset + count)
+            split = tree.children_left != LEAF
+            f = tree.feature[split]
+
+            feature[nodes[split]] = f
+            threshold[nodes[split]] = fold_thresholds(tree.threshold[split], mean[f], scale[f])
+            children[2 * nodes] = np.where(split, tree.children_left + offset, nodes)
+            children[2 * nodes + 1] = np.where(split, tree.children_right + offset, nodes)
+            value[nodes] = tree.value[:, 0, 0]
+            roots[t] = offset
+            depth = max(depth, tree.max_depth)
+            offset += count
+
+        if weight is None:
+            weight = 1.0 / len(trees)
+        return cls(feature, threshold, children, value, roots, depth, columns,
+                   bias=bias, weight=weight, averaged=averaged)
+
+    def apply(self, X):
+        """Return the leaf node index reached in every tree, shape (n, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.empty((X.shape[0], self.n_trees), dtype=self.roots.dtype)
+        # Row blocks keep the (rows, trees) working set in cache.
+        block = max(1, BLOCK_CELLS // self.n_trees)
+        for start in range(0, X.shape[0], block):
+            out[start:start + block] = self._apply_block(X[start:start + block])
+        return out
+
+    def _apply_block(self, X):
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.depth):
+            x = flat[row_offset + self.feature[node]]
+            step = self.children[2 * node + (x > self.threshold[node])]
+            if np.array_equal(step, node):
+                break
+            node = step
+        return node
+
+    def contributions(self, X, return_leaves=False):
+        """Split each prediction into a shared baseline and per-column contributions.
+
+        Path decomposition: every split a row passes moves its tree's
+        estimate from the node's value to the child's, and that change is
+        credited to the split's feature. Summed over the trees and weighted
+        like ``predict``, ``baseline + contributions.sum(axis=1)`` is the
+        prediction (up to rounding). Costs one traversal, like ``apply``.
+        Returns (baseline, array of shape (n, n_features)), plus the leaves
+        ``apply`` would return if ``return_leaves`` is set.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.empty(X.shape, dtype=np.float64)
+        leaves = np.empty((X.shape[0], self.n_trees), dtype=self.roots.dtype)
+        block = max(1, BLOCK_CELLS // self.n_trees)
+        for start in range(0, X.shape[0], block):
+            out[start:start + block], leaves[start:start + block] = \
+                self._contributions_block(X[start:start + block])
+        baseline = self.bias + self.weight * float(self.value[self.roots].sum())
+        if return_leaves:
+            return baseline, self.weight * out, leaves
+        return baseline, self.weight * out
+
+    def _contributions_block(self, X):
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_offset = (np.arange(n_rows, dtype=np.int32) * n_features)[:, None]
+        total = np.zeros(n_rows * n_features, dtype=np.float64)
+
+        node = np.repeat(self.roots[None, :], n_rows, axis=0)
+        for _ in range(self.depth):
+            cell = row_offset + self.feature[node]
+            step = self.children[2 * node + (flat[cell] > self.threshold[node])]
+            if np.array_equal(step, node):
+                break
+            # Rows already at a leaf step onto themselves and add 0.
+            total += np.bincount(cell.ravel(), weights=(self.value[step] - self.value[node]).ravel(),
+                                 minlength=total.size)
+            node = step
+        return total.reshape(n_rows, n_features), node
+
+    def predict_trees(self, X):
+        """Return every tree's prediction, shape (n, n_trees)."""
+        return self.value[self.apply(X)]
+
+    def predict(self, X):
+        """Return the ensemble prediction for raw feature rows, shape (n,)."""
+        return self.bias + self.weight * self.predict_trees(X).sum(axis=1)
+
+    def predict_distribution(self, X, percentiles=(5, 95), leaves=None):
+        """Return (mean, std, percentiles) of the per-tree predictions.
+
+        One traversal of all trees; the mean equals ``predict``, std is
+        across trees and the percentiles array has shape (n, len(percentiles)).
+        Only defined for averaged ensembles (random forests), where each
+        tree is an estimate of the target on its own. ``leaves`` from an
+        earlier traversal (``apply``, ``contributions``) saves walking the
+        trees again.
+        """
+        if not self.averaged:
+            raise ValueError("per-tree spread is only defined for averaged ensembles")
+        values = self.predict_trees(X) if leaves is None else self.value[leaves]
+        mean = self.bias + self.weight * values.sum(axis=1)
+        scale = self.weight * self.n_trees
+        std = np.abs(scale) * values.std(axis=1)
+        quantiles = self.bias + scale * np.percentile(values, percentiles, axis=1).T
+        return mean, std, quantiles
+
+    def save(self, path):
+        """Write the forest to directory ``path`` as one .npy file per array."""
+        os.makedirs(path, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"),
+                    np.ascontiguousarray(getattr(self, name)))
+        meta = {'depth': self.depth, 'columns': self.columns,
+                'bias': self.bias, 'weight': self.weight, 'averaged': self.averaged}
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load a forest saved with ``save``; ``mmap_mode='r'`` maps it read-only."""
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        # np.asarray drops the np.memmap subclass (and its per-index
+        # overhead) while still viewing the mapped pages.
+        arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"),
+                                           mmap_mode=mmap_mode, allow_pickle=False))
+                  for name in cls.ARRAYS}
+        return cls(depth=meta['depth'], columns=meta['columns'],
+                   bias=meta['bias'], weight=meta['weight'],
+                   averaged=meta.get('averaged', True), **arrays)
+
+if __name__ == "__main__":
+    # Compile existing pickles without retraining: python forest.py
+    import joblib
+
+    print("[v0] Compiling mpg_model.pkl for serving...")
+    compiled = CompiledForest.from_sklearn(joblib.load("mpg_model.pkl"),
+                                           joblib.load("scaler.pkl"),
+                                           joblib.load("columns.pkl"))
+    compiled.save("mpg_forest")
+    print(f"[v0] Saved mpg_forest/: {compiled.n_trees} trees, "
+          f"{compiled.n_nodes} nodes, {compiled.nbytes / 1e6:.1f} MB")
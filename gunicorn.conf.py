@@ -0,0 +1,17 @@
+"""
+gunicorn settings, read from the working directory (see the Dockerfile).
+
+A worker resets the signal handlers it inherits, and with --preload the
+app is imported once in the master, so the SIGHUP reload handler has to be
+installed again in every worker. Doing it when the worker boots, rather
+than on its first request, means ``kill -HUP <worker>`` reloads even a
+worker that has not served anything yet instead of terminating it.
+"""
+
+
+def post_worker_init(worker):
+    # post_fork runs before the worker installs its own handlers (and resets
+    # SIGHUP to the default), so this is the earliest hook that sticks.
+    import app
+
+    app.start_loading()
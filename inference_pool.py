@@ -0,0 +1,372 @@
+"""
+Process-pool inference: score feature rows on every core behind one HTTP worker.
+
+A sync (or gthread) gunicorn worker runs ``predict`` in its request thread,
+so one process keeps at most one core busy. ``InferencePool`` forks worker
+processes that inherit the loaded bundle: the memory-mapped forest (and,
+for the pickle fallback, the sklearn model via copy-on-write) is shared,
+never pickled. Feature rows travel through a fixed set of slots in an
+anonymous shared mapping: the caller writes rows into a free slot, sends
+only ``(slot, n_rows)`` down the pipe of the least loaded worker, and that
+worker scores them in place into the slot's output rows. Large batches are
+split across workers.
+
+The slots double as backpressure: when all are busy for ``queue_timeout``
+seconds ``predict`` raises ``PoolSaturated`` (the app answers 503 with
+Retry-After) instead of queueing without bound.
+
+Workers are started lazily in the process that first predicts, so a
+``--preload`` master never owns them and each gunicorn worker gets its own
+pool. A slot is recorded against its worker before the rows are sent, so
+when a worker dies every chunk sent to it fails and the worker is
+replaced. A chunk not answered within ``task_timeout`` seconds fails its
+request and the worker holding it is killed, since its slot cannot be
+reused while that worker might still write to it.
+"""
+
+import mmap
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+
+import metrics
+
+
+class PoolSaturated(RuntimeError):
+    """Every slot stayed busy for the whole queue timeout."""
+
+
+class _Closed(Exception):
+    pass
+
+
+MESSAGE = struct.Struct("ii")  # (slot, n_rows) to workers, (slot, ok) back
+STOP = -1
+
+
+def _serve(predict_fn, tasks, results, inputs, outputs, parent_fds):
+    # Forked from a process that may have other threads; metrics in here
+    # would never be exported and its locks (sys.stdout's included, so no
+    # print) may have been held at the fork.
+    metrics.ENABLED = False
+    for fd in parent_fds:
+        os.close(fd)
+    # The owner stops us; handlers inherited from it (gunicorn's SIGTERM
+    # sets a flag) would keep terminate() from working.
+    for sig in (signal.SIGTERM, signal.SIGQUIT):
+        signal.signal(sig, signal.SIG_DFL)
+    for sig in (signal.SIGINT, signal.SIGHUP, signal.SIGUSR1, signal.SIGUSR2):
+        signal.signal(sig, signal.SIG_IGN)
+    while True:
+        # Messages are shorter than PIPE_BUF, so each write and each read of
+        # exactly one message is atomic and workers can share the result
+        # pipe without a lock. EOF means the owning process is gone.
+        message = os.read(tasks, MESSAGE.size)
+        if len(message) < MESSAGE.size:
+            return
+        slot, n_rows = MESSAGE.unpack(message)
+        if slot == STOP:
+            return
+        try:
+            outputs[slot, :n_rows] = predict_fn(inputs[slot, :n_rows])
+            ok = 1
+        except Exception as e:
+            os.write(2, f"[v0] Inference worker {os.getpid()} failed: {e!r}\n".encode())
+            ok = 0
+        os.write(results, MESSAGE.pack(slot, ok))
+
+
+class InferencePool:
+    """Dispatch ``predict_fn`` calls on (n, n_features) rows to worker processes."""
+
+    def __init__(self, predict_fn, n_features, processes=None, slots=None, max_rows=1024,
+                 min_chunk=64, queue_timeout=1.0, task_timeout=10.0):
+        self.predict_fn = predict_fn
+        self.n_features = n_features
+        self.processes = processes or os.cpu_count() or 1
+        self.slots = slots or 2 * self.processes
+        self.max_rows = max_rows
+        self.min_chunk = min_chunk
+        self.queue_timeout = queue_timeout
+        self.task_timeout = task_timeout
+        self._pid = None
+        self._closed = False
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.rows = 0
+        self.saturated = 0
+        self.restarts = 0
+
+    # --- lifecycle -----------------------------------------------------------
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+    def _start(self):
+        ctx = multiprocessing.get_context("fork")
+        in_bytes = self.slots * self.max_rows * self.n_features * 8
+        # MAP_SHARED | MAP_ANONYMOUS: shared with the forked workers, freed
+        # with the last mapping, and not limited by the size of /dev/shm.
+        self._buffer = mmap.mmap(-1, in_bytes + self.slots * self.max_rows * 8)
+        self._inputs = np.ndarray((self.slots, self.max_rows, self.n_features), np.float64,
+                                  buffer=self._buffer)
+        self._outputs = np.ndarray((self.slots, self.max_rows), np.float64,
+                                   buffer=self._buffer, offset=in_bytes)
+        self._results, self._result_writer = os.pipe()
+        self._ctx = ctx
+        self._free = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._futures = [None] * self.slots
+        # Which worker each in-flight slot was sent to, and the reverse.
+        self._owner = [None] * self.slots
+        self._assigned = [set() for _ in range(self.processes)]
+        self._abandoned = set()
+        self._task_writers = []
+        self._workers = []
+        for index in range(self.processes):
+            worker, writer = self._spawn(index)
+            self._workers.append(worker)
+            self._task_writers.append(writer)
+        self._stopping = False
+        self._pid = os.getpid()
+        self._collector = threading.Thread(target=self._collect_results, name="mpg-pool-results",
+                                           daemon=True)
+        self._collector.start()
+
+    def _spawn(self, index):
+        """Start worker ``index``; returns (process, the write end of its task pipe)."""
+        reader, writer = os.pipe()
+        # The child keeps no other task pipe open, so each worker sees EOF
+        # once the owner is gone.
+        parent_fds = [fd for fd in self._task_writers if fd is not None] + [writer, self._results]
+        worker = self._ctx.Process(
+            target=_serve, name=f"mpg-inference-{index}", daemon=True,
+            args=(self.predict_fn, reader, self._result_writer,
+                  self._inputs, self._outputs, parent_fds))
+        worker.start()
+        os.close(reader)
+        return worker, writer
+
+    def close(self):
+        """Stop the workers once in-flight chunks finish; later calls score in-process."""
+        self._closed = True
+        if self._pid != os.getpid():
+            return
+
+        def drain():
+            for _ in range(self.slots):
+                self._free.get()
+            self._stopping = True
+            with self._lock:
+                for writer in self._task_writers:
+                    try:
+                        os.write(writer, MESSAGE.pack(STOP, 0))
+                    except OSError:
+                        pass
+            for worker in self._workers:
+                worker.join(5)
+            self._collector.join()
+            for fd in self._task_writers + [self._results, self._result_writer]:
+                os.close(fd)
+        threading.Thread(target=drain, name="mpg-pool-close", daemon=True).start()
+
+    # --- results and worker supervision --------------------------------------
+
+    def _collect_results(self):
+        checked = time.monotonic()
+        while not self._stopping:
+            self._read_results(0.5)
+            if time.monotonic() - checked > 0.5:
+                checked = time.monotonic()
+                self._check_workers()
+
+    def _read_results(self, timeout):
+        # Results are MESSAGE.size bytes and written atomically, so a read
+        # of a multiple of that never splits one.
+        while select.select([self._results], [], [], timeout)[0]:
+            data = os.read(self._results, 64 * MESSAGE.size)
+            for slot, ok in MESSAGE.iter_unpack(data):
+                self._resolve(slot, None if ok else RuntimeError("inference worker failed"))
+            timeout = 0
+
+    def _resolve(self, slot, error=None):
+        with self._lock:
+            index = self._owner[slot]
+            if index is not None:
+                self._assigned[index].discard(slot)
+                self._owner[slot] = None
+            future = self._futures[slot]
+            abandoned = slot in self._abandoned
+            self._abandoned.discard(slot)
+        if abandoned:
+            self._release(slot)
+        elif future is not None and not future.done():
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def _check_workers(self):
+        dead = [index for index, worker in enumerate(self._workers) if not worker.is_alive()]
+        if not dead or self._stopping:
+            return
+        # Anything a dead worker answered before exiting is already in the pipe.
+        self._read_results(0)
+        for index in dead:
+            worker = self._workers[index]
+            with self._lock:
+                slots, self._assigned[index] = self._assigned[index], set()
+                for slot in slots:
+                    self._owner[slot] = None
+                os.close(self._task_writers[index])
+                self._task_writers[index] = None
+                self._workers[index], self._task_writers[index] = self._spawn(index)
+                self.restarts += 1
+            print(f"[v0] Inference worker {worker.pid} exited ({worker.exitcode}); restarting")
+            error = RuntimeError(f"inference worker {worker.pid} exited with code {worker.exitcode}")
+            for slot in slots:
+                self._resolve(slot, error)
+
+    # --- prediction ----------------------------------------------------------
+
+    def _send(self, slot, n_rows):
+        # Under the lock, so a worker being replaced cannot close (and the
+        # OS reuse) the descriptor between choosing it and writing to it.
+        with self._lock:
+            index = min(range(self.processes), key=lambda i: len(self._assigned[i]))
+            self._assigned[index].add(slot)
+            self._owner[slot] = index
+            try:
+                os.write(self._task_writers[index], MESSAGE.pack(slot, n_rows))
+            except OSError:
+                pass  # the worker is gone; _check_workers fails the slot
+
+    def _acquire(self, inflight, out):
+        # Collect this call's own chunks before waiting, so a caller only
+        # ever blocks holding no slots and concurrent batches cannot deadlock.
+        while inflight:
+            try:
+                return self._free.get_nowait()
+            except queue.Empty:
+                self._finish(inflight.popleft(), out)
+        deadline = time.monotonic() + self.queue_timeout
+        while True:
+            if self._closed:
+                raise _Closed()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with self._lock:
+                    self.saturated += 1
+                raise PoolSaturated(f"all {self.slots} inference slots busy "
+                                    f"for {self.queue_timeout:g}s")
+            try:
+                return self._free.get(timeout=min(remaining, 0.05))
+            except queue.Empty:
+                pass
+
+    def _submit(self, rows, start, inflight, out):
+        slot = self._acquire(inflight, out)
+        future = self._futures[slot] = Future()
+        n_rows = len(rows)
+        self._inputs[slot, :n_rows] = rows
+        self._send(slot, n_rows)
+        return slot, start, n_rows, future
+
+    def _release(self, slot):
+        self._futures[slot] = None
+        self._free.put(slot)
+
+    def _abandon(self, slot):
+        """Give up on a slot's chunk: kill the worker holding it, which frees the slot."""
+        with self._lock:
+            index = self._owner[slot]
+            if index is not None:
+                self._abandoned.add(slot)
+                worker = self._workers[index]
+        if index is None:
+            # Answered just now; nothing can write to the slot any more.
+            self._release(slot)
+            return
+        print(f"[v0] Inference worker {worker.pid} took over {self.task_timeout:g}s; killing it")
+        worker.kill()
+
+    def _finish(self, task, out):
+        """Wait for a chunk, copy its rows into ``out`` (unless None) and free its slot."""
+        slot, start, n_rows, future = task
+        try:
+            future.result(timeout=self.task_timeout)
+        except FutureTimeout:
+            self._abandon(slot)
+            raise RuntimeError(f"inference worker did not answer within {self.task_timeout:g}s") from None
+        except BaseException:
+            self._release(slot)
+            raise
+        if out is not None:
+            out[start:start + n_rows] = self._outputs[slot, :n_rows]
+        self._release(slot)
+
+    def predict(self, X):
+        """Predict for raw feature rows of shape (n, n_features), like ``predict_fn``."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self._closed:
+            return self.predict_fn(X)
+        self._ensure_started()
+        n = len(X)
+        chunk = min(self.max_rows, max(self.min_chunk, -(-n // self.processes)))
+        out = np.empty(n)
+        # At most one chunk per worker in flight per call, so one large
+        # batch cannot hold every slot while others wait.
+        inflight = deque()
+        try:
+            for start in range(0, n, chunk):
+                if len(inflight) >= self.processes:
+                    self._finish(inflight.popleft(), out)
+                inflight.append(self._submit(X[start:start + chunk], start, inflight, out))
+            while inflight:
+                self._finish(inflight.popleft(), out)
+        except _Closed:
+            out = None  # closed by a reload mid-call; score it here instead
+        finally:
+            # Chunks still in flight after an error: wait (bounded) and free their slots.
+            for task in inflight:
+                try:
+                    self._finish(task, None)
+                except Exception:
+                    pass
+        if out is None:
+            return self.predict_fn(X)
+        with self._lock:
+            self.chunks += -(-n // chunk)
+            self.rows += n
+        return out
+
+    def stats(self):
+        """Worker count, slots in use and saturation/restart counters."""
+        started = self._pid == os.getpid()
+        return {
+            'processes': self.processes,
+            'alive': sum(w.is_alive() for w in self._workers) if started else 0,
+            'slots': self.slots,
+            'slots_busy': self.slots - self._free.qsize() if started else 0,
+            'chunks': self.chunks,
+            'rows': self.rows,
+            'saturated': self.saturated,
+            'restarts': self.restarts,
+        }
@@ -0,0 +1,347 @@
+"""
+Precomputed prediction table for the form's discrete input space.
+
+The form bounds most inputs: cylinders 2-16 and model years 1990-2024
+are integers, the brand only matters through its hash bucket, and the
+one-hot fields have a handful of options. Engine size (step 0.1) and
+fuel capacity are gridded. ``build`` scores every grid point with the
+live model once and stores the results as one float32 ``.npy`` array
+plus ``meta.json`` describing the axes; the app memory-maps it and
+answers on-grid requests with an O(1) lookup. Fuel capacity between grid
+points is linearly interpolated. Anything off the grid (an unknown
+one-hot option, an out-of-range or fractional value) returns None and
+falls back to the live model.
+
+The brand bucket and one-hot options form a single axis of combinations.
+Every combination the form allows is about 1,800 of them, or 4.9 GB at the
+default steps. So ``--data`` limits the table to the combinations seen in
+the training data, and the rest fall back to the live model.
+
+    python lookup_table.py build --data vehicles.csv [--artifacts DIR] [--fuel-step 250]
+    python lookup_table.py error [--artifacts DIR] [--samples 20000]
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from features import (EXAMPLE_INPUT, FORM_CHOICES, FORM_RANGES, HASH_COL, INPUT_FIELDS,
+                      N_HASH_COMPONENTS, brand_bucket)
+
+TABLE_PATH = os.environ.get("MPG_TABLE_PATH", "mpg_table")
+INTEGER_FIELDS = ['Engine_Cylinders', 'Model_Year']
+# (field, interpolate between grid points): the form steps engine size by
+# 0.1, so only fuel capacity takes values between grid points.
+CONTINUOUS_FIELDS = [('Engine_Size', False), ('Fuel_Capacity', True)]
+EPS = 1e-9
+VERIFY_POINTS = 64
+VERIFY_TOLERANCE = 1e-3
+MAX_TABLE_MB = 2048
+
+
+def _bucket_brands(n_components=N_HASH_COMPONENTS):
+    """One example brand string for every hash bucket."""
+    examples = {}
+    for i in itertools.count():
+        brand = f"brand-{i}"
+        examples.setdefault(brand_bucket(brand, n_components), brand)
+        if len(examples) == n_components:
+            return examples
+
+
+def observed_combos(df, axes):
+    """Sorted level-index tuples of ``axes`` that occur in the vehicles frame ``df``.
+
+    Rows with a value outside an axis' levels (or missing) are skipped.
+    """
+    codes = []
+    for axis in axes:
+        values = df[axis['field']].astype(object)
+        if 'buckets' in axis:
+            positions = {bucket: i for i, bucket in enumerate(axis['buckets'])}
+            values = values.map(lambda brand: positions.get(brand_bucket(brand)) if isinstance(brand, str) else None)
+        else:
+            positions = {level: i for i, level in enumerate(axis['levels'])}
+            values = values.map(positions.get)
+        codes.append(values.to_numpy(dtype=float))
+    codes = np.column_stack(codes) if codes else np.empty((len(df), 0))
+    codes = codes[~np.isnan(codes).any(axis=1)].astype(int)
+    return [tuple(int(i) for i in row) for row in np.unique(codes, axis=0)]
+
+
+def _discrete_axes(encoder):
+    """Discrete axes the encoder actually distinguishes: brand bucket, then one-hot fields."""
+    buckets = [b for b in range(N_HASH_COMPONENTS) if f"col_{b}" in encoder.columns]
+    examples = _bucket_brands()
+    axes = [{'field': HASH_COL, 'buckets': buckets, 'levels': [examples[b] for b in buckets]}]
+    base = dict(EXAMPLE_INPUT)
+    for field, choices in FORM_CHOICES.items():
+        rows = {encoder.encode(dict(base, **{field: choice})).tobytes() for choice in choices}
+        if len(rows) > 1:
+            axes.append({'field': field, 'levels': list(choices)})
+    return axes
+
+
+class LookupTable:
+    """Gridded model outputs with O(1) lookup; see the module docstring."""
+
+    def __init__(self, values, meta):
+        self.values = values
+        self.meta = meta
+        self.discrete = meta['discrete']
+        self.combos = [tuple(combo) for combo in meta['combos']]
+        self.integer = meta['integer']
+        self.continuous = meta['continuous']
+        self._positions = []
+        for axis in self.discrete:
+            keys = axis.get('buckets', axis['levels'])
+            self._positions.append({key: i for i, key in enumerate(keys)})
+        self._combo_index = {combo: i for i, combo in enumerate(self.combos)}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    @classmethod
+    def build(cls, encoder, predict_rows, path, fuel_step=250.0, engine_step=0.1, progress=True,
+              max_mb=MAX_TABLE_MB, data=None):
+        """Score every grid point with ``predict_rows`` and write the table to ``path``.
+
+        ``data`` (a vehicles frame, e.g. the training data) limits the
+        discrete combinations to those occurring in it; without it every
+        combination the form allows is tabulated. Raises ValueError without
+        writing anything if the table would exceed ``max_mb``.
+        """
+        discrete = _discrete_axes(encoder)
+        if data is not None:
+            combos = observed_combos(data, discrete)
+        else:
+            combos = list(itertools.product(*[range(len(a['levels'])) for a in discrete]))
+        integer = [{'field': f, 'start': FORM_RANGES[f][0],
+                    'size': FORM_RANGES[f][1] - FORM_RANGES[f][0] + 1} for f in INTEGER_FIELDS]
+        steps = {'Engine_Size': engine_step, 'Fuel_Capacity': fuel_step}
+        continuous = []
+        for field, interpolate in CONTINUOUS_FIELDS:
+            lo, hi = FORM_RANGES[field]
+            continuous.append({'field': field, 'start': lo, 'step': steps[field],
+                               'size': int(round((hi - lo) / steps[field])) + 1,
+                               'interpolate': interpolate})
+        meta = {'columns': encoder.columns, 'discrete': discrete, 'combos': combos,
+                'integer': integer, 'continuous': continuous}
+
+        shape = [len(combos)] + [a['size'] for a in integer] + [a['size'] for a in continuous]
+        size_mb = math.prod(shape) * np.dtype(np.float32).itemsize / 1e6
+        if size_mb > max_mb:
+            hint = "a coarser --fuel-step" if data is not None else "--data to keep only trained combinations"
+            raise ValueError(f"table of shape {tuple(shape)} would take {size_mb:,.0f} MB "
+                             f"(limit {max_mb:,.0f} MB); use {hint} or raise --max-mb")
+        os.makedirs(path, exist_ok=True)
+        values = np.lib.format.open_memmap(os.path.join(path, "values.npy"), mode="w+",
+                                           dtype=np.float32, shape=tuple(shape))
+
+        # One block per discrete combination and cylinder count.
+        grids = [np.arange(a['size']) + a['start'] for a in integer[1:]]
+        # Rounded so grid points equal the floats parsed from form input ("2.0").
+        grids += [np.round(a['start'] + a['step'] * np.arange(a['size']), 6) for a in continuous]
+        mesh = [g.ravel() for g in np.meshgrid(*grids, indexing="ij")]
+        base = dict(EXAMPLE_INPUT)
+        cylinders = integer[0]
+        start = time.perf_counter()
+        for n, combo in enumerate(combos):
+            for c in range(cylinders['size']):
+                columns = {name: np.full(len(mesh[0]), base[name], dtype=object)
+                           for name in INPUT_FIELDS}
+                for axis, level in zip(discrete, combo):
+                    columns[axis['field']][:] = axis['levels'][level]
+                columns[cylinders['field']] = np.full(len(mesh[0]), cylinders['start'] + c, dtype=np.float64)
+                for axis, column in zip(integer[1:] + continuous, mesh):
+                    columns[axis['field']] = column.astype(np.float64)
+                block = predict_rows(encoder.encode_columns(columns))
+                values[n, c] = block.reshape(values.shape[2:])
+            if progress:
+                print(f"[v0] Table: {n + 1}/{len(combos)} discrete combinations "
+                      f"({time.perf_counter() - start:.0f}s)")
+        values.flush()
+        del values
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        values = np.asarray(np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode))
+        return cls(values, meta)
+
+    def lookup(self, input_data):
+        """Table prediction for a parsed input dict, or None if it is off the grid."""
+        combo = []
+        for axis, positions in zip(self.discrete, self._positions):
+            value = input_data[axis['field']]
+            if 'buckets' in axis:
+                value = brand_bucket(value)
+            i = positions.get(value)
+            if i is None:
+                return None
+            combo.append(i)
+        i = self._combo_index.get(tuple(combo))
+        if i is None:
+            return None
+        index = [i]
+        for axis in self.integer:
+            value = input_data[axis['field']]
+            i = int(value) - axis['start']
+            if value != int(value) or not 0 <= i < axis['size']:
+                return None
+            index.append(i)
+        corners = [(tuple(index), 1.0)]
+        for axis in self.continuous:
+            pos = (input_data[axis['field']] - axis['start']) / axis['step']
+            if not -EPS <= pos <= axis['size'] - 1 + EPS:
+                return None
+            i = min(int(math.floor(pos + EPS)), axis['size'] - 1)
+            frac = pos - i
+            if frac <= EPS:
+                corners = [(key + (i,), w) for key, w in corners]
+            elif not axis['interpolate']:
+                return None
+            else:
+                corners = ([(key + (i,), w * (1 - frac)) for key, w in corners]
+                           + [(key + (i + 1,), w * frac) for key, w in corners])
+        return float(sum(w * float(self.values[key]) for key, w in corners))
+
+    def verify(self, encoder, predict_rows, n=VERIFY_POINTS, seed=0, tolerance=VERIFY_TOLERANCE):
+        """Max |table - live| over ``n`` random grid points; raises ValueError above ``tolerance``.
+
+        Catches a table built for a different model or column layout.
+        """
+        if self.meta['columns'] != list(encoder.columns):
+            raise ValueError("lookup table was built for a different column layout")
+        rng = np.random.default_rng(seed)
+        inputs = []
+        for _ in range(n):
+            input_data = dict(EXAMPLE_INPUT)
+            combo = self.combos[rng.integers(len(self.combos))]
+            for axis, level in zip(self.discrete, combo):
+                input_data[axis['field']] = axis['levels'][level]
+            for axis in self.integer:
+                input_data[axis['field']] = axis['start'] + int(rng.integers(axis['size']))
+            for axis in self.continuous:
+                input_data[axis['field']] = round(axis['start'] + axis['step'] * int(rng.integers(axis['size'])), 6)
+            inputs.append(input_data)
+        live = predict_rows(encoder.encode_many(inputs))
+        table = np.array([self.lookup(input_data) for input_data in inputs], dtype=np.float64)
+        error = float(np.max(np.abs(table - live)))
+        if not error <= tolerance:
+            raise ValueError(f"lookup table disagrees with the model (max |diff| {error:.3g})")
+        return error
+
+
+def random_inputs(n, seed=0, off_grid=0.0):
+    """Form-like inputs; a fraction ``off_grid`` get values the table cannot serve."""
+    from benchmarks.synthetic import BRANDS
+
+    rng = np.random.default_rng(seed)
+    inputs = []
+    for _ in range(n):
+        input_data = {
+            'Engine_Size': round(float(rng.uniform(*FORM_RANGES['Engine_Size'])), 1),
+            'Engine_Cylinders': float(rng.integers(FORM_RANGES['Engine_Cylinders'][0],
+                                                   FORM_RANGES['Engine_Cylinders'][1] + 1)),
+            'Car_Brand': str(rng.choice(BRANDS)),
+            'Model_Year': int(rng.integers(FORM_RANGES['Model_Year'][0], FORM_RANGES['Model_Year'][1] + 1)),
+            'Fuel_Capacity': float(rng.integers(FORM_RANGES['Fuel_Capacity'][0],
+                                                FORM_RANGES['Fuel_Capacity'][1] + 1)),
+        }
+        for field, choices in FORM_CHOICES.items():
+            input_data[field] = str(rng.choice(choices))
+        if rng.random() < off_grid:
+            input_data['Engine_Size'] += 0.05
+        inputs.append(input_data)
+    return inputs
+
+
+def measure_error(table, bundle, n=20000, seed=0, off_grid=0.0):
+    """Compare table lookups with the live model on random form inputs."""
+    inputs = random_inputs(n, seed, off_grid)
+    start = time.perf_counter()
+    looked_up = [table.lookup(input_data) for input_data in inputs]
+    lookup_s = time.perf_counter() - start
+    hits = np.array([v is not None for v in looked_up])
+    live = bundle.predict_rows(bundle.encoder.encode_many(inputs))
+    single = []
+    for input_data in inputs[:200]:
+        start = time.perf_counter()
+        bundle.predict_rows(bundle.encoder.encode_many([input_data]))
+        single.append(time.perf_counter() - start)
+    error = np.abs(np.array([v for v in looked_up if v is not None]) - live[hits])
+    report = {
+        'samples': n,
+        'hit_rate': float(hits.mean()),
+        'mean_abs_error': float(error.mean()) if len(error) else None,
+        'p99_abs_error': float(np.percentile(error, 99)) if len(error) else None,
+        'max_abs_error': float(error.max()) if len(error) else None,
+        'lookup_us': lookup_s / n * 1e6,
+        'live_single_row_us': float(np.median(single)) * 1e6,
+    }
+    return report
+
+
+def main(argv=None):
+    from artifacts import load_bundle
+
+    parser = argparse.ArgumentParser(description="Build or check the prediction lookup table.")
+    parser.add_argument("command", choices=["build", "error"])
+    parser.add_argument("--artifacts", default=".", help="directory with the model artifacts")
+    parser.add_argument("--table", help=f"table directory (default: <artifacts>/{TABLE_PATH})")
+    parser.add_argument("--data", help="training vehicles CSV or dataset cache; only the brand/option "
+                                       "combinations in it are tabulated")
+    parser.add_argument("--fuel-step", type=float, default=250.0)
+    parser.add_argument("--engine-step", type=float, default=0.1)
+    parser.add_argument("--max-mb", type=float, default=MAX_TABLE_MB, help="refuse to build a larger table")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--off-grid", type=float, default=0.0,
+                        help="fraction of error samples pushed off the grid")
+    args = parser.parse_args(argv)
+    path = args.table or os.path.join(args.artifacts, TABLE_PATH)
+
+    bundle = load_bundle(args.artifacts, use_table=False)
+    if args.command == "build":
+        data = None
+        if args.data:
+            import dataset
+            import pandas as pd
+
+            fields = [HASH_COL] + list(FORM_CHOICES)
+            data = (dataset.load(args.data, fields) if dataset.is_dataset(args.data)
+                    else pd.read_csv(args.data, usecols=fields))
+        start = time.perf_counter()
+        try:
+            table = LookupTable.build(bundle.encoder, bundle.predict_rows, path, fuel_step=args.fuel_step,
+                                      engine_step=args.engine_step, max_mb=args.max_mb, data=data)
+        except ValueError as e:
+            raise SystemExit(f"[v0] Not building {path}: {e}")
+        print(f"[v0] Built {path}: {len(table.combos)} brand/option combinations, "
+              f"shape {table.shape}, {table.nbytes / 1e6:.1f} MB "
+              f"in {time.perf_counter() - start:.1f}s")
+        print(f"[v0] Verified against the model: max |diff| = "
+              f"{table.verify(bundle.encoder, bundle.predict_rows):.2e}")
+    else:
+        table = LookupTable.load(path)
+        report = measure_error(table, bundle, args.samples, off_grid=args.off_grid)
+        for key, value in report.items():
+            print(f"{key:<22}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Lightweight latency and counter metrics with a Prometheus text exposition.
+
+``stage(name)`` returns a context manager that records the elapsed time of
+a block into a per-stage summary (count, sum and p50/p95/p99 over a window
+of recent samples); ``count_request`` / ``count_error`` keep per-endpoint
+counters. Each call costs well under a microsecond of bookkeeping, and
+MPG_METRICS=0 turns all of it into no-ops. Metrics are per process; with
+several gunicorn workers each worker reports its own numbers.
+"""
+
+import os
+import threading
+from collections import deque
+from time import perf_counter
+
+ENABLED = os.environ.get("MPG_METRICS", "1") != "0"
+WINDOW = 4096
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    """Count, sum and a sliding window of samples for quantile estimates."""
+
+    __slots__ = ('count', 'total', 'samples', 'lock')
+
+    def __init__(self, window=WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.count += 1
+            self.total += value
+            self.samples.append(value)
+
+    def snapshot(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count, total = self.count, self.total
+        quantiles = {}
+        if samples:
+            for q in QUANTILES:
+                quantiles[q] = samples[min(len(samples) - 1, int(q * len(samples)))]
+        return count, total, quantiles
+
+
+class _Timer:
+    __slots__ = ('summary', 'start')
+
+    def __init__(self, summary):
+        self.summary = summary
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.summary.observe(perf_counter() - self.start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+_stages = {}
+_requests = {}
+_errors = {}
+_counter_lock = threading.Lock()
+_collectors = []
+
+
+def _summary(name):
+    summary = _stages.get(name)
+    if summary is None:
+        with _counter_lock:
+            summary = _stages.setdefault(name, Summary())
+    return summary
+
+
+def stage(name):
+    """Context manager timing one stage of request handling."""
+    if not ENABLED:
+        return NULL_TIMER
+    return _Timer(_summary(name))
+
+
+def observe(name, seconds):
+    if ENABLED:
+        _summary(name).observe(seconds)
+
+
+def count_request(endpoint):
+    if ENABLED:
+        with _counter_lock:
+            _requests[endpoint] = _requests.get(endpoint, 0) + 1
+
+
+def count_error(endpoint, exc):
+    if ENABLED:
+        key = (endpoint, type(exc).__name__)
+        with _counter_lock:
+            _errors[key] = _errors.get(key, 0) + 1
+
+
+def register_collector(fn):
+    """Add a callable returning extra ``(name, type, help, [(labels, value)])`` metrics.
+
+    For type "summary" the last item is a ``Summary`` instead of samples.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _summary_lines(name, labels, summary):
+    count, total, quantiles = summary.snapshot()
+    lines = [f"{name}{_labels(dict(labels, quantile=q))} {value:.9f}" for q, value in quantiles.items()]
+    lines.append(f"{name}_sum{_labels(labels)} {total:.9f}")
+    lines.append(f"{name}_count{_labels(labels)} {count}")
+    return lines
+
+
+def render():
+    """Return all metrics in the Prometheus text exposition format."""
+    lines = [
+        "# HELP mpg_stage_seconds Time spent in each stage of request handling.",
+        "# TYPE mpg_stage_seconds summary",
+    ]
+    for name in sorted(_stages):
+        lines += _summary_lines("mpg_stage_seconds", {"stage": name}, _stages[name])
+
+    with _counter_lock:
+        requests = dict(_requests)
+        errors = dict(_errors)
+    lines += ["# HELP mpg_requests_total Requests handled, by endpoint.",
+              "# TYPE mpg_requests_total counter"]
+    lines += [f'mpg_requests_total{{endpoint="{e}"}} {n}' for e, n in sorted(requests.items())]
+    lines += ["# HELP mpg_errors_total Failed requests, by endpoint and exception type.",
+              "# TYPE mpg_errors_total counter"]
+    lines += [f'mpg_errors_total{{endpoint="{e}",exception="{x}"}} {n}'
+              for (e, x), n in sorted(errors.items())]
+
+    for collect in _collectors:
+        for name, kind, help_text, samples in collect():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            if isinstance(samples, Summary):
+                lines += _summary_lines(name, {}, samples)
+            else:
+                lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+
+    lines += ["# HELP process_resident_memory_bytes Resident set size of this process.",
+              "# TYPE process_resident_memory_bytes gauge",
+              f"process_resident_memory_bytes {process_rss_bytes()}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,194 @@
+"""
+Buffered, non-blocking request/prediction log (JSON lines).
+
+``RequestLogger.log`` only appends the record to a bounded in-memory
+buffer; a background thread serializes and writes the buffer in bulk,
+either every ``flush_interval`` seconds or as soon as the buffer is half
+full. If the disk falls behind and the buffer fills up, new records are
+dropped and counted rather than blocking the request. The file is rotated
+by size and/or age like ``logging.handlers.RotatingFileHandler``
+(``requests.jsonl`` -> ``requests.jsonl.1`` -> ...).
+
+Processes must not share a file: each would rotate it on its own. With
+``per_process`` every process (e.g. each gunicorn worker) writes its own
+``requests.<pid>.jsonl`` and rotates only that.
+
+Flushes are serialized, so records reach the file in the order they were
+logged even when the exit-time flush races the writer thread. Records whose
+write fails (disk full, directory gone) are kept and retried on the next
+flush; ``errors`` counts them per failed attempt, and only those that no
+longer fit in ``capacity`` are dropped.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class RequestLogger:
+    """Append JSON records to ``path`` from a background writer thread."""
+
+    def __init__(self, path, capacity=10000, flush_interval=1.0, max_bytes=100 * 1024 * 1024,
+                 rotate_interval=None, backup_count=5, prepare=None, per_process=False):
+        self.base_path = path
+        self.per_process = per_process
+        self.path = self._path_for(os.getpid())
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.prepare = prepare
+        self._buffer = deque()
+        self._pending = []
+        self._failing = False
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._file = None
+        self._opened_at = None
+        self.logged = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rotations = 0
+        atexit.register(self.flush)
+
+    def _path_for(self, pid):
+        if not self.per_process:
+            return self.base_path
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}.{pid}{ext}"
+
+    def _ensure_thread(self):
+        # Started lazily, and again after a fork (e.g. gunicorn --preload).
+        if self._pid != os.getpid():
+            if self._pid is not None:
+                # Forked: the parent's writer may have held the lock.
+                self._io_lock = threading.Lock()
+                self._pending = []
+            self._pid = os.getpid()
+            self.path = self._path_for(self._pid)
+            self._buffer.clear()
+            self._file = None
+            self._thread = threading.Thread(target=self._run, name="mpg-request-log", daemon=True)
+            self._thread.start()
+
+    def log(self, record):
+        """Queue a record without blocking; returns False if it was dropped."""
+        with self._lock:
+            self._ensure_thread()
+            if len(self._buffer) >= self.capacity:
+                self.dropped += 1
+                return False
+            self._buffer.append(record)
+            self.logged += 1
+            if len(self._buffer) * 2 >= self.capacity:
+                self._wake.set()
+        return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[v0] Request log writer error: {e}")
+
+    def flush(self):
+        """Write everything buffered so far (called by the writer thread and at exit)."""
+        with self._io_lock:
+            with self._lock:
+                records, self._buffer = self._buffer, deque()
+            lines, self._pending = self._pending, []
+            unserializable = 0
+            for record in records:
+                try:
+                    if self.prepare is not None:
+                        record = self.prepare(record)
+                    lines.append(json.dumps(record, default=str))
+                except Exception:
+                    unserializable += 1
+            if unserializable:
+                with self._lock:
+                    self.dropped += unserializable
+            if not lines:
+                return
+            data = ("\n".join(lines) + "\n").encode()
+            start = None
+            try:
+                self._maybe_rotate(len(data))
+                start = self._file.tell()
+                self._file.write(data)
+                self._file.flush()
+            except OSError as e:
+                self._close_after_error(start)
+                self._keep_for_retry(lines)
+                if not self._failing:
+                    print(f"[v0] Request log write failed, keeping {len(lines)} records for retry: {e}")
+                self._failing = True
+                return
+            self._failing = False
+            self.written += len(lines)
+
+    def _keep_for_retry(self, lines):
+        overflow = len(lines) - self.capacity
+        with self._lock:
+            self.errors += len(lines)
+            if overflow > 0:
+                self.dropped += overflow
+        self._pending = lines[max(overflow, 0):]
+
+    def _close_after_error(self, start):
+        # Cut off a partly written batch so the retry starts on a fresh line,
+        # and reopen the file on the next flush.
+        if self._file is None:
+            return
+        try:
+            if start is not None:
+                self._file.truncate(start)
+            self._file.close()
+        except (OSError, ValueError):
+            pass
+        self._file = None
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._opened_at = time.time()
+
+    def _maybe_rotate(self, incoming):
+        if self._file is None:
+            self._open()
+        too_big = self.max_bytes and self._file.tell() + incoming > self.max_bytes and self._file.tell() > 0
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if not (too_big or too_old):
+            return
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+        self._open()
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer) + len(self._pending)
+        return {
+            'buffered': buffered,
+            'capacity': self.capacity,
+            'logged': self.logged,
+            'written': self.written,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'rotations': self.rotations,
+        }
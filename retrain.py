@@ -0,0 +1,282 @@
+"""
+Incremental refresh of the serving forest from newly logged observations.
+
+Retraining from scratch refits every tree on the full dataset. This instead
+reads only the rows appended to a local CSV since the last refresh (the
+byte offset is recorded in each version's ``retrain.json``) and:
+
+* updates the StandardScaler statistics with ``partial_fit`` and re-maps the
+  existing trees' split thresholds onto the new scaling, so the old trees
+  keep making the same decisions (up to float32 rounding for inputs that
+  sit exactly on a split point; the report shows the effect);
+* grows the forest with ``warm_start`` trees fitted on the new rows, or with
+  --replace-oldest first drops as many of the oldest trees to keep its size;
+* writes the result as a new version under --model-dir (pickles plus the
+  compiled forest), and points CURRENT at it unless held-out R² dropped by
+  more than --tolerance.
+
+Published versions are never modified: --init, which records that the base
+model already covers everything now in --source, writes its ``retrain.json``
+into a new version holding (hard links to) the base version's files.
+
+Accuracy is reported on a fixed holdout CSV before and after, along with
+the base model's error on the new rows (how far the incoming data drifted).
+
+    python retrain.py --source observations.csv --holdout holdout.csv --model-dir models --init
+    python retrain.py --source observations.csv --holdout holdout.csv --model-dir models --add-trees 30
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import shutil
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from artifacts import PICKLES, publish_version, resolve_version
+from features import FeatureEncoder
+from forest import LEAF, _scaled32, fold_thresholds
+from train_model import IMPUTATION_FILE, TARGET, impute, save_artifacts
+
+STATE_FILE = "retrain.json"
+
+
+def read_new_rows(path, offset):
+    """Return (rows appended after byte ``offset``, new offset).
+
+    A trailing line without its newline is still being written; it is left
+    for the next refresh.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = max(offset, len(header))
+        if os.fstat(f.fileno()).st_size < start:
+            raise ValueError(f"{path} is shorter than the recorded offset {offset}; "
+                             "the source must be append-only")
+        f.seek(start)
+        chunk = f.read()
+    chunk = chunk[:chunk.rfind(b'\n') + 1]
+    if not chunk:
+        return pd.DataFrame(), start
+    return pd.read_csv(io.BytesIO(header + chunk)), start + len(chunk)
+
+
+def load_imputation(directory):
+    """The gap fill values saved with the version's training run, or None for an older version."""
+    try:
+        with open(os.path.join(directory, IMPUTATION_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def prepare_rows(df, encoder, imputation=None):
+    """Return (encoded rows as a DataFrame with the model's columns, targets).
+
+    Gaps are filled with ``imputation`` (training's values), or with the
+    rows' own means when there are none.
+    """
+    df = impute(df.dropna(subset=[TARGET]), imputation)
+    X = pd.DataFrame(encoder.encode_columns(df), columns=encoder.columns)
+    return X, df[TARGET].to_numpy(dtype=np.float64)
+
+
+def rescale_thresholds(model, old_scaler, new_scaler):
+    """Move every tree's split thresholds from ``old_scaler``'s space to ``new_scaler``'s.
+
+    Each split becomes the largest raw value that went left before (see
+    forest.fold_thresholds), expressed the way sklearn will see it under
+    the new scaling. sklearn compares float32 values, so a raw value within
+    one float32 step of a split can still change sides.
+    """
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        split = tree.children_left != LEAF
+        f = tree.feature[split]
+        raw = fold_thresholds(tree.threshold[split], old_scaler.mean_[f], old_scaler.scale_[f])
+        tree.threshold[split] = _scaled32(raw, new_scaler.mean_[f], new_scaler.scale_[f])
+
+
+def grow(model, X_scaled, y, add_trees, replace_oldest=False):
+    """Add ``add_trees`` trees fitted on the new rows (dropping as many old ones first)."""
+    if replace_oldest:
+        model.estimators_ = model.estimators_[add_trees:]
+        model.n_estimators = len(model.estimators_)
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + add_trees)
+    model.fit(X_scaled, y)
+    model.set_params(warm_start=False)
+    return model
+
+
+def evaluate(model, scaler, columns, X, y):
+    pred = model.predict(pd.DataFrame(scaler.transform(X), columns=columns))
+    return {'r2': float(r2_score(y, pred)), 'mae': float(mean_absolute_error(y, pred)), 'rows': len(y)}
+
+
+def load_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_state(directory, state):
+    with open(os.path.join(directory, STATE_FILE), "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def _link_or_copy(source, destination):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def copy_version(base_dir, output_dir):
+    """Create ``output_dir`` with the base version's artifacts, hard-linked where possible.
+
+    The base's retrain.json is left out; the caller writes the new one.
+    """
+    shutil.copytree(base_dir, output_dir, copy_function=_link_or_copy,
+                    ignore=shutil.ignore_patterns(STATE_FILE))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the forest with newly logged rows.")
+    parser.add_argument("--source", required=True, help="append-only vehicles CSV with Combined_MPG")
+    parser.add_argument("--holdout", required=True, help="fixed vehicles CSV to report accuracy on")
+    parser.add_argument("--model-dir", required=True, help="versioned model directory (see MPG_MODEL_DIR)")
+    parser.add_argument("--base", help="version to start from (default: CURRENT)")
+    parser.add_argument("--version", help="name of the new version (default: a timestamp)")
+    parser.add_argument("--init", action="store_true",
+                        help="write the base model as a new version marked as trained on "
+                             "everything now in --source, and exit")
+    parser.add_argument("--add-trees", type=int, default=30)
+    parser.add_argument("--replace-oldest", action="store_true",
+                        help="drop the --add-trees oldest trees so the forest keeps its size")
+    parser.add_argument("--min-rows", type=int, default=50, help="skip the refresh below this many new rows")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="largest holdout R² drop that is still published")
+    parser.add_argument("--no-publish", action="store_true")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = time.perf_counter()
+    base, base_dir = resolve_version(args.model_dir, args.base)
+    state = load_state(base_dir)
+    source = os.path.abspath(args.source)
+    offset = state.get('offset', 0) if state.get('source') == source else 0
+    version = args.version or time.strftime("%Y%m%d-%H%M%S")
+    output_dir = os.path.join(args.model_dir, version)
+
+    if args.init:
+        with open(source, 'rb') as f:
+            data = f.read()
+        copy_version(base_dir, output_dir)
+        state = dict(state, base_version=base, source=source, offset=data.rfind(b'\n') + 1)
+        write_state(output_dir, state)
+        print(f"[v0] Version {version} (model of {base}) marked as trained on {source} "
+              f"up to byte {state['offset']}")
+        if not args.no_publish:
+            publish_version(args.model_dir, version)
+            print(f"[v0] Published model version {version}")
+        return
+
+    missing = [name for name in PICKLES if not os.path.exists(os.path.join(base_dir, name))]
+    if missing:
+        # e.g. a compact.py output, which keeps only the compiled forest.
+        raise SystemExit(f"version {base} has no {', '.join(missing)} to grow; refresh the version it "
+                         "was compacted from (--base) and compact the result again")
+
+    new_rows, new_offset = read_new_rows(source, offset)
+    print(f"[v0] {len(new_rows)} new rows in {source} since byte {offset}")
+    if new_rows.empty or len(new_rows) < args.min_rows:
+        print(f"[v0] Fewer than {max(args.min_rows, 1)} new rows; nothing to retrain")
+        return
+
+    model, scaler, columns = (joblib.load(os.path.join(base_dir, name)) for name in PICKLES)
+    if not isinstance(model, RandomForestRegressor):
+        raise SystemExit(f"version {base} serves a {type(model).__name__}; incremental refresh "
+                         "needs a RandomForestRegressor (retrain with train_model.py)")
+    model.set_params(n_jobs=args.n_jobs)
+    encoder = FeatureEncoder(columns)
+    imputation = load_imputation(base_dir)
+    if imputation is None:
+        print(f"[v0] Version {base} has no {IMPUTATION_FILE}; filling gaps from the new rows themselves")
+    X_new, y_new = prepare_rows(new_rows, encoder, imputation)
+    if not len(y_new):
+        print(f"[v0] No new rows with {TARGET}; nothing to retrain")
+        return
+    X_hold, y_hold = prepare_rows(pd.read_csv(args.holdout), encoder, imputation)
+    load_s = time.perf_counter() - start
+
+    report = {
+        'base_version': base,
+        'new_rows': len(y_new),
+        'before': {'holdout': evaluate(model, scaler, columns, X_hold, y_hold),
+                   'new_rows': evaluate(model, scaler, columns, X_new, y_new)},
+    }
+    before_trees = model.n_estimators
+
+    fit_start = time.perf_counter()
+    new_scaler = copy.deepcopy(scaler).partial_fit(X_new)
+    rescale_thresholds(model, scaler, new_scaler)
+    rescaled = evaluate(model, new_scaler, columns, X_hold, y_hold)
+    grow(model, pd.DataFrame(new_scaler.transform(X_new), columns=columns), y_new,
+         args.add_trees, args.replace_oldest)
+    fit_s = time.perf_counter() - fit_start
+
+    report['after'] = {'holdout': evaluate(model, new_scaler, columns, X_hold, y_hold),
+                       'new_rows': evaluate(model, new_scaler, columns, X_new, y_new)}
+    report['rescale_holdout_mae_change'] = rescaled['mae'] - report['before']['holdout']['mae']
+    report['trees'] = {'before': before_trees, 'after': model.n_estimators}
+
+    os.makedirs(output_dir)
+    save_start = time.perf_counter()
+    save_artifacts(model, {
+        'scaler': new_scaler,
+        'columns': columns,
+        'X_test': pd.DataFrame(new_scaler.transform(X_hold), columns=columns),
+        'X_test_raw': X_hold.to_numpy(),
+        'imputation': imputation,
+    }, output_dir)
+    report['timings_s'] = {'load': load_s, 'fit': fit_s, 'save': time.perf_counter() - save_start,
+                           'total': time.perf_counter() - start}
+    state = dict(report, source=source, offset=new_offset,
+                 rows_ingested=state.get('rows_ingested', 0) + len(y_new))
+    write_state(output_dir, state)
+
+    print(f"{'':<22}{'holdout R²':>12}{'holdout MAE':>13}{'new-row R²':>12}{'new-row MAE':>13}")
+    for when in ('before', 'after'):
+        h, n = report[when]['holdout'], report[when]['new_rows']
+        print(f"{when + ' (' + str(report['trees'][when]) + ' trees)':<22}"
+              f"{h['r2']:>12.4f}{h['mae']:>13.3f}{n['r2']:>12.4f}{n['mae']:>13.3f}")
+    print(f"[v0] Threshold rescaling changed holdout MAE by {report['rescale_holdout_mae_change']:+.2e}")
+    print(f"[v0] Refresh took {report['timings_s']['total']:.1f}s "
+          f"(load {load_s:.1f}s, fit {fit_s:.1f}s, save {report['timings_s']['save']:.1f}s)")
+
+    drop = report['before']['holdout']['r2'] - report['after']['holdout']['r2']
+    if drop > args.tolerance:
+        print(f"[v0] Holdout R² dropped by {drop:.4f} (> {args.tolerance}); "
+              f"version {version} written but not published")
+    elif not args.no_publish:
+        publish_version(args.model_dir, version)
+        print(f"[v0] Published model version {version}")
+    if os.path.exists(os.path.join(base_dir, "mpg_table")):
+        print(f"[v0] Rebuild the lookup table for the new version: "
+              f"python lookup_table.py build --data {args.source} --artifacts {os.path.join(args.model_dir, version)}")
+
+
+if __name__ == "__main__":
+    main()
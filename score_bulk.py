@@ -0,0 +1,164 @@
+"""
+Score a vehicles file offline with the model served by app.py.
+
+Streams a CSV or Parquet file in fixed-size chunks, encodes each chunk in
+one vectorized pass (same encoding as the /predict form) and appends the
+predictions to the output file as it goes, so memory stays flat however
+large the input is. Rows with a missing or non-numeric field get an empty
+prediction and an error message.
+
+    python score_bulk.py vehicles.csv predictions.csv --chunk-size 50000 --processes 4
+    python score_bulk.py .train_cache/dataset-<hash> predictions.parquet
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+import app
+import dataset
+from features import HASH_COL, INPUT_FIELDS, NUMERIC_FIELDS, ONE_HOT_COLS
+
+PREDICTION_COL = "predicted_mpg"
+ERROR_COL = "error"
+
+
+def _is_parquet(path):
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def read_chunks(path, chunk_size):
+    """Yield DataFrames of at most ``chunk_size`` rows from a CSV, Parquet or dataset.py cache."""
+    if dataset.is_dataset(path):
+        rows = dataset.read_meta(path)['rows']
+        for start in range(0, rows, chunk_size):
+            yield dataset.load(path, start=start, stop=start + chunk_size)
+    elif _is_parquet(path):
+        import pyarrow.parquet as pq  # optional dependency, only for Parquet input
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet output file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._parquet = None
+        self._first = True
+
+    def write(self, chunk):
+        if _is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode="w" if self._first else "a",
+                         header=self._first, index=False)
+        self._first = False
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def score_chunk(chunk):
+    """Return ``chunk`` with prediction and error columns appended."""
+    missing = [name for name in INPUT_FIELDS if name not in chunk.columns]
+    if missing:
+        raise ValueError(f"input is missing columns: {', '.join(missing)}")
+
+    data = {name: pd.to_numeric(chunk[name], errors="coerce").to_numpy(dtype=np.float64)
+            for name in NUMERIC_FIELDS}
+    # int(Model_Year) in the form handler truncates toward zero.
+    data["Model_Year"] = np.trunc(data["Model_Year"])
+    for name in ONE_HOT_COLS + [HASH_COL]:
+        data[name] = chunk[name]
+
+    valid = np.ones(len(chunk), dtype=bool)
+    errors = np.full(len(chunk), "", dtype=object)
+    for name in NUMERIC_FIELDS:
+        bad = ~np.isfinite(data[name])
+        errors[bad & valid] = f"{name} must be a finite number"
+        valid &= ~bad
+    for name in INPUT_FIELDS:
+        if name not in NUMERIC_FIELDS:
+            bad = chunk[name].isna().to_numpy()
+            errors[bad & valid] = f"missing field '{name}'"
+            valid &= ~bad
+
+    preds = np.full(len(chunk), np.nan)
+    if valid.any():
+        bundle = app.current
+        X = bundle.encoder.encode_columns({name: values[valid] for name, values in data.items()})
+        preds[valid] = bundle.predict_rows(X)
+
+    out = chunk.copy()
+    out[PREDICTION_COL] = preds
+    out[ERROR_COL] = errors
+    return out
+
+
+def _scored(chunks, processes):
+    """Yield scored chunks in input order, keeping a bounded number in flight."""
+    if processes <= 1:
+        for chunk in chunks:
+            yield score_chunk(chunk)
+        return
+    # fork shares the artifacts app.py already loaded (and the mmapped forest).
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(processes) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(score_chunk, (chunk,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-score a vehicles CSV/Parquet file.")
+    parser.add_argument("input", help="input .csv or .parquet file, or a dataset.py cache directory")
+    parser.add_argument("output", help="output .csv or .parquet file")
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="worker processes (0 = all cores)")
+    args = parser.parse_args(argv)
+    processes = args.processes or os.cpu_count()
+    app.wait_until_ready()
+
+    writer = ChunkWriter(args.output)
+    rows = 0
+    start = time.perf_counter()
+    try:
+        for scored in _scored(read_chunks(args.input, args.chunk_size), processes):
+            writer.write(scored)
+            rows += len(scored)
+            elapsed = time.perf_counter() - start
+            print(f"[v0] {rows} rows scored ({rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+    except ValueError as e:
+        parser.exit(1, f"error: {e}\n")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"[v0] Done: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s) "
+          f"-> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Hyperparameter search for the latency/accuracy trade-off of the forest.
+
+Sweeps tree count, depth, min_samples_leaf and max_features over the
+cached training split from train_model.py. Configurations are fitted in
+parallel worker processes (held-out R² and artifact sizes are recorded
+there); load time and single-row / batch-of-1000 latency of the compiled
+serving engine are then measured one configuration at a time so the
+parallel fits do not skew the timings. Prints the Pareto frontier over
+R², single-row p50 latency and artifact size, and writes every result
+to a JSON report.
+
+    python search_model.py --data vehicles.csv --n-estimators 50 100 300 --max-depth 8 16 0
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import train_model
+from serving_metrics import measure_serving, write_serving_artifacts
+
+_DATA = None
+
+
+def _fit_config(args):
+    """Worker: fit one configuration, save its artifacts, return its metrics."""
+    index, params, workdir = args
+    data = _DATA
+    start = time.perf_counter()
+    model = train_model.fit_forest(data['X_train'], data['y_train'], params, n_jobs=1)
+    fit_s = time.perf_counter() - start
+    r2 = model.score(data['X_test'], data['y_test'])
+
+    artifacts = write_serving_artifacts(model, data['scaler'], data['columns'],
+                                        os.path.join(workdir, f"config-{index}"))
+    return dict({'params': params, 'r2': r2, 'fit_s': fit_s}, **artifacts)
+
+
+def pareto_front(results):
+    """Indices of results not dominated on (max r2, min single p50, min forest size)."""
+    def dominates(a, b):
+        no_worse = (a['r2'] >= b['r2'] and a['single_p50_ms'] <= b['single_p50_ms']
+                    and a['forest_mb'] <= b['forest_mb'])
+        better = (a['r2'] > b['r2'] or a['single_p50_ms'] < b['single_p50_ms']
+                  or a['forest_mb'] < b['forest_mb'])
+        return no_worse and better
+    return [i for i, r in enumerate(results)
+            if not any(dominates(other, r) for other in results if other is not r)]
+
+
+def _depth(value):
+    value = int(value)
+    return None if value <= 0 else value
+
+
+def _max_features(value):
+    value = float(value)
+    return int(value) if value > 1 else value
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Search forest hyperparameters.")
+    parser.add_argument("--data", help="local vehicles CSV (default: cached download)")
+    parser.add_argument("--cache-dir", default=train_model.CACHE_DIR)
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=[50, 100, 300])
+    parser.add_argument("--max-depth", type=_depth, nargs="+", default=[8, 12, 16, None],
+                        help="0 means unlimited")
+    parser.add_argument("--min-samples-leaf", type=int, nargs="+", default=[1, 5])
+    parser.add_argument("--max-features", type=_max_features, nargs="+", default=[1.0, 0.5])
+    parser.add_argument("--workers", type=int, default=0, help="parallel fits (0 = all cores)")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", default="search_results.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global _DATA
+    args = parse_args(argv)
+    _DATA, _ = train_model.prepare_data(args.data, args.cache_dir)
+
+    grid = [dict(zip(('n_estimators', 'max_depth', 'min_samples_leaf', 'max_features'), values))
+            for values in itertools.product(args.n_estimators, args.max_depth,
+                                            args.min_samples_leaf, args.max_features)]
+    workers = args.workers or os.cpu_count()
+    print(f"[v0] Searching {len(grid)} configurations on {workers} workers...")
+
+    workdir = tempfile.mkdtemp(prefix="mpg-search-")
+    try:
+        # fork so workers inherit the training split instead of pickling it
+        ctx = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+            results = list(pool.map(_fit_config, [(i, p, workdir) for i, p in enumerate(grid)]))
+        X = _DATA['X_test_raw']
+        for result in results:
+            measure_serving(result, X, repeat=args.repeat)
+            del result['artifacts']
+    finally:
+        shutil.rmtree(workdir)
+
+    front = set(pareto_front(results))
+    for i, result in enumerate(results):
+        result['pareto'] = i in front
+
+    header = (f"{'':2}{'trees':>6}{'depth':>6}{'leaf':>5}{'feat':>6}{'R²':>8}{'forest MB':>10}"
+              f"{'pkl MB':>8}{'load ms':>8}{'1-row p50':>10}{'p99':>8}{'1000 p50':>10}{'p99':>8}")
+    print(header)
+    for result in sorted(results, key=lambda r: -r['r2']):
+        p = result['params']
+        print(f"{'*' if result['pareto'] else '':2}{p['n_estimators']:>6}{str(p['max_depth']):>6}"
+              f"{p['min_samples_leaf']:>5}{p['max_features']:>6}{result['r2']:>8.4f}"
+              f"{result['forest_mb']:>10.2f}{result['pickle_mb']:>8.2f}"
+              f"{result['forest_load_s'] * 1e3:>8.1f}{result['single_p50_ms']:>10.3f}"
+              f"{result['single_p99_ms']:>8.3f}{result['batch_p50_ms']:>10.2f}"
+              f"{result['batch_p99_ms']:>8.2f}")
+    print("* = Pareto-optimal (R², single-row p50, forest size)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[v0] Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
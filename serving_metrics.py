@@ -0,0 +1,76 @@
+"""
+Serving cost of a fitted model: artifact sizes, load time and latency.
+
+Shared by the hyperparameter search (search_model.py), the distillation
+comparison in train_model.py and the compaction report (compact.py), so
+they all report the same numbers the same way.
+"""
+
+import os
+import time
+
+import joblib
+import numpy as np
+
+from forest import CompiledForest
+
+
+def dir_size(path):
+    """Total size in bytes of the files directly under ``path``."""
+    return sum(entry.stat().st_size for entry in os.scandir(path))
+
+
+def write_serving_artifacts(model, scaler, columns, outdir):
+    """Write the pickle and compiled forest to ``outdir``; returns their sizes and shape."""
+    os.makedirs(outdir)
+    joblib.dump(model, os.path.join(outdir, "mpg_model.pkl"))
+    forest = CompiledForest.from_sklearn(model, scaler, columns)
+    forest.save(os.path.join(outdir, "mpg_forest"))
+    return {
+        'n_trees': forest.n_trees,
+        'n_nodes': forest.n_nodes,
+        'depth': forest.depth,
+        'pickle_mb': os.path.getsize(os.path.join(outdir, "mpg_model.pkl")) / 1e6,
+        'forest_mb': dir_size(os.path.join(outdir, "mpg_forest")) / 1e6,
+        'artifacts': outdir,
+    }
+
+
+def percentiles_ms(samples):
+    """(p50, p99) in milliseconds of timings in seconds."""
+    samples = np.asarray(samples) * 1e3
+    return float(np.percentile(samples, 50)), float(np.percentile(samples, 99))
+
+
+def measure_serving(result, X, repeat=200, batch_size=1000):
+    """Time artifact loads and compiled-forest latency for the artifacts in ``result['artifacts']``."""
+    outdir = result['artifacts']
+    start = time.perf_counter()
+    joblib.load(os.path.join(outdir, "mpg_model.pkl"))
+    result['pickle_load_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    forest = CompiledForest.load(os.path.join(outdir, "mpg_forest"))
+    result['forest_load_s'] = time.perf_counter() - start
+
+    result.update(measure_latency(forest, X, repeat, batch_size))
+    return result
+
+
+def measure_latency(forest, X, repeat=200, batch_size=1000):
+    """p50/p99 single-row and ``batch_size``-row latency of a compiled forest, in ms."""
+    rows = X[np.arange(repeat) % len(X)]
+    single = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        forest.predict(rows[i:i + 1])
+        single.append(time.perf_counter() - start)
+    batch = X[np.arange(batch_size) % len(X)]
+    batched = []
+    for _ in range(max(5, repeat // 20)):
+        start = time.perf_counter()
+        forest.predict(batch)
+        batched.append(time.perf_counter() - start)
+    latency = {}
+    latency['single_p50_ms'], latency['single_p99_ms'] = percentiles_ms(single)
+    latency['batch_p50_ms'], latency['batch_p99_ms'] = percentiles_ms(batched)
+    return latency
@@ -0,0 +1,59 @@
+"""
+Shared fixtures: small synthetic artifacts and the Flask app serving them.
+
+The environment is set before anything imports app.py or artifacts.py
+(both read it at import time): the app serves a temporary model directory
+and never writes a request log into the checkout.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+MODEL_DIR = tempfile.mkdtemp(prefix="mpg-test-models-")
+os.environ.update(MPG_MODEL_DIR=MODEL_DIR, MPG_REQUEST_LOG="", MPG_CACHE_SIZE="0",
+                  MPG_LOOKUP_TABLE="0", MPG_CACHE_REDIS_URL="", MPG_RELOAD_POLL_S="0")
+
+
+@pytest.fixture(scope="session")
+def model_dir():
+    """MODEL_DIR with one published version of a small synthetic forest."""
+    from artifacts import publish_version
+    from benchmarks.synthetic import write_artifacts
+
+    os.makedirs(os.path.join(MODEL_DIR, "v1"), exist_ok=True)
+    write_artifacts(os.path.join(MODEL_DIR, "v1"), n_rows=600, n_estimators=12)
+    publish_version(MODEL_DIR, "v1")
+    yield MODEL_DIR
+    shutil.rmtree(MODEL_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def versions(model_dir, tmp_path):
+    """A model directory of its own with versions v1 (published) and v2."""
+    from artifacts import publish_version
+
+    directory = str(tmp_path / "models")
+    for version in ("v1", "v2"):
+        shutil.copytree(os.path.join(model_dir, "v1"), os.path.join(directory, version))
+    publish_version(directory, "v1")
+    return directory
+
+
+@pytest.fixture(scope="session")
+def mpg_app(model_dir):
+    import app
+
+    app.wait_until_ready(timeout=120)
+    return app
+
+
+@pytest.fixture
+def client(mpg_app):
+    return mpg_app.app.test_client()
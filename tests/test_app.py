@@ -0,0 +1,185 @@
+import json
+import math
+
+import pytest
+
+from features import EXAMPLE_INPUT
+
+
+def test_batch_isolates_bad_rows(client):
+    rows = [EXAMPLE_INPUT,
+            dict(EXAMPLE_INPUT, Model_Year=math.inf),
+            dict(EXAMPLE_INPUT, Engine_Size="big"),
+            {k: v for k, v in EXAMPLE_INPUT.items() if k != 'Fuel_Type'},
+            "not an object"]
+    # json.dumps writes inf as Infinity, which Flask's parser accepts.
+    response = client.post('/api/predict/batch', json=rows)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 5 and body['errors'] == 4
+    predictions = body['predictions']
+    assert 'mpg' in predictions[0]
+    assert predictions[1] == {'index': 1, 'error': "Model_Year must be a finite number"}
+    assert all('error' in p and 'mpg' not in p for p in predictions[1:])
+
+
+@pytest.mark.parametrize("field, literal", [("Model_Year", "1e400"), ("Model_Year", "9" * 400),
+                                            ("Engine_Size", "9" * 400)],
+                         ids=["infinite-year", "huge-int-year", "huge-int-engine-size"])
+def test_batch_rejects_huge_literals(client, field, literal):
+    row = json.dumps(dict(EXAMPLE_INPUT, **{field: 0})).replace(f'"{field}": 0', f'"{field}": {literal}')
+    response = client.post('/api/predict/batch', data=f"[{row}, {json.dumps(EXAMPLE_INPUT)}]",
+                           content_type='application/json')
+    assert response.status_code == 200
+    predictions = response.get_json()['predictions']
+    assert predictions[0]['error'] == f"{field} must be a finite number"
+    assert 'mpg' in predictions[1]
+
+
+def test_form_rejects_infinite_year(client):
+    response = client.post('/predict', data=dict(EXAMPLE_INPUT, Model_Year="1e400"))
+    assert response.status_code == 200
+    assert b"MISSION COMPLETE" not in response.data
+
+
+def _boosted(bundle):
+    """A copy of ``bundle`` whose forest is marked as a boosted ensemble."""
+    from artifacts import ModelBundle
+    from forest import CompiledForest
+
+    forest = bundle.tree_forest()
+    boosted = CompiledForest(forest.feature, forest.threshold, forest.children, forest.value,
+                             forest.roots, forest.depth, forest.columns,
+                             bias=forest.bias, weight=forest.weight, averaged=False)
+    return ModelBundle(None, None, bundle.columns, boosted, "boosted", "boosted",
+                       encoder=bundle.encoder)
+
+
+def test_uncertainty_needs_averaged_forest(client, mpg_app, monkeypatch):
+    monkeypatch.setattr(mpg_app, 'current', _boosted(mpg_app.current))
+    message = "model version boosted does not support uncertainty"
+    response = client.post('/predict', data=dict(EXAMPLE_INPUT, uncertainty="1"))
+    assert response.status_code == 200
+    assert message.encode() in response.data
+
+    def errors():
+        return mpg_app.metrics._errors.get(("batch", "ValueError"), 0)
+
+    before = errors()
+    response = client.post('/api/predict/batch?uncertainty=1', json=[EXAMPLE_INPUT])
+    assert response.status_code == 400
+    assert response.get_json()['error'] == message
+    assert errors() == before + 1
+
+
+def test_percentiles_come_from_the_same_options_as_uncertainty(client):
+    # Query string for JSON bodies, form fields (or the query string) for the form.
+    response = client.post('/api/predict/batch?uncertainty=1&percentiles=10,90', json=[EXAMPLE_INPUT])
+    assert set(response.get_json()['predictions'][0]['percentiles']) == {'p10', 'p90'}
+    response = client.post('/predict', data=dict(EXAMPLE_INPUT, uncertainty="1", percentiles="25,75"))
+    assert b"p25" in response.data and b"p75" in response.data
+    response = client.post('/predict?uncertainty=1&percentiles=5,95', data=EXAMPLE_INPUT)
+    assert b"p5 " in response.data and b"p95" in response.data
+    response = client.post('/api/predict/batch?uncertainty=1&percentiles=150', json=[EXAMPLE_INPUT])
+    assert response.status_code == 400 and "invalid percentiles" in response.get_json()['error']
+
+
+def test_explain_with_uncertainty_walks_trees_once(client, mpg_app, monkeypatch):
+    forest = mpg_app.current.tree_forest()
+    expected = forest.predict_distribution(mpg_app.current.encoder.encode_many([EXAMPLE_INPUT]))
+
+    def second_traversal(*args, **kwargs):
+        raise AssertionError("explain + uncertainty traversed the trees twice")
+
+    monkeypatch.setattr(forest, 'apply', second_traversal)
+    response = client.post('/api/predict/batch?uncertainty=1&explain=1', json=[EXAMPLE_INPUT])
+    assert response.status_code == 200
+    result = response.get_json()['predictions'][0]
+    assert result['mpg'] == round(float(expected[0][0]), 1)
+    assert result['std'] == round(float(expected[1][0]), 2)
+    assert set(result) >= {'percentiles', 'baseline', 'contributions'}
+    response = client.post('/predict', data=dict(EXAMPLE_INPUT, uncertainty="1", explain="1"))
+    assert b"MISSION COMPLETE" in response.data and b"baseline" in response.data
+
+
+def test_admin_reload_publishes_the_version(client, mpg_app, versions, monkeypatch):
+    from artifacts import resolve_version
+
+    monkeypatch.setattr(mpg_app, 'MODEL_DIR', versions)
+    monkeypatch.setattr(mpg_app, 'ADMIN_TOKEN', "secret")
+    monkeypatch.setattr(mpg_app, 'current', mpg_app.current)  # restored after the reload
+    headers = {"X-Admin-Token": "secret"}
+    response = client.post('/admin/reload?wait=1', json={'version': "v2"}, headers=headers)
+    assert response.status_code == 200 and response.get_json()['version'] == "v2"
+    assert resolve_version(versions)[0] == "v2"
+    response = client.post('/admin/reload?wait=1', json={'version': "v3"}, headers=headers)
+    assert response.status_code == 404
+    assert resolve_version(versions)[0] == "v2"
+
+
+def test_only_one_process_trains_missing_artifacts(mpg_app, tmp_path, monkeypatch):
+    import subprocess
+    import threading
+    import time
+
+    trained = threading.Event()
+    runs = []
+
+    def build_bundle():
+        if not trained.is_set():
+            raise FileNotFoundError("no artifacts")
+        return "bundle"
+
+    def train(command, check):
+        runs.append(command)
+        time.sleep(0.3)
+        trained.set()
+
+    monkeypatch.setattr(mpg_app, 'MODEL_DIR', str(tmp_path / "models"))
+    monkeypatch.setattr(mpg_app, 'build_bundle', build_bundle)
+    monkeypatch.setattr(subprocess, 'run', train)
+    # flock locks belong to the open file, so threads contend like processes.
+    results = []
+    loaders = [threading.Thread(target=lambda: results.append(mpg_app._build_or_train())) for _ in range(4)]
+    for loader in loaders:
+        loader.start()
+    for loader in loaders:
+        loader.join(10)
+    assert len(runs) == 1
+    assert results == ["bundle"] * 4
+
+
+def test_explained_prediction_is_baseline_plus_contributions(client):
+    rows = [EXAMPLE_INPUT, dict(EXAMPLE_INPUT, Car_Brand="BMW", Engine_Size=4.4, Model_Year=2001)]
+    predictions = client.post('/api/predict/batch?explain=1', json=rows).get_json()['predictions']
+    for result in predictions:
+        # Each value is rounded to 2 decimals.
+        total = result['baseline'] + sum(result['contributions'].values())
+        assert abs(result['mpg'] - total) <= 0.005 * (len(result['contributions']) + 2)
+
+
+def test_not_ready_until_the_model_loads(client, mpg_app, monkeypatch):
+    import threading
+
+    monkeypatch.setattr(mpg_app, '_ready', threading.Event())
+    response = client.get('/readyz')
+    assert response.status_code == 503 and response.get_json() == {'ready': False}
+    monkeypatch.setattr(mpg_app, 'load_error', RuntimeError("disk on fire"))
+    assert "disk on fire" in client.get('/readyz').get_json()['error']
+
+    for response in (client.post('/predict', data=EXAMPLE_INPUT),
+                     client.post('/api/predict/batch', json=[EXAMPLE_INPUT])):
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == "5"
+        assert response.get_json() == {'error': "model is loading, retry shortly"}
+    # Liveness and the landing page do not need the model.
+    assert client.get('/healthz').status_code == 200
+    assert client.get('/').status_code == 200
+
+    mpg_app._ready.set()
+    monkeypatch.setattr(mpg_app, 'load_error', None)
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    assert response.get_json() == {'ready': True, 'version': mpg_app.current.version}
+    assert b"MISSION COMPLETE" in client.post('/predict', data=EXAMPLE_INPUT).data
+    assert 'mpg' in client.post('/api/predict/batch', json=[EXAMPLE_INPUT]).get_json()['predictions'][0]
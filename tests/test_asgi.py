@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+from features import EXAMPLE_INPUT
+
+
+@pytest.fixture
+def asgi(mpg_app):
+    import asgi
+
+    return asgi
+
+
+async def call(asgi, method, path, body=b"", headers=None):
+    """Run one request through the ASGI app; returns (status, headers, body)."""
+    path, _, query = path.partition("?")
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]}
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    start, *chunks = sent
+    response_headers = {k.decode(): v.decode() for k, v in start['headers']}
+    return start['status'], response_headers, b"".join(c.get('body', b"") for c in chunks)
+
+
+def batch(asgi, rows):
+    return call(asgi, 'POST', '/api/predict/batch', json.dumps(rows).encode(),
+                {'Content-Type': 'application/json'})
+
+
+def test_scores_requests_under_the_limit(asgi):
+    async def scenario():
+        status, _, body = await batch(asgi, [EXAMPLE_INPUT, EXAMPLE_INPUT])
+        assert status == 200
+        assert [p['index'] for p in json.loads(body)['predictions']] == [0, 1]
+        form = urllib.parse.urlencode(EXAMPLE_INPUT).encode()
+        status, _, page = await call(asgi, 'POST', '/predict', form,
+                                     {'Content-Type': 'application/x-www-form-urlencoded'})
+        assert status == 200 and b"MISSION COMPLETE" in page
+        status, _, body = await call(asgi, 'GET', '/readyz')
+        assert status == 200 and json.loads(body)['ready'] is True
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_answers_503_with_retry_after(asgi, monkeypatch):
+    release = threading.Event()
+    admission = asgi.Admission(threads=1, queue=0)
+    monkeypatch.setattr(asgi, 'admission', admission)
+
+    async def scenario():
+        busy = asyncio.ensure_future(admission.run(release.wait, 10))
+        await asyncio.sleep(0)  # takes the only slot
+        status, headers, body = await batch(asgi, [EXAMPLE_INPUT])
+        assert status == 503 and headers['retry-after'] == "1"
+        assert json.loads(body) == asgi.BUSY[1]
+        # /readyz stays on the event loop.
+        assert (await call(asgi, 'GET', '/readyz'))[0] == 200
+        release.set()
+        await busy
+        assert (await batch(asgi, [EXAMPLE_INPUT]))[0] == 200
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        admission.executor.shutdown()
+    assert admission.stats()['rejected'] == {'full': 1, 'timeout': 0}
+
+
+def test_request_queued_too_long_answers_503(asgi, monkeypatch):
+    release = threading.Event()
+    admission = asgi.Admission(threads=1, queue=4, queue_timeout=0.05)
+    monkeypatch.setattr(asgi, 'admission', admission)
+
+    async def scenario():
+        busy = asyncio.ensure_future(admission.run(release.wait, 10))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(batch(asgi, [EXAMPLE_INPUT]))
+        await asyncio.sleep(0.2)
+        release.set()
+        await busy
+        status, headers, _ = await waiting
+        assert status == 503 and headers['retry-after'] == "1"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        admission.executor.shutdown()
+    assert admission.stats()['rejected'] == {'full': 0, 'timeout': 1}
+
+
+def test_scoring_waits_for_the_model(asgi, monkeypatch):
+    monkeypatch.setattr(asgi.mpg, '_ready', threading.Event())
+
+    async def scenario():
+        status, headers, body = await batch(asgi, [EXAMPLE_INPUT])
+        assert status == 503 and headers['retry-after'] == "5"
+        assert (await call(asgi, 'GET', '/readyz'))[0] == 503
+        asgi.mpg._ready.set()
+        assert (await batch(asgi, [EXAMPLE_INPUT]))[0] == 200
+        assert (await call(asgi, 'GET', '/readyz'))[0] == 200
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import numpy as np
+
+from batcher import MicroBatcher
+
+
+class Recorder:
+    """predict_fn that sums each row and remembers the batch sizes it saw."""
+
+    def __init__(self, gate=None):
+        self.sizes = []
+        self.gate = gate
+
+    def __call__(self, rows):
+        if self.gate is not None:
+            self.gate.wait(10)
+        self.sizes.append(len(rows))
+        return rows.sum(axis=1)
+
+
+def test_concurrent_predictions_share_one_call():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=8, max_wait=5)
+    rows = [np.arange(3, dtype=float) + i for i in range(8)]
+    results = [None] * 8
+
+    def call(i):
+        results[i] = batcher.predict(rows[i], timeout=10)
+
+    callers = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join(10)
+    # The batch filled up long before max_wait.
+    assert predict.sizes == [8]
+    assert results == [float(row.sum()) for row in rows]
+    assert batcher.stats()['batch_size_histogram'] == {8: 1}
+
+
+def test_batches_never_exceed_max_batch_size():
+    predict = Recorder()
+    batcher = MicroBatcher(predict, max_batch_size=4, max_wait=0.2)
+    futures = [batcher.submit(np.array([float(i)])) for i in range(10)]
+    assert [f.result(10) for f in futures] == [float(i) for i in range(10)]
+    assert sum(predict.sizes) == 10 and max(predict.sizes) <= 4
+
+
+def test_a_lone_row_waits_at_most_max_wait():
+    batcher = MicroBatcher(Recorder(), max_batch_size=64, max_wait=0.05)
+    start = time.perf_counter()
+    assert batcher.predict(np.array([1.0, 2.0]), timeout=10) == 3.0
+    elapsed = time.perf_counter() - start
+    assert 0.05 <= elapsed < 1.0
+    added = batcher.stats()['added_latency_ms']
+    assert 50 <= added['max'] < 1000
+
+
+def test_close_drains_the_queue():
+    gate = threading.Event()
+    predict = Recorder(gate)
+    batcher = MicroBatcher(predict, max_batch_size=2, max_wait=0.01)
+    futures = [batcher.submit(np.array([float(i)])) for i in range(6)]
+    batcher.close()
+    gate.set()  # the first batch was stuck in predict_fn while closing
+    assert [f.result(10) for f in futures] == [float(i) for i in range(6)]
+    deadline = time.monotonic() + 10
+    while batcher._thread is not None:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert sum(predict.sizes) == 6
+
+
+def test_metrics_export_wait_and_batch_size_summaries(client, mpg_app, monkeypatch):
+    batcher = MicroBatcher(Recorder(), max_batch_size=4, max_wait=0.01)
+    futures = [batcher.submit(np.array([float(i)])) for i in range(6)]
+    [f.result(10) for f in futures]
+    monkeypatch.setattr(mpg_app.current, 'batcher', batcher)
+    lines = client.get('/metrics').get_data(as_text=True).splitlines()
+    assert "# TYPE mpg_microbatch_wait_seconds summary" in lines
+    assert "# TYPE mpg_microbatch_batch_size summary" in lines
+    assert "mpg_microbatch_wait_seconds_count 6" in lines
+    assert "mpg_microbatch_batch_size_sum 6.000000000" in lines
+    assert any(line.startswith('mpg_microbatch_wait_seconds{quantile="0.99"}') for line in lines)
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from cache import LocalStore, PredictionCache, artifact_fingerprint, cache_key
+from features import EXAMPLE_INPUT
+
+KEY = cache_key(EXAMPLE_INPUT)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+class BrokenStore:
+    def get(self, key):
+        raise ConnectionError("shared store down")
+
+    def set(self, key, value, ex=None):
+        raise TimeoutError("shared store timed out")
+
+
+def test_fingerprint_invalidates_local_and_shared_entries():
+    shared = LocalStore()
+    old = PredictionCache(fingerprint="aaaa", shared=shared)
+    old.put(KEY, 31.5)
+
+    new = PredictionCache(fingerprint="bbbb", shared=shared)
+    assert new.get(KEY) is None
+    # Another worker still on the old model gets it from the shared tier.
+    assert PredictionCache(fingerprint="aaaa", shared=shared).get(KEY) == 31.5
+
+
+def test_artifact_fingerprint_follows_the_files(tmp_path):
+    path = tmp_path / "mpg_model.pkl"
+    path.write_bytes(b"model v1")
+    before = artifact_fingerprint([str(path)])
+    assert artifact_fingerprint([str(path)]) == before
+    path.write_bytes(b"model v2, retrained")
+    assert artifact_fingerprint([str(path)]) != before
+
+
+def test_ttl_expires_local_and_shared_entries(clock):
+    shared = LocalStore()
+    cache = PredictionCache(ttl=60, fingerprint="aaaa", shared=shared)
+    cache.put(KEY, 31.5)
+    clock.now += 59
+    assert cache.get(KEY) == 31.5
+    clock.now += 2
+    assert cache.get(KEY) is None
+    assert PredictionCache(fingerprint="aaaa", shared=shared).get(KEY) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_shared_store_errors_fall_back_to_local():
+    cache = PredictionCache(fingerprint="aaaa", shared=BrokenStore())
+    assert cache.get(KEY) is None
+    cache.put(KEY, 31.5)
+    assert cache.get(KEY) == 31.5
+    assert cache.stats()['shared_errors'] == 2
+
+
+def test_predict_survives_shared_store_outage(mpg_app, client):
+    bundle = mpg_app.current
+    saved = bundle.cache
+    bundle.cache = PredictionCache(fingerprint=bundle.fingerprint, shared=BrokenStore())
+    try:
+        response = client.post('/predict', data=EXAMPLE_INPUT)
+        assert b"MISSION COMPLETE" in response.data
+        assert bundle.cache.stats()['shared_errors'] == 2  # the lookup and the store
+    finally:
+        bundle.cache = saved
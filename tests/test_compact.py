@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+from compact import prune_tree
+from forest import LEAF, CompiledForest
+
+COLUMNS = [f"f{i}" for i in range(4)]
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, len(COLUMNS)))
+    y = 5 * X[:, 0] + np.sin(3 * X[:, 1]) + X[:, 2] * X[:, 3] + rng.normal(scale=0.5, size=len(X))
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def full_tree(data):
+    return DecisionTreeRegressor(random_state=0).fit(*data)
+
+
+def predict(tree, X):
+    return CompiledForest.from_trees([tree], None, COLUMNS).predict(X)
+
+
+def n_leaves(tree):
+    return int((tree.children_left == LEAF).sum())
+
+
+def test_pruning_matches_sklearn_ccp_alpha(data, full_tree):
+    X, y = data
+    alphas = full_tree.cost_complexity_pruning_path(X, y).ccp_alphas
+    # Midway between the path's breakpoints, so no subtree sits exactly on the boundary.
+    for i in (len(alphas) // 2, len(alphas) - 20, len(alphas) - 5, len(alphas) - 2):
+        alpha = (alphas[i] + alphas[i + 1]) / 2
+        expected = DecisionTreeRegressor(random_state=0, ccp_alpha=alpha).fit(X, y)
+        pruned = prune_tree(full_tree.tree_, alpha)
+        assert pruned.node_count == expected.tree_.node_count
+        assert n_leaves(pruned) == expected.get_n_leaves()
+        np.testing.assert_allclose(predict(pruned, X), expected.predict(X), rtol=0, atol=1e-9)
+
+
+def test_zero_alpha_and_tolerance_keep_the_tree(data, full_tree):
+    X, _ = data
+    kept = prune_tree(full_tree.tree_)
+    assert kept.node_count == full_tree.tree_.node_count
+    np.testing.assert_allclose(predict(kept, X), full_tree.predict(X), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("merge_tol", [0.05, 0.5, 2.0])
+def test_merge_leaves_no_sibling_leaves_within_tolerance(data, full_tree, merge_tol):
+    X, _ = data
+    merged = prune_tree(full_tree.tree_, merge_tol=merge_tol)
+    assert merged.node_count < full_tree.tree_.node_count
+    left, right, value = merged.children_left, merged.children_right, merged.value[:, 0, 0]
+    split = np.flatnonzero(left != LEAF)
+    both_leaves = split[(left[split] != LEAF) & (left[left[split]] == LEAF) & (left[right[split]] == LEAF)]
+    assert len(both_leaves)
+    assert np.all(np.abs(value[left[both_leaves]] - value[right[both_leaves]]) >= merge_tol)
+    # A larger tolerance only ever merges more.
+    assert merged.node_count >= prune_tree(full_tree.tree_, merge_tol=2 * merge_tol).node_count
+
+
+def test_a_single_merge_moves_predictions_by_less_than_the_tolerance(data, full_tree):
+    X, _ = data
+    tree = full_tree.tree_
+    left, right, value = tree.children_left, tree.children_right, tree.value[:, 0, 0]
+    # The gap of the closest pair of sibling leaves: only that pair may merge.
+    split = np.flatnonzero(left != LEAF)
+    pairs = split[(left[left[split]] == LEAF) & (left[right[split]] == LEAF)]
+    gaps = np.sort(np.abs(value[left[pairs]] - value[right[pairs]]))
+    merge_tol = (gaps[0] + gaps[1]) / 2
+    merged = prune_tree(tree, merge_tol=merge_tol)
+    assert merged.node_count == tree.node_count - 2
+    assert np.abs(predict(merged, X) - full_tree.predict(X)).max() < merge_tol
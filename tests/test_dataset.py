@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset
+from benchmarks.synthetic import make_vehicles
+
+
+@pytest.fixture
+def csv(tmp_path):
+    df = make_vehicles(200, seed=4)
+    df.loc[[3, 50], 'Engine_Size'] = np.nan
+    df.loc[[7, 8], 'Drive_Type'] = np.nan
+    df.loc[11, 'Car_Brand'] = np.nan
+    df['Notes'] = np.where(np.arange(len(df)) % 3, "ok", None)  # an extra text column
+    path = tmp_path / "vehicles.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def assert_same_frame(cached, expected):
+    assert list(cached.columns) == list(expected.columns)
+    for name in expected.columns:
+        if isinstance(cached[name].dtype, pd.CategoricalDtype):
+            assert list(cached[name].cat.categories) == sorted(cached[name].cat.categories)
+            got = cached[name].astype(object).where(cached[name].notna(), None)
+            want = expected[name].astype(object).where(expected[name].notna(), None)
+            assert got.tolist() == want.tolist(), name
+        else:
+            np.testing.assert_array_equal(cached[name].to_numpy(), expected[name].to_numpy(), err_msg=name)
+
+
+def test_cache_round_trips_read_csv(csv, tmp_path):
+    directory = dataset.ensure(csv, str(tmp_path / "cache"))
+    cached = dataset.load(directory)
+    expected = pd.read_csv(csv)
+    assert len(cached) == len(expected) == dataset.read_meta(directory)['rows']
+    assert_same_frame(cached, expected)
+
+    dtypes = cached.dtypes.astype(str).to_dict()
+    assert dtypes['Model_Year'] == 'int32'
+    assert dtypes['Engine_Size'] == dtypes['Combined_MPG'] == 'float64'
+    assert all(dtypes[name] == 'category' for name in dataset.CATEGORICAL + ['Notes'])
+    assert cached['Engine_Size'].isna().sum() == 2 and cached['Drive_Type'].isna().sum() == 2
+    assert not cached['Engine_Size'].to_numpy().flags.writeable  # memory-mapped
+
+
+def test_integer_column_with_gaps_stays_float(tmp_path):
+    df = make_vehicles(20, seed=5)
+    df.loc[4, 'Model_Year'] = np.nan
+    df.to_csv(tmp_path / "gaps.csv", index=False)
+    cached = dataset.load(dataset.ensure(str(tmp_path / "gaps.csv"), str(tmp_path / "cache")))
+    assert cached['Model_Year'].dtype == np.float64
+    np.testing.assert_array_equal(cached['Model_Year'], pd.read_csv(tmp_path / "gaps.csv")['Model_Year'])
+
+
+def test_load_selects_columns_and_rows(csv, tmp_path):
+    directory = dataset.ensure(csv, str(tmp_path / "cache"))
+    columns = ['Car_Brand', 'Engine_Size', 'Combined_MPG']
+    cached = dataset.load(directory, columns, start=10, stop=60)
+    expected = pd.read_csv(csv, usecols=columns)[10:60].reset_index(drop=True)
+    # Columns come back in file order, like read_csv's usecols.
+    assert_same_frame(cached, expected)
+    with pytest.raises(KeyError, match="Horsepower"):
+        dataset.load(directory, ['Engine_Size', 'Horsepower'])
+
+
+def test_changed_source_gets_a_fresh_cache(csv, tmp_path, capsys):
+    cache_dir = str(tmp_path / "cache")
+    first = dataset.ensure(csv, cache_dir)
+    assert dataset.ensure(csv, cache_dir) == first
+    assert capsys.readouterr().out.count("Converting") == 1  # reused, not converted again
+
+    df = pd.read_csv(csv)
+    df.loc[0, 'Combined_MPG'] = 99.5
+    df.to_csv(csv, index=False)
+    second = dataset.ensure(csv, cache_dir)
+    assert second != first
+    assert dataset.load(second)['Combined_MPG'][0] == 99.5
+    assert dataset.load(first)['Combined_MPG'][0] != 99.5
@@ -0,0 +1,128 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from features import (EXAMPLE_INPUT, FORM_CHOICES, HASH_COL, NUMERIC_FIELDS, ONE_HOT_COLS,
+                      FeatureEncoder, check_parity, form_records)
+from train_model import encode_reference
+
+LEVELS = {field: sorted(choices) for field, choices in FORM_CHOICES.items()}
+
+
+def odd_records():
+    """Form-like rows with missing values and levels training never saw."""
+    return [
+        dict(EXAMPLE_INPUT, Drive_Type=math.nan),
+        dict(EXAMPLE_INPUT, Fuel_Type='Hydrogen', Car_Brand='Unheard-Of Motors'),
+        dict(EXAMPLE_INPUT, **{'Vehicle Class/Type': 'Hovercraft'}),
+        dict(EXAMPLE_INPUT, Car_Brand=math.nan),
+        dict(EXAMPLE_INPUT, Engine_Size=math.nan, Fuel_Capacity=math.nan),
+    ]
+
+
+def reference_matrix(records):
+    df = pd.DataFrame(records)
+    for field in ONE_HOT_COLS:
+        # Every training level declared, as check_encoder does for a sample.
+        known = df[field].where(df[field].isin(LEVELS[field]))
+        df[field] = pd.Categorical(known.astype(object), categories=LEVELS[field])
+    reference = encode_reference(df)
+    return list(reference.columns), reference.to_numpy(dtype=np.float64)
+
+
+@pytest.mark.parametrize("records", [form_records(), odd_records()], ids=["form", "nan-and-unknown"])
+def test_serving_and_training_encoders_match_reference(records):
+    encoder = FeatureEncoder.fit(NUMERIC_FIELDS, LEVELS)
+    columns, reference = reference_matrix(records)
+    assert encoder.columns == columns
+
+    rows = encoder.encode_many(records)
+    frame = pd.DataFrame(records)
+    np.testing.assert_array_equal(rows, reference)
+    np.testing.assert_array_equal(encoder.encode_columns(frame), reference)
+    np.testing.assert_array_equal(encoder.encode_columns(frame.astype({HASH_COL: 'category'})), reference)
+    check_parity(encoder, records, reference)
+
+
+def test_extra_numeric_columns_default_to_zero():
+    encoder = FeatureEncoder.fit(NUMERIC_FIELDS + ['Highway_MPG'], LEVELS)
+    column = encoder.columns.index('Highway_MPG')
+
+    assert encoder.encode(EXAMPLE_INPUT)[column] == 0.0
+    assert encoder.encode(dict(EXAMPLE_INPUT, Highway_MPG=31.0))[column] == 31.0
+    frame = pd.DataFrame([EXAMPLE_INPUT] * 3)
+    assert not encoder.encode_columns(frame)[:, column].any()
+    frame['Highway_MPG'] = 31.0
+    assert (encoder.encode_columns(frame)[:, column] == 31.0).all()
+    check_parity(encoder, form_records())
+
+
+def test_saved_transform_round_trips(tmp_path):
+    encoder = FeatureEncoder.fit(NUMERIC_FIELDS, LEVELS)
+    X = encoder.encode_many(form_records())
+    encoder = encoder.with_scaler(StandardScaler().fit(X))
+    path = str(tmp_path / "feature_transform.json")
+    encoder.save(path)
+
+    loaded = FeatureEncoder.load(path)
+    assert loaded.columns == encoder.columns
+    assert loaded.layout == encoder.layout
+    np.testing.assert_array_equal(loaded.mean_, encoder.mean_)
+    np.testing.assert_array_equal(loaded.scale_, encoder.scale_)
+    np.testing.assert_array_equal(loaded.encode_many(form_records()), X)
+    np.testing.assert_array_equal(loaded.scale(X), encoder.scale(X))
+
+
+def test_load_rejects_inconsistent_layout(tmp_path):
+    path = str(tmp_path / "feature_transform.json")
+    FeatureEncoder.fit(NUMERIC_FIELDS, LEVELS).save(path)
+    with open(path) as f:
+        text = f.read()
+    with open(path, "w") as f:
+        f.write(text.replace('"Hybrid"', '"Steam"', 1))
+    with pytest.raises(ValueError):
+        FeatureEncoder.load(path)
+
+
+def test_one_hot_columns_are_set_when_serving():
+    # Pins the serving encoding since user-022. Through user-021 every dummy
+    # stayed 0 at serving time: get_dummies(drop_first=True) on a one-row
+    # frame drops the only level present, which was kept for bit-compatibility.
+    encoder = FeatureEncoder.fit(NUMERIC_FIELDS, LEVELS)
+    row = encoder.encode(EXAMPLE_INPUT)
+    expected = {'Engine_Size': 2.0, 'Engine_Cylinders': 4.0, 'Model_Year': 2020.0, 'Fuel_Capacity': 3000.0,
+                'Drive_Type_FWD': 1.0, 'Fuel_Type_Gasoline': 1.0, 'Vehicle Class/Type_Sedan': 1.0,
+                'col_9': 1.0}  # md5("Toyota") % 16 == 9
+    assert {c: v for c, v in zip(encoder.columns, row) if v} == expected
+
+    # The dropped first level of each field encodes as all zeros.
+    row = encoder.encode(dict(EXAMPLE_INPUT, Drive_Type='4WD', Fuel_Type='Diesel',
+                              **{'Vehicle Class/Type': 'Convertible'}))
+    assert not any(v for c, v in zip(encoder.columns, row) if c.startswith(tuple(ONE_HOT_COLS)))
+
+
+def test_served_encoder_sets_one_hot_columns(mpg_app):
+    encoder = mpg_app.current.encoder
+    row = encoder.encode(dict(EXAMPLE_INPUT, Drive_Type='RWD'))
+    assert row[encoder.columns.index('Drive_Type_RWD')] == 1.0
+    assert row[encoder.columns.index('Drive_Type_FWD')] == 0.0
+
+
+def test_field_contributions_are_column_totals(mpg_app):
+    from features import field_of_column
+
+    bundle = mpg_app.current
+    records = [dict(EXAMPLE_INPUT, Car_Brand=brand, Engine_Size=size)
+               for brand, size in [("Toyota", 1.6), ("BMW", 3.0), ("Tesla", 0.5), ("Ford", 5.2)]]
+    X = bundle.encoder.encode_many(records)
+    baseline, by_column = bundle.tree_forest().contributions(X)
+    field_baseline, by_field = bundle.explain_rows(X)
+    assert field_baseline == baseline
+    assert by_field.shape == (len(records), len(bundle.encoder.fields))
+    for j, field in enumerate(bundle.encoder.fields):
+        columns = [i for i, column in enumerate(bundle.encoder.columns) if field_of_column(column) == field]
+        np.testing.assert_allclose(by_field[:, j], by_column[:, columns].sum(axis=1), atol=1e-9)
+    np.testing.assert_allclose(baseline + by_field.sum(axis=1), bundle.predict_rows(X), atol=1e-6)
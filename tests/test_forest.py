@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from forest import CompiledForest
+
+N_FEATURES = 6
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(800, N_FEATURES)) * [1, 10, 1000, 0.01, 5, 1] + [0, 50, 2000, 1, 0, 0]
+    X[:, 5] = rng.integers(0, 2, size=len(X))  # a 0/1 dummy column
+    y = 3 * X[:, 0] + np.sin(X[:, 1]) + X[:, 2] / 500 + 20 * X[:, 5] + rng.normal(size=len(X))
+    return X, y
+
+
+def fitted(kind, X, y):
+    scaler = StandardScaler().fit(X)
+    if kind == "forest":
+        model = RandomForestRegressor(n_estimators=15, min_samples_split=4, random_state=0)
+    else:
+        model = GradientBoostingRegressor(n_estimators=20, max_depth=4, random_state=0)
+    return model.fit(scaler.transform(X), y), scaler
+
+
+def boundary_rows(forest, X, n=400):
+    """Rows whose value sits exactly on a folded threshold, or the next float above it."""
+    rng = np.random.default_rng(1)
+    splits = np.flatnonzero(np.isfinite(forest.threshold))
+    nodes = rng.choice(splits, size=n)
+    rows = X[rng.integers(len(X), size=2 * n)].copy()
+    rows[np.arange(n), forest.feature[nodes]] = forest.threshold[nodes]
+    rows[np.arange(n, 2 * n), forest.feature[nodes]] = np.nextafter(forest.threshold[nodes], np.inf)
+    return rows
+
+
+@pytest.mark.parametrize("kind", ["forest", "boosting"])
+def test_matches_sklearn(kind, data):
+    X, y = data
+    model, scaler = fitted(kind, X, y)
+    forest = CompiledForest.from_sklearn(model, scaler, [f"f{i}" for i in range(N_FEATURES)])
+    rows = np.vstack([X, boundary_rows(forest, X)])
+    scaled = scaler.transform(rows)
+
+    sk_leaves = np.column_stack([est.apply(scaled.astype(np.float32)) for est in np.ravel(model.estimators_)])
+    np.testing.assert_array_equal(forest.apply(rows) - forest.roots, sk_leaves)
+    np.testing.assert_allclose(forest.predict(rows), model.predict(scaled), rtol=0, atol=1e-9)
+    assert forest.averaged == (kind == "forest")
+
+
+def test_save_load_round_trip(data, tmp_path):
+    X, y = data
+    model, scaler = fitted("forest", X, y)
+    forest = CompiledForest.from_sklearn(model, scaler, [f"f{i}" for i in range(N_FEATURES)])
+    forest.save(str(tmp_path / "mpg_forest"))
+
+    for mmap_mode in (None, "r"):
+        loaded = CompiledForest.load(str(tmp_path / "mpg_forest"), mmap_mode=mmap_mode)
+        for name in CompiledForest.ARRAYS:
+            np.testing.assert_array_equal(getattr(loaded, name), getattr(forest, name))
+        assert (loaded.depth, loaded.columns, loaded.bias, loaded.weight, loaded.averaged) == \
+               (forest.depth, forest.columns, forest.bias, forest.weight, forest.averaged)
+        np.testing.assert_array_equal(loaded.predict(X), forest.predict(X))
+    assert not loaded.value.flags.writeable  # mapped read-only, not copied
+
+
+@pytest.mark.parametrize("kind", ["forest", "boosting"])
+def test_contributions_add_up_to_the_prediction(kind, data):
+    X, y = data
+    model, scaler = fitted(kind, X, y)
+    forest = CompiledForest.from_sklearn(model, scaler, [f"f{i}" for i in range(N_FEATURES)])
+    baseline, contributions, leaves = forest.contributions(X, return_leaves=True)
+    assert contributions.shape == X.shape
+    np.testing.assert_allclose(baseline + contributions.sum(axis=1), forest.predict(X), rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(leaves, forest.apply(X))
+    assert not np.allclose(contributions, 0)
@@ -0,0 +1,115 @@
+import contextlib
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from artifacts import publish_version
+
+pytest.importorskip("gunicorn")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """gunicorn --preload serving ``model_dir``, with its output collected in ``lines``."""
+
+    def __init__(self, model_dir, workers=1, **overrides):
+        self.port = _free_port()
+        env = dict(os.environ, MPG_MODEL_DIR=model_dir, MPG_REQUEST_LOG="", PYTHONUNBUFFERED="1",
+                   MPG_RELOAD_POLL_S="0", MPG_ADMIN_TOKEN="")
+        env.update(overrides)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{self.port}", "--preload",
+             "--workers", str(workers), "app:app"],
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        self.lines = []
+        threading.Thread(target=lambda: self.lines.extend(self.process.stdout), daemon=True).start()
+
+    def wait_for(self, text, count=1, timeout=30):
+        """Wait until ``count`` output lines contain ``text``; returns them."""
+        deadline = time.monotonic() + timeout
+        while True:
+            found = [line for line in self.lines if text in line]
+            if len(found) >= count:
+                return found
+            assert time.monotonic() < deadline, "".join(self.lines)
+            time.sleep(0.05)
+
+    def workers(self, count=1):
+        return [int(line.split()[-1]) for line in self.wait_for("Booting worker with pid", count)]
+
+    def get(self, path, data=None, headers=None):
+        request = urllib.request.Request(f"http://127.0.0.1:{self.port}{path}", data=data,
+                                         headers=headers or {})
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(30)
+
+
+@contextlib.contextmanager
+def serving(model_dir, **kwargs):
+    server = Server(model_dir, **kwargs)
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+def test_sighup_reloads_a_fresh_worker(model_dir):
+    with serving(model_dir) as server:
+        worker, = server.workers()
+        server.wait_for("Model loaded")
+        time.sleep(0.5)  # past post_worker_init, still before any request
+        os.kill(worker, signal.SIGHUP)
+        server.wait_for("Model reloaded")
+        os.kill(worker, 0)  # still running
+        assert not any("was sent SIGHUP" in line for line in server.lines)
+
+
+def test_respawned_worker_loads_current(versions):
+    with serving(versions) as server:
+        worker, = server.workers()
+        server.wait_for("Model loaded")
+        assert server.get("/readyz")['version'] == "v1"
+        # Published while the master still holds v1 from boot.
+        publish_version(versions, "v2")
+        os.kill(worker, signal.SIGKILL)
+        server.workers(2)
+        server.wait_for("is not CURRENT")
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if server.get("/readyz")['version'] == "v2":
+                    break
+            except OSError:
+                pass  # not ready yet
+            assert time.monotonic() < deadline, "".join(server.lines)
+            time.sleep(0.1)
+
+
+def test_admin_reload_reaches_every_worker(versions):
+    with serving(versions, workers=2, MPG_RELOAD_POLL_S="0.2", MPG_ADMIN_TOKEN="secret") as server:
+        server.workers(2)
+        server.wait_for("Model loaded")
+        body = server.get("/admin/reload?wait=1", data=json.dumps({'version': "v2"}).encode(),
+                          headers={"X-Admin-Token": "secret", "Content-Type": "application/json"})
+        assert body['version'] == "v2"
+        # The worker that answered, the other one and the master.
+        server.wait_for("Model reloaded: v1 -> v2", count=3)
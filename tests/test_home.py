@@ -0,0 +1,53 @@
+import gzip
+from datetime import timedelta
+
+from werkzeug.http import http_date
+
+
+def test_home_sends_validators_and_plain_body(client, mpg_app):
+    response = client.get('/')
+    assert response.status_code == 200
+    assert response.data == mpg_app.HOME_PAGE
+    assert response.headers['ETag'] == f'"{mpg_app.HOME_ETAG}"'
+    assert response.headers['Last-Modified'] == http_date(mpg_app.HOME_LAST_MODIFIED)
+    assert response.headers['Vary'] == "Accept-Encoding"
+    assert 'public' in response.headers['Cache-Control']
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_matching_etag_is_not_modified(client, mpg_app):
+    etag = client.get('/').headers['ETag']
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.data == b""
+    assert response.headers['ETag'] == etag
+    response = client.get('/', headers={'If-None-Match': '"something-else"'})
+    assert response.status_code == 200 and response.data == mpg_app.HOME_PAGE
+
+
+def test_if_modified_since(client, mpg_app):
+    modified = mpg_app.HOME_LAST_MODIFIED
+    response = client.get('/', headers={'If-Modified-Since': http_date(modified)})
+    assert response.status_code == 304
+    response = client.get('/', headers={'If-Modified-Since': http_date(modified - timedelta(days=1))})
+    assert response.status_code == 200
+
+
+def test_gzip_is_negotiated(client, mpg_app):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == "gzip"
+    assert gzip.decompress(response.data) == mpg_app.HOME_PAGE
+    etag = response.headers['ETag']
+    assert etag == f'"{mpg_app.HOME_ETAG}-gzip"'
+    # Each encoding is its own variant: the plain page's ETag does not match it.
+    response = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+    response = client.get('/', headers={'Accept-Encoding': 'gzip',
+                                        'If-None-Match': f'"{mpg_app.HOME_ETAG}"'})
+    assert response.status_code == 200
+
+
+def test_refused_gzip_falls_back_to_identity(client, mpg_app):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == mpg_app.HOME_PAGE
@@ -0,0 +1,105 @@
+import itertools
+import math
+import os
+
+import numpy as np
+import pytest
+
+from artifacts import load_bundle
+from benchmarks.synthetic import BRANDS, make_vehicles
+from features import FORM_CHOICES, FORM_RANGES, brand_bucket
+from lookup_table import MAX_TABLE_MB, LookupTable, _discrete_axes, observed_combos
+
+FUEL_STEP = 2000.0
+ENGINE_STEP = 0.5
+
+
+@pytest.fixture(scope="module")
+def bundle(model_dir):
+    return load_bundle(os.path.join(model_dir, "v1"), use_table=False)
+
+
+@pytest.fixture(scope="module")
+def training():
+    # A handful of rows keeps the number of tabulated combinations small.
+    return make_vehicles(n=6, seed=3)
+
+
+@pytest.fixture(scope="module")
+def table(bundle, training, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("table"))
+    return LookupTable.build(bundle.encoder, bundle.predict_rows, path, fuel_step=FUEL_STEP,
+                             engine_step=ENGINE_STEP, progress=False, data=training)
+
+
+def live(bundle, inputs):
+    return bundle.predict_rows(bundle.encoder.encode_many(inputs))
+
+
+def trained_inputs(training, n, seed=0):
+    """Random grid inputs whose brand and options come from a training row."""
+    rng = np.random.default_rng(seed)
+    inputs = []
+    for _ in range(n):
+        row = training.iloc[rng.integers(len(training))]
+        input_data = {field: row[field] for field in FORM_CHOICES}
+        input_data.update(
+            Car_Brand=row['Car_Brand'],
+            Engine_Cylinders=float(rng.integers(FORM_RANGES['Engine_Cylinders'][0],
+                                                FORM_RANGES['Engine_Cylinders'][1] + 1)),
+            Model_Year=int(rng.integers(FORM_RANGES['Model_Year'][0], FORM_RANGES['Model_Year'][1] + 1)),
+            Engine_Size=round(FORM_RANGES['Engine_Size'][0] + ENGINE_STEP * int(rng.integers(16)), 6),
+            Fuel_Capacity=float(FORM_RANGES['Fuel_Capacity'][0] + FUEL_STEP * int(rng.integers(3))))
+        inputs.append(input_data)
+    return inputs
+
+
+def test_observed_combinations_keep_the_default_grid_under_the_limit(bundle):
+    axes = _discrete_axes(bundle.encoder)
+    every = math.prod(len(axis['levels']) for axis in axes)
+    assert len(observed_combos(make_vehicles(n=6, seed=3), axes)) <= 6 < every
+    # The default numeric grid, per combination.
+    per_combo = 15 * 35 * 76 * 17 * 4 / 1e6
+    assert every * per_combo > MAX_TABLE_MB
+    with pytest.raises(ValueError, match="--data"):
+        LookupTable.build(bundle.encoder, bundle.predict_rows, "unused", progress=False)
+
+
+def test_matches_predict_for_trained_brands_and_options(bundle, training, table):
+    inputs = trained_inputs(training, 300)
+    # Other brands hashing to the same bucket are served as well.
+    by_bucket = {brand_bucket(brand): brand for brand in BRANDS}
+    for input_data in inputs[::2]:
+        input_data['Car_Brand'] = by_bucket.get(brand_bucket(input_data['Car_Brand']), input_data['Car_Brand'])
+    looked_up = np.array([table.lookup(input_data) for input_data in inputs], dtype=np.float64)
+    np.testing.assert_allclose(looked_up, live(bundle, inputs), atol=1e-3)
+
+
+def test_interpolates_fuel_capacity_between_grid_points(bundle, training, table):
+    inputs = trained_inputs(training, 100, seed=1)
+    rng = np.random.default_rng(2)
+    for input_data in inputs:
+        input_data['Fuel_Capacity'] = float(FORM_RANGES['Fuel_Capacity'][0] + rng.integers(4001))
+    lo = FORM_RANGES['Fuel_Capacity'][0]
+    below = [dict(x, Fuel_Capacity=lo + FUEL_STEP * ((x['Fuel_Capacity'] - lo) // FUEL_STEP)) for x in inputs]
+    above = [dict(x, Fuel_Capacity=min(x['Fuel_Capacity'] + FUEL_STEP, FORM_RANGES['Fuel_Capacity'][1]))
+             for x in below]
+    frac = np.array([(x['Fuel_Capacity'] - b['Fuel_Capacity']) / FUEL_STEP for x, b in zip(inputs, below)])
+    expected = (1 - frac) * live(bundle, below) + frac * live(bundle, above)
+    looked_up = np.array([table.lookup(input_data) for input_data in inputs], dtype=np.float64)
+    np.testing.assert_allclose(looked_up, expected, atol=1e-3)
+
+
+def test_falls_back_off_the_grid(training, table):
+    input_data = trained_inputs(training, 1)[0]
+    assert table.lookup(input_data) is not None
+    assert table.lookup(dict(input_data, Engine_Size=input_data['Engine_Size'] + 0.1)) is None
+    assert table.lookup(dict(input_data, Model_Year=FORM_RANGES['Model_Year'][1] + 1)) is None
+    seen = {tuple(row[field] for field in FORM_CHOICES) for _, row in training.iterrows()}
+    unseen = next(options for options in itertools.product(*FORM_CHOICES.values()) if options not in seen)
+    # Valid form options, but never seen together in training.
+    assert table.lookup(dict(input_data, **dict(zip(FORM_CHOICES, unseen)))) is None
+
+
+def test_verify_samples_only_tabulated_combinations(bundle, table):
+    assert table.verify(bundle.encoder, bundle.predict_rows) <= 1e-3
@@ -0,0 +1,58 @@
+import os
+import signal
+import time
+
+import numpy as np
+import pytest
+
+from inference_pool import InferencePool
+
+DIE = -1.0
+HANG = -2.0
+
+
+def _predict(X):
+    if X[0, 0] == DIE:
+        os.kill(os.getpid(), signal.SIGKILL)
+    if X[0, 0] == HANG:
+        time.sleep(60)
+    return X.sum(axis=1)
+
+
+@pytest.fixture
+def pool():
+    pool = InferencePool(_predict, 3, processes=2, max_rows=64, min_chunk=8, task_timeout=1.0)
+    yield pool
+    pool.close()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_matches_in_process(pool):
+    X = np.random.default_rng(0).normal(size=(300, 3))
+    np.testing.assert_array_equal(pool.predict(X), _predict(X))
+
+
+def test_dead_worker_fails_its_chunk(pool):
+    pool.predict(np.ones((1, 3)))
+    with pytest.raises(RuntimeError, match="exited"):
+        pool.predict(np.full((1, 3), DIE))
+    _wait_for(lambda: pool.stats()['alive'] == 2)
+    assert pool.stats()['restarts'] == 1
+    np.testing.assert_array_equal(pool.predict(np.ones((4, 3))), np.full(4, 3.0))
+
+
+def test_hung_worker_times_out(pool):
+    pool.predict(np.ones((1, 3)))
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="did not answer"):
+        pool.predict(np.full((1, 3), HANG))
+    assert time.monotonic() - start < 5
+    # The hung worker is killed and replaced, which frees its slot.
+    _wait_for(lambda: pool.stats()['slots_busy'] == 0 and pool.stats()['alive'] == 2)
+    np.testing.assert_array_equal(pool.predict(np.ones((4, 3))), np.full(4, 3.0))
@@ -0,0 +1,85 @@
+import json
+import multiprocessing
+import os
+import threading
+
+from reqlog import RequestLogger
+
+
+def _lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_failed_write_is_retried(tmp_path):
+    # The writer thread may flush too (the buffer is half full early), so
+    # only check what holds however the flushes interleave.
+    path = tmp_path / "logs" / "requests.jsonl"
+    logger = RequestLogger(str(path), capacity=4, flush_interval=3600)
+    for i in range(3):
+        logger.log({'i': i})
+    logger.flush()  # the directory does not exist yet
+    stats = logger.stats()
+    assert stats['errors'] >= 3 and stats['written'] == 0
+
+    for i in range(3, 6):
+        logger.log({'i': i})
+    logger.flush()  # 6 records, only the newest 4 (capacity) are kept
+    assert logger.stats()['dropped'] == 2
+
+    os.makedirs(path.parent)
+    logger.flush()
+    assert [r['i'] for r in _lines(path)] == [2, 3, 4, 5]
+    assert logger.stats()['written'] == 4 and logger.stats()['buffered'] == 0
+
+
+def test_concurrent_flushes_keep_order(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    logger = RequestLogger(str(path), flush_interval=0.001)
+    stop = threading.Event()
+
+    def flush_loop():
+        while not stop.is_set():
+            logger.flush()
+
+    flushers = [threading.Thread(target=flush_loop) for _ in range(3)]
+    for thread in flushers:
+        thread.start()
+    for i in range(3000):
+        logger.log({'i': i})
+    stop.set()
+    for thread in flushers:
+        thread.join()
+    logger.flush()
+    assert [r['i'] for r in _lines(path)] == list(range(3000))
+
+
+def _log_from_child(logger, n):
+    for i in range(n):
+        logger.log({'pid': os.getpid(), 'i': i})
+        if i % 25 == 24:
+            logger.flush()
+    logger.flush()
+
+
+def test_processes_write_and_rotate_their_own_files(tmp_path):
+    path = tmp_path / "requests.jsonl"
+    # About 30 bytes a record and 25 records a flush: a rotation every few flushes.
+    logger = RequestLogger(str(path), flush_interval=3600, max_bytes=3000, backup_count=50,
+                           per_process=True)
+    context = multiprocessing.get_context("fork")
+    children = [context.Process(target=_log_from_child, args=(logger, 500)) for _ in range(4)]
+    for child in children:
+        child.start()
+    for child in children:
+        child.join(30)
+        assert child.exitcode == 0
+    assert not path.exists()
+    for child in children:
+        current = tmp_path / f"requests.{child.pid}.jsonl"
+        backups = sorted(tmp_path.glob(f"requests.{child.pid}.jsonl.*"),
+                         key=lambda p: -int(p.suffix[1:]))
+        records = [r for p in backups + [current] for r in _lines(p)]
+        # Every record of this process, in order, and nobody else's.
+        assert records == [{'pid': child.pid, 'i': i} for i in range(500)]
+        assert len(backups) >= 3 and all(p.stat().st_size <= 3000 for p in backups)
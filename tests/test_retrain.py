@@ -0,0 +1,86 @@
+import json
+import os
+import warnings
+
+import joblib
+import numpy as np
+import pytest
+
+import retrain
+from artifacts import CURRENT_FILE, publish_version, resolve_version
+from benchmarks.synthetic import make_vehicles, write_artifacts
+from features import FeatureEncoder
+from train_model import IMPUTATION_FILE
+
+
+@pytest.fixture
+def refresh(tmp_path):
+    """A model directory with published version v1, an empty source and a holdout CSV."""
+    model_dir = tmp_path / "models"
+    os.makedirs(model_dir / "v1")
+    write_artifacts(str(model_dir / "v1"), n_rows=300, n_estimators=5)
+    publish_version(str(model_dir), "v1")
+    source = tmp_path / "observations.csv"
+    make_vehicles(0).to_csv(source, index=False)
+    holdout = tmp_path / "holdout.csv"
+    make_vehicles(100, seed=2).to_csv(holdout, index=False)
+    args = ["--source", str(source), "--holdout", str(holdout), "--model-dir", str(model_dir),
+            "--n-jobs", "1"]
+    return model_dir, source, args
+
+
+def test_no_new_rows_is_nothing_to_retrain(refresh, capsys):
+    model_dir, _, args = refresh
+    retrain.main(args + ["--min-rows", "0", "--version", "v2"])
+    assert "nothing to retrain" in capsys.readouterr().out
+    assert not os.path.exists(model_dir / "v2")
+
+
+def test_init_writes_a_new_version(refresh):
+    model_dir, source, args = refresh
+    before = sorted(os.listdir(model_dir / "v1"))
+    retrain.main(args + ["--init", "--version", "v2"])
+    assert sorted(os.listdir(model_dir / "v1")) == before
+    assert resolve_version(str(model_dir)) == ("v2", str(model_dir / "v2"))
+    state = retrain.load_state(str(model_dir / "v2"))
+    assert state['base_version'] == "v1" and state['offset'] == os.path.getsize(source)
+
+
+def test_refresh_keeps_feature_names(refresh):
+    model_dir, source, args = refresh
+    make_vehicles(60, seed=3).to_csv(source, mode="a", header=False, index=False)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        retrain.main(args + ["--add-trees", "2", "--version", "v2", "--tolerance", "1"])
+    assert not [w for w in caught if "feature names" in str(w.message)]
+    assert open(model_dir / CURRENT_FILE).read().strip() == "v2"
+    assert retrain.load_state(str(model_dir / "v2"))['new_rows'] == 60
+
+
+def test_compacted_version_cannot_be_grown(refresh):
+    model_dir, source, args = refresh
+    os.remove(model_dir / "v1" / "mpg_model.pkl")  # as compact.py writes it
+    make_vehicles(60, seed=3).to_csv(source, mode="a", header=False, index=False)
+    with pytest.raises(SystemExit, match="no mpg_model.pkl to grow"):
+        retrain.main(args + ["--version", "v2"])
+    assert not os.path.exists(model_dir / "v2")
+
+
+def test_new_rows_are_imputed_with_training_values(refresh):
+    model_dir, source, args = refresh
+    training = {'Engine_Cylinders': 5.5, 'Engine_Size': 3.3, 'Drive_Type': "RWD"}
+    with open(model_dir / "v1" / IMPUTATION_FILE, "w") as f:
+        json.dump(training, f)
+    rows = make_vehicles(60, seed=3)
+    rows.loc[:9, ['Engine_Size', 'Engine_Cylinders', 'Drive_Type']] = [np.nan, np.nan, None]
+    encoder = FeatureEncoder(joblib.load(model_dir / "v1" / "columns.pkl"))
+    X, _ = retrain.prepare_rows(rows, encoder, retrain.load_imputation(str(model_dir / "v1")))
+    assert (X.loc[:9, 'Engine_Size'] == 3.3).all() and (X.loc[:9, 'Engine_Cylinders'] == 5.5).all()
+    assert (X.loc[:9, 'Drive_Type_RWD'] == 1).all()
+    # Without saved values the rows' own means are used, as before.
+    X, _ = retrain.prepare_rows(rows, encoder)
+    assert np.allclose(X.loc[:9, 'Engine_Size'], rows['Engine_Size'].mean())
+
+    rows.to_csv(source, mode="a", header=False, index=False)
+    retrain.main(args + ["--add-trees", "2", "--version", "v2", "--tolerance", "1"])
+    assert retrain.load_imputation(str(model_dir / "v2")) == training
@@ -0,0 +1,44 @@
+import math
+
+import pandas as pd
+import pytest
+
+from features import EXAMPLE_INPUT
+
+
+def rows():
+    """Form-like rows, some of which the API and the bulk scorer must reject."""
+    good = [dict(EXAMPLE_INPUT),
+            dict(EXAMPLE_INPUT, Car_Brand="BMW", Engine_Size=4.4, Engine_Cylinders=8, Drive_Type="AWD"),
+            dict(EXAMPLE_INPUT, Car_Brand="Unheard-Of Motors", Fuel_Type="Hydrogen"),
+            dict(EXAMPLE_INPUT, Model_Year=2015.7),  # truncated like int()
+            dict(EXAMPLE_INPUT, Fuel_Capacity=1234.5, Engine_Size=1.2)]
+    bad = [dict(EXAMPLE_INPUT, Engine_Size="big"),
+           dict(EXAMPLE_INPUT, Model_Year=math.inf),
+           dict(EXAMPLE_INPUT, Fuel_Type=None),
+           dict(EXAMPLE_INPUT, Fuel_Capacity=None)]
+    return [good[0], bad[0], good[1], bad[1], good[2], bad[2], good[3], bad[3], good[4]]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_bulk_scores_match_the_batch_api(client, tmp_path, processes):
+    import score_bulk  # imports app, which starts loading the model
+
+    records = rows()
+    source = tmp_path / "vehicles.csv"
+    output = tmp_path / "scored.csv"
+    pd.DataFrame(records).to_csv(source, index=False)
+    score_bulk.main([str(source), str(output), "--chunk-size", "4", "--processes", str(processes)])
+    scored = pd.read_csv(output, keep_default_na=False, na_values=[""])
+
+    # The API gets the same rows as JSON, without the cells the CSV leaves empty.
+    payload = [{k: v for k, v in r.items() if v is not None} for r in records]
+    predictions = client.post('/api/predict/batch', json=payload).get_json()['predictions']
+    assert len(scored) == len(predictions) == len(records)
+    for (_, row), result in zip(scored.iterrows(), predictions):
+        if 'error' in result:
+            assert math.isnan(row[score_bulk.PREDICTION_COL]) and row[score_bulk.ERROR_COL]
+        else:
+            assert isinstance(row[score_bulk.ERROR_COL], float)  # empty cell
+            assert round(row[score_bulk.PREDICTION_COL], 1) == result['mpg']  # the API rounds
+    assert sum('error' in result for result in predictions) == 4
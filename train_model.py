@@ -1,97 +1,467 @@
 """
 Train and save the MPG prediction model.
 This script is run during deployment to generate the pickle files.
+
+Training runs as a chain of stages: load, impute, encode, outlier-filter,
+split/scale and fit. Each stage's output is cached under .train_cache/,
+keyed on a hash of the stage's parameters and of its input's key (the
+dataset's content for the load stage). A rerun therefore only redoes the
+stages downstream of what changed; tweaking forest hyperparameters goes
+straight to the fit. The CSV itself is parsed once into a typed columnar
+cache there (see dataset.py), which --data also accepts directly.
+
+    python train_model.py                        # download the dataset (cached)
+    python train_model.py --data vehicles.csv    # train offline from a local file
+    python train_model.py --model-dir models     # write models/<version>/ and point CURRENT at it
+    python train_model.py --distill              # serve a compact student if R² holds up
 """
 
+import argparse
+import hashlib
+import json
+import os
+import time
+
 import joblib
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import IsolationForest
-from category_encoders import HashingEncoder
-import gdown
-import os
+from features import (HASH_COL, N_HASH_COMPONENTS, NUMERIC_FIELDS, ONE_HOT_COLS, TRANSFORM_FILE,
+                      FeatureEncoder, check_parity, field_of_column)
+from forest import CompiledForest
+from artifacts import publish_version
+import dataset
+
+DRIVE_FILE_ID = "1Brb-2ij5S5Ndt-P0da1DdWlmR1wwyfIn"
+DATASET_FILE = "vehicles_dataset.csv"
+CACHE_DIR = ".train_cache"
+TARGET = 'Combined_MPG'
+IMPUTATION_FILE = "imputation.json"
+# Rows checked against the reference encoding on every encode (see check_encoder).
+PARITY_ROWS = 2000
+
+FOREST_PARAMS = {
+    'n_estimators': 300,
+    'max_depth': None,
+    'min_samples_split': 10,
+    'min_samples_leaf': 1,
+    'max_features': 1.0,
+    'random_state': 42,
+}
+
+# Distillation student: a shallow boosted ensemble fitted to the forest's
+# predictions (see --distill).
+STUDENT_PARAMS = {
+    'n_estimators': 300,
+    'max_depth': 5,
+    'learning_rate': 0.1,
+    'subsample': 1.0,
+    'random_state': 42,
+}
+
+
+# --- stage caching -----------------------------------------------------------
+
+def stage_key(stage, parent, **params):
+    """Content address of a stage's output: its name, parameters and input key."""
+    payload = json.dumps({'stage': stage, 'parent': parent, 'params': params},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def cached(cache_dir, stage, key, compute):
+    """Return the cached output of ``stage`` for ``key``, computing it if missing."""
+    if not cache_dir:
+        return compute()
+    path = os.path.join(cache_dir, f"{stage}-{key}.joblib")
+    if os.path.exists(path):
+        print(f"[v0] {stage}: cached ({key})")
+        return joblib.load(path)
+    result = compute()
+    os.makedirs(cache_dir, exist_ok=True)
+    joblib.dump(result, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return result
+
+
+# --- stages ------------------------------------------------------------------
+
+def download_dataset(dest, file_id=DRIVE_FILE_ID):
+    import gdown
+
+    print("[v0] Downloading dataset...")
+    gdown.download(f"https://drive.google.com/uc?id={file_id}", dest, quiet=True)
+    return dest
+
+
+def load_dataset(path, cache_dir=None, key=None):
+    """Read the dataset, through the typed columnar cache when there is a cache dir."""
+    if dataset.is_dataset(path):
+        df = dataset.load(path)
+    elif cache_dir:
+        df = dataset.load(dataset.ensure(path, cache_dir, key))
+    else:
+        df = pd.read_csv(path)
+    print(f"[v0] Dataset loaded: {df.shape}")
+    return df
+
+
+def imputation_values(df):
+    """What ``impute`` fills gaps with: the numeric means and the commonest drive type."""
+    return {
+        'Engine_Cylinders': float(df['Engine_Cylinders'].mean()),
+        'Engine_Size': float(df['Engine_Size'].mean()),
+        'Drive_Type': str(df['Drive_Type'].mode()[0]),
+    }
+
+
+def impute(df, values=None):
+    """Fill gaps with ``values`` (default: ``imputation_values(df)``)."""
+    values = values or imputation_values(df)
+    df = df.copy()
+    for name, value in values.items():
+        df[name] = df[name].fillna(value)
+    return df
+
+
+def one_hot_levels(df):
+    """Sorted levels of each one-hot field, as pd.get_dummies orders them."""
+    levels = {}
+    for field in ONE_HOT_COLS:
+        values = df[field]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            levels[field] = [str(c) for c in values.cat.categories]
+        else:
+            levels[field] = sorted(values.dropna().astype(str).unique())
+    return levels
+
+
+def fit_encoder(df, levels):
+    """Fit the feature transform: numeric fields, one-hot levels and brand hashing."""
+    categorical = ONE_HOT_COLS + [HASH_COL]
+    numeric = [c for c in df.columns if c not in categorical and c != TARGET]
+    extra = [c for c in numeric if c not in NUMERIC_FIELDS]
+    if extra:
+        print(f"[v0] Warning: {', '.join(extra)} not on the prediction form; served as 0")
+    return FeatureEncoder.fit(numeric, levels)
+
+
+def encode_reference(df):
+    """The original get_dummies + HashingEncoder encoding, kept as the parity reference."""
+    from category_encoders import HashingEncoder
+
+    # One-Hot Encoding
+    df_encoded = pd.get_dummies(df, columns=ONE_HOT_COLS, drop_first=True)
+
+    # Hashing Encoding
+    hash_enc = HashingEncoder(cols=[HASH_COL], n_components=N_HASH_COMPONENTS)
+    return pd.concat([
+        df_encoded.drop(columns=[HASH_COL]),
+        hash_enc.fit_transform(df_encoded[[HASH_COL]])
+    ], axis=1)
+
+
+def check_encoder(encoder, df, levels, n=PARITY_ROWS, random_state=42):
+    """Raise ValueError unless ``encoder`` matches encode_reference on a sample of ``df``.
+
+    Compares the column layout and, through features.check_parity, both
+    the per-row encoding serving uses and the vectorized one training uses.
+    """
+    sample = df.drop(columns=[TARGET]).sample(min(n, len(df)), random_state=random_state)
+    records = sample.astype({field: object for field in ONE_HOT_COLS + [HASH_COL]}).to_dict('records')
+    for field in ONE_HOT_COLS:
+        # All levels declared, so get_dummies drops the same first level as on the full data.
+        sample[field] = pd.Categorical(sample[field].astype(object), categories=levels[field])
+    reference = encode_reference(sample)
+    if list(reference.columns) != encoder.columns:
+        raise ValueError("feature encoding drift: column layout differs from the reference encoding")
+    check_parity(encoder, records, reference.to_numpy(dtype=np.float64))
+
+
+def encode(df):
+    levels = one_hot_levels(df)
+    encoder = fit_encoder(df, levels)
+    check_encoder(encoder, df, levels)
+    encoded = pd.DataFrame(encoder.encode_columns(df), columns=encoder.columns, index=df.index)
+    encoded[TARGET] = df[TARGET]
+    # Same column order as get_dummies gave: the target stays among the numeric fields.
+    order = [c for c in df.columns if c not in ONE_HOT_COLS and c != HASH_COL]
+    return encoded[order + [c for c in encoder.columns if c not in order]]
+
+
+def filter_outliers(df_encoded, contamination=0.05, random_state=42, n_jobs=-1):
+    iso = IsolationForest(contamination=contamination, random_state=random_state, n_jobs=n_jobs)
+    outliers = iso.fit_predict(df_encoded)
+    return df_encoded[outliers == 1].copy()
+
+
+def split_scale(cleaned_df, test_size=0.2, random_state=42):
+    X = cleaned_df.drop(columns=[TARGET])
+    y = cleaned_df[TARGET]
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=random_state)
+
+    scaler = StandardScaler()
+    X_train_scaled = pd.DataFrame(scaler.fit_transform(X_train),
+                                  columns=X_train.columns, index=X_train.index)
+    X_test_scaled = pd.DataFrame(scaler.transform(X_test),
+                                 columns=X_test.columns, index=X_test.index)
+    return {
+        'X_train': X_train_scaled,
+        'X_test': X_test_scaled,
+        'y_train': y_train,
+        'y_test': y_test,
+        'X_train_raw': X_train.to_numpy(dtype=np.float64),
+        'X_test_raw': X_test.to_numpy(dtype=np.float64),
+        'scaler': scaler,
+        'columns': X_train.columns.tolist(),
+    }
+
+
+def fit_forest(X_train, y_train, params=None, n_jobs=-1):
+    params = dict(FOREST_PARAMS, **(params or {}))
+    model = RandomForestRegressor(n_jobs=n_jobs, **params)
+    model.fit(X_train, y_train)
+    return model
+
+
+def synthetic_samples(X, columns, n, swap_prob=0.5, random_state=42):
+    """Draw ``n`` rows near the training distribution for distillation.
+
+    Each sample starts from a random training row and, per input field,
+    takes that field's columns from another random row with probability
+    ``swap_prob``. Swapping whole fields keeps one-hot and hash columns
+    consistent while covering combinations the training set lacks.
+    """
+    X = np.asarray(X)
+    rng = np.random.default_rng(random_state)
+    out = X[rng.integers(len(X), size=n)].copy()
+    fields = [field_of_column(column) for column in columns]
+    for field in dict.fromkeys(fields):
+        cols = [i for i, f in enumerate(fields) if f == field]
+        swap = rng.random(n) < swap_prob
+        donors = X[rng.integers(len(X), size=int(swap.sum()))]
+        out[np.ix_(swap, cols)] = donors[:, cols]
+    return out
+
+
+def fit_student(teacher, X_train, columns, params=None, n_synthetic=None, random_state=42):
+    """Fit a boosted student to the teacher's predictions on train + synthetic rows."""
+    params = dict(STUDENT_PARAMS, **(params or {}))
+    X_train = np.asarray(X_train)
+    n_synthetic = len(X_train) if n_synthetic is None else n_synthetic
+    X = pd.DataFrame(np.vstack([X_train, synthetic_samples(X_train, columns, n_synthetic,
+                                                           random_state=random_state)]),
+                     columns=columns)
+    targets = teacher.predict(X)
+    student = GradientBoostingRegressor(**params)
+    student.fit(X, targets)
+    return student
+
+
+def distill(teacher, data, teacher_key, params=None, n_synthetic=None, cache_dir=CACHE_DIR):
+    params = dict(STUDENT_PARAMS, **(params or {}))
+    key = stage_key('distill', teacher_key, n_synthetic=n_synthetic, **params)
+    print("[v0] Distilling into GradientBoostingRegressor...")
+    return cached(cache_dir, 'distill', key,
+                  lambda: fit_student(teacher, data['X_train'], data['columns'], params, n_synthetic))
+
+
+def compare_serving(models, data):
+    """Size, load time and compiled-engine latency for each fitted model, side by side."""
+    import shutil
+    import tempfile
+    from serving_metrics import measure_serving, write_serving_artifacts
+
+    workdir = tempfile.mkdtemp(prefix="mpg-distill-")
+    rows = []
+    try:
+        for name, model in models.items():
+            artifacts = write_serving_artifacts(model, data['scaler'], data['columns'],
+                                                os.path.join(workdir, name))
+            row = dict({'name': name, 'r2': model.score(data['X_test'], data['y_test'])}, **artifacts)
+            rows.append(measure_serving(row, data['X_test_raw']))
+    finally:
+        shutil.rmtree(workdir)
+
+    print(f"{'model':<10}{'R²':>8}{'trees':>7}{'nodes':>9}{'pkl MB':>8}{'forest MB':>10}"
+          f"{'load ms':>8}{'1-row p50':>10}{'p99':>8}{'1000 p50':>10}")
+    for row in rows:
+        print(f"{row['name']:<10}{row['r2']:>8.4f}{row['n_trees']:>7}{row['n_nodes']:>9}"
+              f"{row['pickle_mb']:>8.2f}{row['forest_mb']:>10.2f}{row['forest_load_s'] * 1e3:>8.1f}"
+              f"{row['single_p50_ms']:>10.3f}{row['single_p99_ms']:>8.3f}{row['batch_p50_ms']:>10.2f}")
+    return rows
+
+
+# --- pipeline ----------------------------------------------------------------
+
+def resolve_source(data_path, cache_dir):
+    """Return (path, key) of the dataset: a local file or columnar cache, or the cached download."""
+    if data_path and dataset.is_dataset(data_path):
+        return data_path, dataset.read_meta(data_path)['key']
+    if data_path:
+        return data_path, dataset.file_key(data_path)
+    dest = os.path.join(cache_dir or ".", DATASET_FILE)
+    if not os.path.exists(dest):
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        download_dataset(dest)
+    return dest, dataset.file_key(dest)
+
+
+def prepare_data(data_path=None, cache_dir=CACHE_DIR, n_jobs=-1,
+                 contamination=0.05, test_size=0.2, random_state=42):
+    """Run the load -> split/scale stages; returns (split dict, split key).
+
+    Each stage only materializes its input when its own output is not
+    cached, so a fully cached run reads just the final split.
+    """
+    path, source_key = resolve_source(data_path, cache_dir)
+    load_key = stage_key('load', source_key)
+    impute_key = stage_key('impute', load_key)
+    encode_key = stage_key('encode', impute_key, n_components=N_HASH_COMPONENTS)
+    outliers_key = stage_key('outliers', encode_key,
+                             contamination=contamination, random_state=random_state)
+    split_key = stage_key('split', outliers_key, test_size=test_size, random_state=random_state)
+
+    def loaded():
+        # The columnar cache already makes this cheap; no need to pickle it too.
+        return load_dataset(path, cache_dir, source_key)
+
+    def imputed():
+        return cached(cache_dir, 'impute', impute_key, lambda: impute(loaded()))
+
+    def encoded():
+        return cached(cache_dir, 'encode', encode_key, lambda: encode(imputed()))
+
+    def filtered():
+        df = cached(cache_dir, 'outliers', outliers_key,
+                    lambda: filter_outliers(encoded(), contamination, random_state, n_jobs))
+        print("[v0] Data preprocessing complete")
+        return df
+
+    data = cached(cache_dir, 'split', split_key,
+                  lambda: split_scale(filtered(), test_size, random_state))
+    # Saved with the model so retrain.py fills new rows' gaps the same way.
+    imputation = cached(cache_dir, 'imputation', impute_key, lambda: imputation_values(loaded()))
+    return dict(data, imputation=imputation), split_key
+
+
+def train(data, data_key, params=None, cache_dir=CACHE_DIR, n_jobs=-1):
+    """Fit (or load from cache) the forest; returns (model, fit key)."""
+    params = dict(FOREST_PARAMS, **(params or {}))
+    key = stage_key('fit', data_key, **params)
+    print("[v0] Training RandomForestRegressor...")
+    model = cached(cache_dir, 'fit', key,
+                   lambda: fit_forest(data['X_train'], data['y_train'], params, n_jobs))
+    return model, key
+
+
+def save_artifacts(model, data, output_dir="."):
+    print("[v0] Saving model files...")
+    joblib.dump(model, os.path.join(output_dir, "mpg_model.pkl"))
+    joblib.dump(data['scaler'], os.path.join(output_dir, "scaler.pkl"))
+    joblib.dump(data['columns'], os.path.join(output_dir, "columns.pkl"))
+    transform = FeatureEncoder(data['columns']).with_scaler(data['scaler'])
+    if not np.array_equal(transform.scale(data['X_test_raw']), np.asarray(data['X_test']), equal_nan=True):
+        raise ValueError("feature transform does not reproduce the scaler on the test set")
+    transform.save(os.path.join(output_dir, TRANSFORM_FILE))
+    if data.get('imputation') is not None:
+        with open(os.path.join(output_dir, IMPUTATION_FILE), "w") as f:
+            json.dump(data['imputation'], f, indent=2)
+
+    # Compile the forest for serving (scaler folded into the split thresholds)
+    print("[v0] Compiling forest for serving...")
+    forest = CompiledForest.from_sklearn(model, data['scaler'], data['columns'])
+    max_diff = np.abs(forest.predict(data['X_test_raw']) - model.predict(data['X_test'])).max()
+    print(f"[v0] Compiled forest parity on test set: max |diff| = {max_diff:.2e}")
+    forest.save(os.path.join(output_dir, "mpg_forest"))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the MPG model.")
+    parser.add_argument("--data", help="local vehicles CSV (default: download from Google Drive)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true", help="recompute every stage")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--model-dir",
+                        help="write a new version under this directory (see MPG_MODEL_DIR) "
+                             "instead of --output-dir")
+    parser.add_argument("--version", help="version name for --model-dir (default: a timestamp)")
+    parser.add_argument("--no-publish", action="store_true",
+                        help="with --model-dir, do not point CURRENT at the new version")
+    parser.add_argument("--distill", action="store_true",
+                        help="fit a compact boosted student on the forest's predictions and "
+                             "serve it if its R² is within --distill-tolerance of the forest's")
+    parser.add_argument("--distill-tolerance", type=float, default=0.01,
+                        help="largest allowed drop in held-out R² for the student")
+    parser.add_argument("--distill-synthetic", type=int, default=None,
+                        help="synthetic rows labelled by the forest (default: as many as training rows)")
+    parser.add_argument("--student-estimators", type=int, default=STUDENT_PARAMS['n_estimators'])
+    parser.add_argument("--student-depth", type=int, default=STUDENT_PARAMS['max_depth'])
+    parser.add_argument("--student-learning-rate", type=float,
+                        default=STUDENT_PARAMS['learning_rate'])
+    parser.add_argument("--n-jobs", type=int, default=-1,
+                        help="cores for IsolationForest and the forest fit (-1 = all)")
+    parser.add_argument("--n-estimators", type=int, default=FOREST_PARAMS['n_estimators'])
+    parser.add_argument("--max-depth", type=int, default=FOREST_PARAMS['max_depth'])
+    parser.add_argument("--min-samples-split", type=int, default=FOREST_PARAMS['min_samples_split'])
+    parser.add_argument("--min-samples-leaf", type=int, default=FOREST_PARAMS['min_samples_leaf'])
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache_dir = None if args.no_cache else args.cache_dir
+    print("[v0] Starting model training...")
+
+    data, data_key = prepare_data(args.data, cache_dir, n_jobs=args.n_jobs)
+    params = {
+        'n_estimators': args.n_estimators,
+        'max_depth': args.max_depth,
+        'min_samples_split': args.min_samples_split,
+        'min_samples_leaf': args.min_samples_leaf,
+    }
+    model, fit_key = train(data, data_key, params, cache_dir, n_jobs=args.n_jobs)
+
+    # Evaluate
+    score = model.score(data['X_test'], data['y_test'])
+    print(f"[v0] Model R² Score: {score:.4f}")
+
+    if args.distill:
+        student_params = {
+            'n_estimators': args.student_estimators,
+            'max_depth': args.student_depth,
+            'learning_rate': args.student_learning_rate,
+        }
+        student = distill(model, data, fit_key, student_params, args.distill_synthetic, cache_dir)
+        student_score = student.score(data['X_test'], data['y_test'])
+        print(f"[v0] Student R² Score: {student_score:.4f} "
+              f"(forest {score:.4f}, tolerance {args.distill_tolerance})")
+        compare_serving({'forest': model, 'student': student}, data)
+        if student_score >= score - args.distill_tolerance:
+            print("[v0] Serving the distilled student")
+            model = student
+        else:
+            print("[v0] Student is outside the R² tolerance; serving the forest")
+
+    output_dir = args.output_dir
+    if args.model_dir:
+        version = args.version or time.strftime("%Y%m%d-%H%M%S")
+        output_dir = os.path.join(args.model_dir, version)
+        os.makedirs(output_dir)
+    save_artifacts(model, data, output_dir)
+    if args.model_dir and not args.no_publish:
+        publish_version(args.model_dir, version)
+        print(f"[v0] Published model version {version}")
+
+    if cache_dir is None and not args.data and os.path.exists(DATASET_FILE):
+        os.remove(DATASET_FILE)
+        print(f"[v0] Cleaned up {DATASET_FILE}")
+    print("[v0] Model training complete!")
+
 
-print("[v0] Starting model training...")
-
-# Download dataset from Google Drive
-file_id = "1Brb-2ij5S5Ndt-P0da1DdWlmR1wwyfIn"
-file_name = "vehicles_dataset.csv"
-
-print("[v0] Downloading dataset...")
-gdown.download(f"https://drive.google.com/uc?id={file_id}", file_name, quiet=True)
-
-# Load dataset
-df = pd.read_csv(file_name)
-print(f"[v0] Dataset loaded: {df.shape}")
-
-# Fill missing values
-df['Engine_Cylinders'] = df['Engine_Cylinders'].fillna(df['Engine_Cylinders'].mean())
-df['Engine_Size'] = df['Engine_Size'].fillna(df['Engine_Size'].mean())
-df['Drive_Type'] = df['Drive_Type'].fillna(df['Drive_Type'].mode()[0])
-
-# One-Hot Encoding
-one_hot_cols = ['Drive_Type', 'Fuel_Type', 'Vehicle Class/Type']
-df_encoded = pd.get_dummies(df, columns=one_hot_cols, drop_first=True)
-
-# Hashing Encoding
-hash_cols = ['Car_Brand']
-hash_enc = HashingEncoder(cols=hash_cols, n_components=16)
-df_encoded = pd.concat([
-    df_encoded.drop(columns=hash_cols),
-    hash_enc.fit_transform(df_encoded[hash_cols])
-], axis=1)
-
-# Outlier Detection
-iso = IsolationForest(contamination=0.05, random_state=42)
-outliers = iso.fit_predict(df_encoded)
-df_encoded['outlier'] = outliers
-df_filtered = df_encoded[df_encoded['outlier'] == 1].copy()
-cleaned_df = df_filtered.drop(columns=['outlier'])
-
-print("[v0] Data preprocessing complete")
-
-# Separate features and target
-X = cleaned_df.drop(columns=['Combined_MPG'])
-y = cleaned_df['Combined_MPG']
-
-# Train-test split
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-# Scale data
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-X_train = pd.DataFrame(X_train_scaled, columns=X_train.columns, index=X_train.index)
-X_test = pd.DataFrame(X_test_scaled, columns=X_test.columns, index=X_test.index)
-
-# Train model
-print("[v0] Training RandomForestRegressor...")
-model = RandomForestRegressor(
-    n_estimators=300, 
-    max_depth=None, 
-    min_samples_split=10, 
-    min_samples_leaf=1, 
-    random_state=42,
-    n_jobs=2
-)
-model.fit(X_train, y_train)
-
-# Evaluate
-score = model.score(X_test, y_test)
-print(f"[v0] Model R² Score: {score:.4f}")
-
-if os.path.exists(file_name):
-    os.remove(file_name)
-    print(f"[v0] Cleaned up {file_name}")
-
-# Save model files
-print("[v0] Saving model files...")
-joblib.dump(model, "mpg_model.pkl")
-joblib.dump(scaler, "scaler.pkl")
-joblib.dump(X_train.columns.tolist(), "columns.pkl")
-
-print("[v0] Model training complete!")
+if __name__ == "__main__":
+    main()